@@ -0,0 +1,87 @@
+"""
+Time to find the locations whose current conditions break an alert rule: a
+per-location loop, the single `get_extreme_locations` query, and the in-memory
+`evaluate_location_alerts` (one query + NumPy masks) over all tracked locations.
+Also times reading the current conditions of every location at once.
+
+    python -m benchmarks.alerts --locations 10000 --readings 10
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-alerts-benchmark.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.utils.timezone import now  # noqa: E402
+
+from benchmarks.stats import summarize  # noqa: E402
+from benchmarks.trends import populate  # noqa: E402
+from weather.alerts import get_alert_rules  # noqa: E402
+from weather.models import Location, TrackedLocation  # noqa: E402
+from weather.selectors import (  # noqa: E402
+    evaluate_location_alerts,
+    get_extreme_locations,
+    get_latest_weather,
+    get_latest_weather_for_location,
+    get_weather_alert,
+)
+
+
+def measure(label, function, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    print(summarize(label, samples))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=10_000)
+    parser.add_argument("--readings", type=int, default=10, help="Readings per location")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populate(args.locations * args.readings, args.locations)
+    TrackedLocation.objects.bulk_create(
+        [
+            TrackedLocation(location_id=location_id, refresh_interval=900, next_refresh_on=now())
+            for location_id in Location.objects.values_list("id", flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+    rules = get_alert_rules()
+    location_ids = list(TrackedLocation.objects.values_list("location_id", flat=True))
+
+    alerting = measure(
+        "per-location loop",
+        lambda: sum(
+            bool(get_weather_alert(get_latest_weather_for_location(location_id))) for location_id in location_ids
+        ),
+        1,
+    )
+    measure("get_latest_weather (all)", lambda: len(get_latest_weather()), args.runs)
+    extreme = measure("get_extreme_locations", lambda: len(get_extreme_locations(rules)), args.runs)
+    result = measure("evaluate_location_alerts", lambda: evaluate_location_alerts(rules=rules), args.runs)
+    print(f"{len(location_ids)} locations, {len(rules)} rules: {alerting} alerting (loop), {extreme} (query), "
+          f"{len(result['alerting'])} (in memory), {result['rules_fired']} rules fired")
+
+    # the vectorized part alone
+    rng = np.random.default_rng(0)
+    columns = {field: rng.uniform(-10, 110, size=len(location_ids)) for field in rules.fields}
+    countries = np.array(["Country"] * len(location_ids), dtype=object)
+    measure("masks only", lambda: rules.masks(columns, countries).sum(axis=0), args.runs * 10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Time to load and summarize long reading histories with `weather.analytics`.
+
+Summarizes synthetic 15-minute series in memory (the vectorized part) and, for a
+few locations of the trends benchmark database (populated as in benchmarks.trends),
+the full DB load + summary.
+
+    python -m benchmarks.analytics --years 3 --locations 1000
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-trends-benchmark.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+
+from benchmarks.stats import summarize  # noqa: E402
+from benchmarks.trends import populate  # noqa: E402
+from weather.analytics import ANALYTICS_FIELDS, summarize_history  # noqa: E402
+from weather.models import Location  # noqa: E402
+from weather.selectors import get_weather_analytics  # noqa: E402
+
+
+def synthetic_history(readings, rng):
+    epochs = 1_700_000_000 + np.arange(readings, dtype=np.int64) * 900
+    history = {"epoch": epochs}
+    for field in ANALYTICS_FIELDS:
+        history[field] = rng.normal(25, 8, size=readings)
+    history["humidity"] = rng.uniform(10, 100, size=readings)
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--locations", type=int, default=1000)
+    parser.add_argument("--db-locations", type=int, default=20)
+    parser.add_argument("--db-rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    readings = int(args.years * 365 * 96)
+    history = synthetic_history(readings, rng)
+    samples = []
+    started = time.perf_counter()
+    for _ in range(args.locations):
+        start = time.perf_counter()
+        summarize_history(history, rolling_window=3 * 3600, ewma_halflife=6 * 3600)
+        samples.append(time.perf_counter() - start)
+    print(summarize(f"summarize {readings} readings", samples, time.perf_counter() - started))
+
+    call_command("migrate", verbosity=0)
+    populate(args.db_rows, 1000)
+    location_ids = random.sample(list(Location.objects.values_list("id", flat=True)), args.db_locations)
+    samples = []
+    for location_id in location_ids:
+        start = time.perf_counter()
+        analytics = get_weather_analytics(location_id, days=args.years * 365)
+        samples.append(time.perf_counter() - start)
+    print(summarize(f"load + summarize ({analytics['count']} rows)", samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+DB size and long-window trends / analytics latency before and after moving old readings
+into the columnar archive (`weather.archive`).
+
+Uses its own database and archive directory, since archiving deletes the rows it moves.
+
+    python -m benchmarks.archive --rows 2000000 --locations 200 --older-than-days 30
+"""
+import argparse
+import os
+import random
+import shutil
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-archive-benchmark.sqlite3")
+os.environ.setdefault("WEATHER_ARCHIVE_DIR", "/tmp/weatherpulse-archive-benchmark")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from benchmarks.stats import summarize  # noqa: E402
+from benchmarks.trends import populate  # noqa: E402
+from weather.archive import archive_readings  # noqa: E402
+from weather.models import Location, LocationWeather  # noqa: E402
+from weather.selectors import get_weather_analytics, get_weather_trends  # noqa: E402
+from weather.services import update_weather_rollups  # noqa: E402
+
+
+def db_size():
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM")
+    return os.path.getsize(connection.settings_dict["NAME"]) / 2**20
+
+
+def archive_size():
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(settings.WEATHER_ARCHIVE_DIR) for name in names
+    ) / 2**20
+
+
+def measure(label, location_ids, days):
+    for name, get in (("trends", lambda location_id: get_weather_trends(location_id, days)),
+                      ("analytics", lambda location_id: get_weather_analytics(location_id, days))):
+        samples = []
+        for location_id in location_ids:
+            start = time.perf_counter()
+            get(location_id)
+            samples.append(time.perf_counter() - start)
+        print(summarize(f"{label}: {name} over {days:g} days", samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--older-than-days", type=float, default=30)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    for path in (connection.settings_dict["NAME"], settings.WEATHER_ARCHIVE_DIR):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    call_command("migrate", verbosity=0)
+    populate(args.rows, args.locations)
+    update_weather_rollups()
+    # the whole history, so most of the window comes from the archive afterwards
+    days = args.rows // args.locations / 96 + 1
+    location_ids = random.sample(list(Location.objects.values_list("id", flat=True)), args.samples)
+
+    with override_settings(WEATHER_TRENDS_FROM_ROLLUPS=False, WEATHER_HISTORY_STORE=False):
+        print(f"{LocationWeather.objects.count()} readings in the DB, {db_size():.0f} MiB")
+        measure("all in DB", location_ids, days)
+
+        start = time.perf_counter()
+        archived = archive_readings(older_than_days=args.older_than_days)
+        elapsed = time.perf_counter() - start
+        print(f"archived {archived} readings in {elapsed:.1f}s ({archived / elapsed:,.0f} rows/s)")
+        print(
+            f"{LocationWeather.objects.count()} readings left in the DB, {db_size():.0f} MiB; "
+            f"archive {archive_size():.0f} MiB"
+        )
+        measure("archived", location_ids, days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Latency of location suggestions over N stored locations: the in-process prefix index
+(direct and through the endpoint) against the equivalent `name__istartswith` query.
+
+    python -m benchmarks.autocomplete --locations 100000 --lookups 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import string
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-autocomplete-benchmark.sqlite3")
+
+import django  # noqa: E402
+
+from benchmarks.stats import summarize  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+
+    from weather.autocomplete import location_suggestions, suggest_locations
+    from weather.models import Location
+
+    call_command("migrate", verbosity=0)
+    rng = random.Random(0)
+    names = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))) for _ in range(args.locations)]
+    db = sqlite3.connect(connection.settings_dict["NAME"])
+    with db:
+        db.executemany(
+            "INSERT OR IGNORE INTO weather_location (name, region, country) VALUES (?, 'Region', 'Country')",
+            ((name,) for name in names),
+        )
+    # what a user has typed so far: 1 to 6 leading characters of a known name
+    prefixes = [name[:rng.randint(1, 6)] for name in rng.choices(names, k=args.lookups)]
+
+    start = time.perf_counter()
+    location_suggestions.index()
+    print(f"index of {len(location_suggestions.index())} locations built in {time.perf_counter() - start:.2f}s")
+
+    def database(prefix):
+        list(Location.objects.filter(name__istartswith=prefix).order_by("name")
+             .values_list("name", "region", "country")[:8])
+
+    client = Client()
+    for label, suggest in (
+        ("prefix index", suggest_locations),
+        ("endpoint", lambda prefix: client.get("/api/locations/autocomplete/", {"q": prefix})),
+        ("db istartswith", database),
+    ):
+        samples = []
+        start = time.perf_counter()
+        for prefix in prefixes:
+            started = time.perf_counter()
+            suggest(prefix)
+            samples.append(time.perf_counter() - started)
+        print(summarize(label, samples, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Response time of comparing N locations: the batched `fetch_locations_current_weather`
++ `get_weather_trends_for_locations` against a per-location loop of the home view's
+reads, with every location unseen (all go to the fake upstream) and then fresh.
+
+    python -m benchmarks.compare --counts 20 50 100 200 --latency-ms 50
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-compare-benchmark.sqlite3")
+os.environ.setdefault("WEATHERAPI_API_KEY", "bench")
+
+import django  # noqa: E402
+
+from benchmarks.fake_weatherapi import start_fake_weatherapi  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[20, 50, 100, 200])
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_weatherapi(latency_ms=args.latency_ms)
+    os.environ["WEATHERAPI_BASE_URL"] = base_url
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    from weather.services import fetch_location_current_weather, fetch_locations_current_weather
+    from weather.selectors import get_weather_trends, get_weather_trends_for_locations
+
+    call_command("migrate", verbosity=0)
+
+    def batched(names):
+        weather, _ = fetch_locations_current_weather(names)
+        latest = {reading.location_id: reading for reading in weather.values()}
+        get_weather_trends_for_locations(latest, latest=latest)
+
+    def loop(names):
+        for name in names:
+            latest = fetch_location_current_weather(name)
+            get_weather_trends(latest.location_id, latest=latest)
+
+    run = 0
+    for count in args.counts:
+        for label, compare in (("batched", batched), ("loop", loop)):
+            run += 1
+            names = [f"{label}{run}-city{i}" for i in range(count)]
+            for state in ("unseen", "fresh"):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    compare(names)
+                    elapsed = time.perf_counter() - start
+                print(f"{label:8} n={count:<4} {state:7} {elapsed * 1000:8.1f}ms  {len(queries):5} queries")
+                reset_queries()
+    server.shutdown()
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Throughput and memory of streaming a location's readings with `weather.export`.
+
+Inserts `--rows` synthetic readings for a single location (once per database), then
+exports them in each format into a counting sink, reporting rows/s and the growth of the
+process's peak RSS over the baseline after Django is loaded.
+
+    python -m benchmarks.export --rows 10000000
+"""
+import argparse
+import os
+import resource
+import sqlite3
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-export-benchmark.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils.timezone import now, timedelta  # noqa: E402
+
+from weather.export import export_readings  # noqa: E402
+from weather.models import Location, LocationWeather  # noqa: E402
+
+LOCATION = "exportville"
+
+
+def populate(rows):
+    existing = LocationWeather.objects.filter(location__name=LOCATION).count()
+    if existing >= rows:
+        return
+    db = sqlite3.connect(connection.settings_dict["NAME"])
+    with db:
+        db.execute(
+            "INSERT OR IGNORE INTO weather_location (name, region, country, latitude, longitude) "
+            "VALUES (?, 'Region', 'Country', 18.0, 79.58)", (LOCATION,),
+        )
+        db.execute("INSERT OR IGNORE INTO weather_weathercondition (code, text, icon) VALUES (1000, 'Clear', '')")
+    (location_id,) = db.execute("SELECT id FROM weather_location WHERE name = ?", (LOCATION,)).fetchone()
+    (condition_id,) = db.execute("SELECT id FROM weather_weathercondition WHERE text = 'Clear'").fetchone()
+    start = now() - timedelta(minutes=rows)
+
+    def generate():
+        for i in range(existing, rows):
+            timestamp = (start + timedelta(minutes=i)).isoformat(sep=" ")
+            yield (location_id, condition_id, 20 + i % 15, 22.5, 10.25, "NW", 1003, 0.5, 75, 18.2, 5, 21.6, 10,
+                   timestamp, timestamp)
+
+    with db:
+        db.executemany(
+            "INSERT INTO weather_locationweather (location_id, condition_id, temperature, temperature_feels_like, "
+            "wind_speed, wind_direction, pressure, precipitation, humidity, dewpoint, uv_index, gust_speed, "
+            "visibility, record_timestamp, created_on) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            generate(),
+        )
+    db.close()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populate(args.rows)
+    location_id = Location.objects.values_list("id", flat=True).get(name=LOCATION)
+    connection.close()
+    baseline = peak_rss_mb()
+    print(f"{args.rows} rows, baseline peak RSS {baseline:.0f} MB")
+    for export_format, compress in (("ndjson", False), ("csv", False), ("csv", True)):
+        written = 0
+        start = time.perf_counter()
+        for chunk in export_readings(location_id, export_format, compress=compress):
+            written += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"{export_format}{'.gz' if compress else '':4} {written / 2**20:8.0f} MiB in {elapsed:6.1f}s "
+              f"({args.rows / elapsed:,.0f} rows/s), peak RSS +{peak_rss_mb() - baseline:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
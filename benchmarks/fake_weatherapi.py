@@ -0,0 +1,227 @@
+"""
+Local stand-in for WeatherAPI used by the benchmarks.
+
+Serves `current.json`, `forecast.json` and `search.json` with realistic payloads over HTTP/1.1
+keep-alive, with an optional artificial latency, so client and server changes
+can be measured without spending real API quota.
+
+    python -m benchmarks.fake_weatherapi --port 8765 --latency-ms 20
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def build_current_payload(location="Warangal", epoch=None):
+    epoch = epoch or int(time.time()) // 900 * 900
+    return {
+        "location": {
+            "name": location.title(),
+            "region": "Andhra Pradesh",
+            "country": "India",
+            "lat": 18,
+            "lon": 79.58,
+            "tz_id": "Asia/Kolkata",
+            "localtime_epoch": epoch,
+            "localtime": time.strftime("%Y-%m-%d %H:%M", time.gmtime(epoch)),
+        },
+        "current": {
+            "last_updated_epoch": epoch,
+            "last_updated": time.strftime("%Y-%m-%d %H:%M", time.gmtime(epoch)),
+            "temp_c": 29.1,
+            "temp_f": 84.4,
+            "is_day": 1,
+            "condition": {
+                "text": "Patchy rain nearby",
+                "icon": "//cdn.weatherapi.com/weather/64x64/day/176.png",
+                "code": 1063,
+            },
+            "wind_mph": 9.8,
+            "wind_kph": 15.8,
+            "wind_degree": 308,
+            "wind_dir": "NW",
+            "pressure_mb": 1003,
+            "pressure_in": 29.61,
+            "precip_mm": 0.53,
+            "precip_in": 0.02,
+            "humidity": 75,
+            "cloud": 74,
+            "feelslike_c": 33.9,
+            "feelslike_f": 93,
+            "windchill_c": 29.1,
+            "windchill_f": 84.4,
+            "heatindex_c": 33.9,
+            "heatindex_f": 93,
+            "dewpoint_c": 24.2,
+            "dewpoint_f": 75.6,
+            "vis_km": 9,
+            "vis_miles": 5,
+            "uv": 6,
+            "gust_mph": 13.4,
+            "gust_kph": 21.6,
+        },
+    }
+
+
+def build_forecast_payload(location="Warangal", days=1, epoch=None):
+    payload = build_current_payload(location, epoch)
+    start = payload["current"]["last_updated_epoch"] // 86400 * 86400
+    forecastday = []
+    for day in range(days):
+        date_epoch = start + day * 86400
+        hours = []
+        for hour in range(24):
+            time_epoch = date_epoch + hour * 3600
+            hours.append({
+                "time_epoch": time_epoch,
+                "time": time.strftime("%Y-%m-%d %H:%M", time.gmtime(time_epoch)),
+                "temp_c": 20 + hour % 10,
+                "temp_f": 68 + hour % 10,
+                "is_day": int(6 <= hour < 18),
+                "condition": {
+                    "text": "Clear",
+                    "icon": "//cdn.weatherapi.com/weather/64x64/night/113.png",
+                    "code": 1000,
+                },
+                "wind_mph": 9.4,
+                "wind_kph": 15.1,
+                "wind_degree": 265,
+                "wind_dir": "W",
+                "pressure_mb": 1007,
+                "pressure_in": 29.73,
+                "precip_mm": 0,
+                "precip_in": 0,
+                "humidity": 58,
+                "cloud": 19,
+                "feelslike_c": 30.5,
+                "feelslike_f": 86.9,
+                "windchill_c": 28.7,
+                "windchill_f": 83.7,
+                "heatindex_c": 30.5,
+                "heatindex_f": 86.9,
+                "dewpoint_c": 19.6,
+                "dewpoint_f": 67.3,
+                "will_it_rain": 0,
+                "chance_of_rain": 0,
+                "will_it_snow": 0,
+                "chance_of_snow": 0,
+                "vis_km": 10,
+                "vis_miles": 6,
+                "gust_mph": 15,
+                "gust_kph": 24.1,
+                "uv": 1,
+            })
+        forecastday.append({
+            "date": time.strftime("%Y-%m-%d", time.gmtime(date_epoch)),
+            "date_epoch": date_epoch,
+            "day": {
+                "maxtemp_c": 35.9,
+                "maxtemp_f": 96.6,
+                "mintemp_c": 26.3,
+                "mintemp_f": 79.3,
+                "avgtemp_c": 30.7,
+                "avgtemp_f": 87.3,
+                "maxwind_mph": 12.8,
+                "maxwind_kph": 20.5,
+                "totalprecip_mm": 0,
+                "totalprecip_in": 0,
+                "avgvis_km": 10,
+                "avgvis_miles": 6,
+                "avghumidity": 53,
+                "daily_will_it_rain": 0,
+                "daily_chance_of_rain": 0,
+                "daily_will_it_snow": 0,
+                "daily_chance_of_snow": 0,
+                "condition": {
+                    "text": "Sunny",
+                    "icon": "//cdn.weatherapi.com/weather/64x64/day/113.png",
+                    "code": 1000,
+                },
+                "uv": 8,
+            },
+            "astro": {
+                "sunrise": "05:44 AM",
+                "sunset": "08:20 PM",
+                "moonrise": "12:58 AM",
+                "moonset": "03:35 PM",
+                "moon_phase": "Last Quarter",
+                "moon_illumination": "36",
+            },
+            "hour": hours,
+        })
+    payload["forecast"] = {"forecastday": forecastday}
+    return payload
+
+
+class FakeWeatherAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    unknown_locations = {"nowhere"}
+    # set on the server's handler class to simulate an incident: every call is a slow 503
+    outage = False
+    outage_latency = 0.0
+    # the q of every call served
+    queries = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        # like WeatherAPI, "warangal, india" resolves to the place named "Warangal"
+        self.queries.append(query.get("q", [""])[0])
+        location = query.get("q", ["warangal"])[0].split(",")[0].strip()
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.outage:
+            time.sleep(self.outage_latency)
+            status, payload = 503, {"error": {"code": 9999, "message": "Internal application error."}}
+        elif location.lower() in self.unknown_locations:
+            status, payload = 400, {"error": {"code": 1006, "message": "No matching location found."}}
+        elif url.path.endswith("/current.json"):
+            status, payload = 200, build_current_payload(location)
+        elif url.path.endswith("/search.json"):
+            status, payload = 200, [
+                {**build_current_payload(f"{location} {suffix}")["location"], "id": i, "url": ""}
+                for i, suffix in enumerate(("city", "town", "village"))
+            ]
+        elif url.path.endswith("/forecast.json"):
+            status, payload = 200, build_forecast_payload(location, int(query.get("days", ["1"])[0]))
+        else:
+            status, payload = 404, {"error": {"code": 1005, "message": "API request url is invalid."}}
+
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_weatherapi(port=0, latency_ms=0):
+    """Start the fake server in a daemon thread and return (server, base_url)."""
+    handler = type("Handler", (FakeWeatherAPIHandler,), {"latency": latency_ms / 1000, "queries": []})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    handler = type("Handler", (FakeWeatherAPIHandler,), {"latency": args.latency_ms / 1000})
+    print(f"fake WeatherAPI listening on http://127.0.0.1:{args.port}/v1")
+    ThreadingHTTPServer(("127.0.0.1", args.port), handler).serve_forever()
@@ -0,0 +1,62 @@
+"""
+CPU cost and peak memory of decoding + parsing a forecast.json body: stdlib json,
+orjson and the streaming ijson decoder that keeps only the stored hour fields.
+
+Pass bodies recorded from WeatherAPI with --payload (repeatable); without it a
+14-day body is generated by the fake upstream.
+
+    curl "https://api.weatherapi.com/v1/forecast.json?key=$KEY&q=warangal&days=14" > forecast-14d.json
+    python -m benchmarks.json_decoding --payload forecast-14d.json --runs 200
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.fake_weatherapi import build_forecast_payload
+from benchmarks.stats import summarize
+from services import decoders
+from services.weatherapi import FORECAST_HOUR_FIELDS, parse_forecast
+
+
+def measure(label, decode, body, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        parse_forecast(decode(body))
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    decoded = decode(body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    print(summarize(label, samples) + f"  retained={retained / 1024:.0f} KiB peak={peak / 1024:.0f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload", action="append", default=[], help="Recorded forecast.json body")
+    parser.add_argument("--days", type=int, default=14, help="Days of the generated body when no --payload")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    bodies = {path: open(path, "rb").read() for path in args.payload}
+    if not bodies:
+        bodies[f"generated {args.days}d"] = json.dumps(build_forecast_payload(days=args.days)).encode()
+
+    for name, body in bodies.items():
+        # all decoders must produce the same parsed forecast
+        expected = parse_forecast(json.loads(body))
+        print(f"{name}: {len(body) / 1024:.0f} KiB, {len(expected.hours)} hours")
+        measure("json.loads", json.loads, body, args.runs)
+        if decoders.orjson is not None:
+            assert parse_forecast(decoders.orjson.loads(body)) == expected
+            measure("orjson.loads", decoders.orjson.loads, body, args.runs)
+        if decoders.can_stream():
+            assert parse_forecast(decoders.load_forecast(body, FORECAST_HOUR_FIELDS)) == expected
+            measure(f"ijson stream ({decoders.ijson.backend})",
+                    lambda body: decoders.load_forecast(body, FORECAST_HOUR_FIELDS), body, args.runs)
+
+
+if __name__ == "__main__":
+    main()
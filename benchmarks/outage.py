@@ -0,0 +1,78 @@
+"""
+Latency of current-weather lookups for locations with stale stored readings while the
+fake WeatherAPI answers every call with a slow 503: without the circuit breaker each
+lookup waits on the failing upstream (and its retries) before the stale reading is
+served; with it, lookups fail fast to the stale reading once the circuit opens.
+
+    python -m benchmarks.outage --locations 200 --threads 8 --outage-latency-ms 1000
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-outage-benchmark.sqlite3")
+os.environ.setdefault("WEATHERAPI_API_KEY", "bench")
+
+import django  # noqa: E402
+
+from benchmarks.fake_weatherapi import start_fake_weatherapi  # noqa: E402
+from benchmarks.stats import summarize  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--outage-latency-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_weatherapi()
+    os.environ["WEATHERAPI_BASE_URL"] = base_url
+    django.setup()
+
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.db import close_old_connections
+    from django.test.utils import override_settings
+    from django.utils.timezone import now, timedelta
+
+    from services import weatherapi
+    from weather.models import LatestWeather
+    from weather.services import fetch_location_current_weather
+
+    call_command("migrate", verbosity=0)
+    names = [f"outage-city{i}" for i in range(args.locations)]
+    for name in names:
+        fetch_location_current_weather(name)
+
+    def lookup(name):
+        start = time.perf_counter()
+        try:
+            weather = fetch_location_current_weather(name)
+            return time.perf_counter() - start, weather.is_stale
+        finally:
+            close_old_connections()
+
+    handler = server.RequestHandlerClass
+    handler.outage, handler.outage_latency = True, args.outage_latency_ms / 1000
+    # a breaker that can never open stands in for no breaker
+    for label, min_calls in (("no breaker", 10**9), ("circuit breaker", None)):
+        stale = now() - timedelta(days=1)
+        LatestWeather.objects.update(record_timestamp=stale, created_on=stale)
+        cache.clear()
+        weatherapi._circuit_breaker = None
+        with override_settings(**({"WEATHERAPI_BREAKER_MIN_CALLS": min_calls} if min_calls else {})):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                results = list(executor.map(lookup, names))
+            elapsed = time.perf_counter() - start
+            stats = weatherapi.get_circuit_breaker().stats()
+        print(summarize(label, [latency for latency, _ in results], elapsed))
+        print(f"  {sum(stale for _, stale in results)} stale readings served, breaker {stats}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Upstream call rate and per-priority latency during a spike: page-view calls racing a
+bulk ingestion against the fake WeatherAPI, with and without the shared quota limiter.
+
+    python -m benchmarks.quota --per-second 20 --interactive 200 --bulk 1000 --seconds 10
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("WEATHERAPI_API_KEY", "bench")
+
+import django  # noqa: E402
+
+from benchmarks.fake_weatherapi import start_fake_weatherapi  # noqa: E402
+from benchmarks.stats import summarize  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-second", type=int, default=20)
+    parser.add_argument("--interactive", type=int, default=200, help="Page-view calls, spread over --seconds")
+    parser.add_argument("--bulk", type=int, default=1000, help="Ingestion calls, all queued at once")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_weatherapi(latency_ms=args.latency_ms)
+    os.environ["WEATHERAPI_BASE_URL"] = base_url
+    django.setup()
+
+    from django.core.cache import cache
+    from django.test.utils import override_settings
+
+    from services.ratelimit import Priority, upstream_priority
+    from services.weatherapi import WeatherAPIError, get_quota_limiter, get_weather_data_via_api
+
+    def call(priority):
+        start = time.perf_counter()
+        try:
+            with upstream_priority(priority):
+                get_weather_data_via_api("warangal")
+            return time.perf_counter() - start, True
+        except WeatherAPIError:
+            return time.perf_counter() - start, False
+
+    def paced_interactive(index):
+        # page views arrive evenly over the run instead of all at once
+        time.sleep(index * args.seconds / args.interactive)
+        return call(Priority.INTERACTIVE)
+
+    for label, per_second in (("unlimited", 0), (f"limited to {args.per_second}/s", args.per_second)):
+        cache.clear()
+        with override_settings(WEATHERAPI_RATE_PER_SECOND=per_second, WEATHERAPI_QUOTA_PER_MONTH=0):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=16) as bulk_pool, ThreadPoolExecutor(max_workers=32) as page_pool:
+                bulk = [bulk_pool.submit(call, Priority.BULK) for _ in range(args.bulk)]
+                interactive = list(page_pool.map(paced_interactive, range(args.interactive)))
+                bulk = [future.result() for future in bulk]
+            elapsed = time.perf_counter() - start
+            metrics = get_quota_limiter().metrics()
+        calls = sum(ok for _, ok in interactive + bulk)
+        print(f"{label}: {calls} upstream calls in {elapsed:.1f}s ({calls / elapsed:.1f}/s)")
+        for name, results in (("interactive", interactive), ("bulk", bulk)):
+            made = [latency for latency, ok in results if ok]
+            print(f"  {summarize(name, made or [0])}  denied={len(results) - len(made)}")
+        print(f"  denied by the limiter: {metrics['denied']}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Upstream calls and latency of current-weather lookups for a mix of search strings: each
+place is asked for under several spellings, and a share of the lookups are typos
+WeatherAPI does not recognise.
+
+    python -m benchmarks.resolver --places 50 --lookups 2000 --typo-share 0.2 --latency-ms 50
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-resolver-benchmark.sqlite3")
+os.environ.setdefault("WEATHERAPI_API_KEY", "bench")
+
+import django  # noqa: E402
+
+from benchmarks.fake_weatherapi import start_fake_weatherapi  # noqa: E402
+from benchmarks.stats import summarize  # noqa: E402
+
+
+def spellings(place):
+    return [place, place.upper(), f" {place.title()} ", f"{place}, india", f"{place.title()} ,  India"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=50)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--typo-share", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_weatherapi(latency_ms=args.latency_ms)
+    os.environ["WEATHERAPI_BASE_URL"] = base_url
+    django.setup()
+
+    from django.core.management import call_command
+
+    from services.weatherapi import NoLocationFoundException
+    from weather.services import fetch_location_current_weather
+
+    call_command("migrate", verbosity=0)
+    handler = server.RequestHandlerClass
+    places = [f"resolver-city{i}" for i in range(args.places)]
+    typos = [f"nowhere{i}" for i in range(args.places)]
+    handler.unknown_locations = set(typos)
+    rng = random.Random(0)
+    queries = [
+        rng.choice(typos) if rng.random() < args.typo_share else rng.choice(spellings(rng.choice(places)))
+        for _ in range(args.lookups)
+    ]
+
+    samples = []
+    start = time.perf_counter()
+    for query in queries:
+        started = time.perf_counter()
+        try:
+            fetch_location_current_weather(query)
+        except NoLocationFoundException:
+            pass
+        samples.append(time.perf_counter() - started)
+    elapsed = time.perf_counter() - start
+    print(summarize("lookups", samples, elapsed))
+    print(f"  {len(handler.queries)} upstream calls for {len(set(queries))} distinct queries")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""Settings for running the app under the benchmarks against a throwaway database."""
+from weatherpulse.settings import *  # noqa: F401,F403
+from weatherpulse.settings import os
+
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'benchmark')
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('BENCHMARK_DB', '/tmp/weatherpulse-benchmark.sqlite3'),
+        # the benchmarks measure the request path, not fsync latency
+        'OPTIONS': {'timeout': 30, 'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=OFF;'},
+    }
+}
@@ -0,0 +1,92 @@
+"""
+Latency of map-area and nearest-location reads over N stored locations: the geohash
+prefix ranges against plain latitude/longitude range filters (no usable index).
+
+    python -m benchmarks.spatial --locations 200000 --lookups 500 --box-degrees 1 --km 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-spatial-benchmark.sqlite3")
+
+import django  # noqa: E402
+
+from benchmarks.stats import summarize  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--box-degrees", type=float, default=1)
+    parser.add_argument("--km", type=float, default=5)
+    args = parser.parse_args()
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.utils.timezone import now
+
+    from weather.geo import bounding_box, distance_km, encode
+    from weather.models import LatestWeather
+    from weather.selectors import get_latest_weather_in_box, get_nearest_latest_weather
+
+    call_command("migrate", verbosity=0)
+    rng = random.Random(0)
+    # a populated land area the size of India
+    points = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(args.locations)]
+    db = sqlite3.connect(connection.settings_dict["NAME"])
+    if not db.execute("SELECT COUNT(*) FROM weather_latestweather").fetchone()[0]:
+        timestamp = now().isoformat(sep=" ")
+        with db:
+            db.executemany(
+                "INSERT INTO weather_location (name, region, country, latitude, longitude, geohash) "
+                "VALUES (?, 'Region', 'Country', ?, ?, ?)",
+                ((f"place{i}", lat, lon, encode(lat, lon)) for i, (lat, lon) in enumerate(points)),
+            )
+            db.execute(
+                "INSERT INTO weather_latestweather (location_id, temperature, temperature_feels_like, wind_speed, "
+                "wind_direction, pressure, precipitation, humidity, dewpoint, uv_index, gust_speed, visibility, "
+                "record_timestamp, created_on) SELECT id, 30, 33, 10, 'NW', 1003, 0, 70, 24, 6, 20, 9, ?, ? "
+                "FROM weather_location",
+                (timestamp, timestamp),
+            )
+    centers = rng.sample(points, args.lookups)
+
+    def scan_box(south, west, north, east):
+        return list(LatestWeather.objects.select_related("location", "condition").filter(
+            location__latitude__range=(south, north), location__longitude__range=(west, east)
+        ))
+
+    def scan_nearest(latitude, longitude, km):
+        candidates = scan_box(*bounding_box(latitude, longitude, km))
+        return min(
+            ((weather, distance_km(latitude, longitude, weather.location.latitude, weather.location.longitude))
+             for weather in candidates), key=lambda pair: pair[1], default=None,
+        )
+
+    half = args.box_degrees / 2
+    boxes = [(lat - half, lon - half, lat + half, lon + half) for lat, lon in centers]
+    found = sum(len(get_latest_weather_in_box(*box)) for box in boxes[:20]) / 20
+    print(f"{args.locations} locations, {found:.0f} per {args.box_degrees}° box on average")
+    for label, read, inputs in (
+        ("box geohash", get_latest_weather_in_box, boxes),
+        ("box lat/lon scan", scan_box, boxes),
+        ("nearest geohash", get_nearest_latest_weather, [(*center, args.km) for center in centers]),
+        ("nearest lat/lon scan", scan_nearest, [(*center, args.km) for center in centers]),
+    ):
+        samples = []
+        start = time.perf_counter()
+        for arguments in inputs:
+            started = time.perf_counter()
+            read(*arguments)
+            samples.append(time.perf_counter() - started)
+        print(summarize(label, samples, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import statistics
+
+
+def summarize(label, samples, elapsed=None):
+    """Format p50/p99 latency (samples in seconds) and optional throughput."""
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    line = f"{label:<28} n={len(samples):<6} p50={p50:8.3f}ms  p99={p99:8.3f}ms"
+    if elapsed:
+        line += f"  {len(samples) / elapsed:9.1f} req/s"
+    return line
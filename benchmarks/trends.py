@@ -0,0 +1,134 @@
+"""
+Query count and latency of `get_weather_trends` on a large LocationWeather table:
+the previous exists() + six aggregate() implementation, the single aggregate over the
+raw readings, the hourly/daily rollups and the in-process recent history buffers.
+
+    python -m benchmarks.trends --rows 2000000 --locations 1000 --days 28
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+os.environ.setdefault("BENCHMARK_DB", "/tmp/weatherpulse-trends-benchmark.sqlite3")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, models  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings  # noqa: E402
+from django.utils.timezone import now, timedelta  # noqa: E402
+
+from benchmarks.stats import summarize  # noqa: E402
+from weather.history import recent_history  # noqa: E402
+from weather.models import Location, LocationWeather  # noqa: E402
+from weather.selectors import get_latest_weather_for_location, get_weather_trends  # noqa: E402
+from weather.services import update_weather_rollups  # noqa: E402
+
+
+def populate(rows, locations):
+    """Insert synthetic 15-minute readings with raw executemany (the ORM is too slow for millions)."""
+    existing = LocationWeather.objects.count()
+    if existing >= rows:
+        return
+    start = now() - timedelta(minutes=15 * (rows // locations))
+    db = sqlite3.connect(connection.settings_dict["NAME"])
+    with db:
+        db.executemany(
+            "INSERT OR IGNORE INTO weather_location (name, region, country, latitude, longitude) VALUES (?, ?, ?, ?, ?)",
+            ((f"city{i}", "Region", "Country", 18.0, 79.58) for i in range(locations)),
+        )
+        db.execute("INSERT OR IGNORE INTO weather_weathercondition (code, text, icon) VALUES (1000, 'Clear', '')")
+    location_ids = dict(db.execute("SELECT name, id FROM weather_location"))
+    (condition_id,) = db.execute("SELECT id FROM weather_weathercondition WHERE text = 'Clear'").fetchone()
+    columns = (
+        "location_id, condition_id, temperature, temperature_feels_like, wind_speed, wind_direction, pressure, "
+        "precipitation, humidity, dewpoint, uv_index, gust_speed, visibility, record_timestamp, created_on"
+    )
+    sql = f"INSERT INTO weather_locationweather ({columns}) VALUES ({', '.join('?' * 15)})"
+
+    def generate():
+        for i in range(existing, rows):
+            timestamp = (start + timedelta(minutes=15 * (i // locations))).isoformat(sep=" ")
+            yield (
+                location_ids[f"city{i % locations}"], condition_id, random.uniform(-5, 40),
+                random.uniform(-5, 40), random.uniform(0, 80), "NW", random.uniform(980, 1040),
+                random.uniform(0, 5), random.uniform(10, 100), random.uniform(-5, 25), 5,
+                random.uniform(0, 90), 10, timestamp, timestamp,
+            )
+
+    with db:
+        db.executemany(sql, generate())
+        # current conditions snapshot, as kept by `update_latest_weather` on ingest
+        db.execute(
+            f"INSERT OR REPLACE INTO weather_latestweather ({columns}) SELECT {columns} FROM weather_locationweather "
+            "WHERE id IN (SELECT (SELECT id FROM weather_locationweather WHERE location_id = l.id "
+            "ORDER BY record_timestamp DESC LIMIT 1) FROM weather_location l)"
+        )
+    db.close()
+
+
+def previous_get_weather_trends(location_id, days=1):
+    end_time = now()
+    weather_data = LocationWeather.objects.filter(location_id=location_id, record_timestamp__range=[end_time - timedelta(days=days), end_time])
+    if weather_data.exists():
+        return {
+            field: weather_data.aggregate(models.Avg(field))[f"{field}__avg"]
+            for field in ("temperature", "wind_speed", "pressure", "precipitation", "humidity", "dewpoint")
+        }
+
+
+def measure(label, fn, location_ids, days):
+    samples = []
+    with CaptureQueriesContext(connection) as queries:
+        for location_id in location_ids:
+            start = time.perf_counter()
+            fn(location_id, days=days)
+            samples.append(time.perf_counter() - start)
+    print(summarize(label, samples) + f"  queries/call={len(queries) / len(location_ids):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--locations", type=int, default=1000)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--days", type=float, default=7)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    populate(args.rows, args.locations)
+    started = time.perf_counter()
+    rolled_up = update_weather_rollups()
+    print(f"rolled up {rolled_up} new readings in {time.perf_counter() - started:.1f}s")
+
+    location_ids = random.choices(list(Location.objects.values_list("id", flat=True)), k=args.calls)
+    # the home view already holds the latest reading and passes it in
+    latest = {location_id: get_latest_weather_for_location(location_id) for location_id in set(location_ids)}
+
+    def trends(location_id, days):
+        return get_weather_trends(location_id, days=days, latest=latest[location_id])
+
+    with override_settings(WEATHER_HISTORY_STORE=False):
+        measure("previous (exists + 6 aggs)", previous_get_weather_trends, location_ids, args.days)
+        with override_settings(WEATHER_TRENDS_FROM_ROLLUPS=False):
+            measure("single aggregate (readings)", trends, location_ids, args.days)
+        measure("rollups", trends, location_ids, args.days)
+
+    # buffers sized to hold the whole window of 15-minute readings
+    with override_settings(
+        WEATHER_HISTORY_STORE=True, WEATHER_HISTORY_WINDOW_HOURS=args.days * 24,
+        WEATHER_HISTORY_CAPACITY=int(args.days * 96) + 1, WEATHER_HISTORY_SYNC_INTERVAL=3600,
+    ):
+        started = time.perf_counter()
+        recent_history.warm(set(location_ids))
+        print(f"warmed recent history in {time.perf_counter() - started:.1f}s: {recent_history.stats()}")
+        measure("recent history", trends, location_ids, args.days)
+
+
+if __name__ == "__main__":
+    main()
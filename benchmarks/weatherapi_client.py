@@ -0,0 +1,51 @@
+"""
+Latency of bare `requests.get` vs the pooled WeatherAPIClient against a local fake upstream.
+
+    python -m benchmarks.weatherapi_client --requests 2000 --threads 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_weatherapi import start_fake_weatherapi
+from benchmarks.stats import summarize
+from services.weatherapi import WeatherAPIClient
+
+
+def run(call, total, threads):
+    def timed(_):
+        start = time.perf_counter()
+        response = call()
+        response.json()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        samples = list(pool.map(timed, range(total)))
+    return samples, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_weatherapi(latency_ms=args.latency_ms)
+    client = WeatherAPIClient(base_url=base_url, api_key="bench", pool_maxsize=args.threads)
+    url = f"{base_url}/current.json?key=bench&q=warangal"
+    try:
+        print(summarize("requests.get (no session)", *run(lambda: requests.get(url), args.requests, args.threads)))
+        print(summarize("WeatherAPIClient (gzip)", *run(lambda: client.get("current.json", q="warangal"), args.requests, args.threads)))
+        client.session.headers["Accept-Encoding"] = "identity"
+        print(summarize("WeatherAPIClient (identity)", *run(lambda: client.get("current.json", q="warangal"), args.requests, args.threads)))
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Load comparison of the sync `home` view under gunicorn (WSGI) and the async `ahome`
+view under uvicorn (ASGI), both against a local fake WeatherAPI with artificial latency.
+
+The cache TTL is forced to zero so every page view makes an upstream call, which is
+the path that caps WSGI concurrency at workers x threads.
+
+    pip install uvicorn
+    python -m benchmarks.wsgi_vs_asgi --latency-ms 200 --concurrency 100 --requests 1000
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.fake_weatherapi import start_fake_weatherapi
+from benchmarks.stats import summarize
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=10)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+async def load(url, total, concurrency):
+    samples = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.get(url)
+            samples.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return samples, time.perf_counter() - start, errors
+
+
+def run_server(label, command, url, env, args):
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(url)
+        samples, elapsed, errors = asyncio.run(load(url, args.requests, args.concurrency))
+        print(summarize(label, samples, elapsed) + f"  errors={errors}")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per WSGI worker")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_weatherapi(latency_ms=args.latency_ms)
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "benchmarks.settings",
+        "WEATHERAPI_BASE_URL": base_url,
+        "WEATHERAPI_API_KEY": "bench",
+        "WEATHER_CACHE_TTL": "0",
+        "WEATHER_CACHE_MIN_TTL": "0",
+    }
+    subprocess.run([sys.executable, "manage.py", "migrate", "-v", "0"], env=env, check=True)
+    bind = f"127.0.0.1:{args.port}"
+    try:
+        run_server(
+            f"WSGI gunicorn {args.workers}x{args.threads}",
+            [sys.executable, "-m", "gunicorn", "weatherpulse.wsgi", "-b", bind,
+             "-w", str(args.workers), "--threads", str(args.threads)],
+            f"http://{bind}/", env, args,
+        )
+        run_server(
+            f"ASGI uvicorn {args.workers}w",
+            [sys.executable, "-m", "uvicorn", "weatherpulse.asgi:application", "--host", "127.0.0.1",
+             "--port", str(args.port), "--workers", str(args.workers), "--no-access-log"],
+            f"http://{bind}/async/", env, args,
+        )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
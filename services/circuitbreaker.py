@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """
+    Error-rate and latency circuit breaker around an upstream.
+
+    The outcome of every call in the last `window` seconds is kept; once at least
+    `min_calls` were made and the share that failed or took `slow_call` seconds or more
+    reaches `failure_rate`, the circuit opens and `allow()` refuses calls for
+    `open_seconds`, so callers fail fast instead of queueing on a dead upstream. After
+    that a single probe call is let through (half-open): its success closes the circuit,
+    its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        *,
+        window: float = 30,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call: float = 5,
+        open_seconds: float = 30,
+        clock=time.monotonic,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probing = False
+        # (finished_at, failed) of the calls in the window, oldest first
+        self._calls = deque()
+        self._failures = 0
+        self._opened = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._expire_open()
+            return self._state
+
+    def _expire_open(self):
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probing = False
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self.clock()
+        self._opened += 1
+        self._calls.clear()
+        self._failures = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; in the half-open state only the first caller gets through."""
+        with self._lock:
+            self._expire_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, elapsed: float, failed: bool = False):
+        """Record the outcome of an allowed call that took `elapsed` seconds."""
+        failed = failed or elapsed >= self.slow_call
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self._state = self.CLOSED
+                return
+            if self._state == self.OPEN:
+                # a call that started before the circuit opened
+                return
+            finished_at = self.clock()
+            self._calls.append((finished_at, failed))
+            self._failures += failed
+            while self._calls and self._calls[0][0] <= finished_at - self.window:
+                self._failures -= self._calls.popleft()[1]
+            if len(self._calls) >= self.min_calls and self._failures >= self.failure_rate * len(self._calls):
+                self._open()
+
+    def retry_in(self) -> float:
+        """Seconds until the open circuit lets a probe call through (0 unless open)."""
+        with self._lock:
+            self._expire_open()
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - self.clock())
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire_open()
+            return {
+                "state": self._state,
+                "calls": len(self._calls),
+                "failures": self._failures,
+                "opened": self._opened,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,99 @@
+"""
+Decoding of WeatherAPI response bodies.
+
+`loads` uses orjson when it is installed and the stdlib `json` module otherwise
+(WEATHERAPI_JSON_BACKEND picks one explicitly). `load_forecast` walks a forecast body
+with ijson's event parser and keeps only the hour fields we store, so the ~35 keys of
+each of the up to 336 hourly entries are never materialized as dicts.
+"""
+import json
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+JSON_BACKENDS = ("auto", "orjson", "json")
+FORECAST_DAY_PREFIX = "forecast.forecastday.item"
+FORECAST_HOUR_PREFIX = "forecast.forecastday.item.hour.item"
+# small objects kept whole
+FORECAST_SUBTREES = frozenset({"location", "current", f"{FORECAST_DAY_PREFIX}.day", f"{FORECAST_DAY_PREFIX}.astro"})
+
+
+def get_json_loads(backend=None):
+    """Return the `loads` function of the configured JSON backend."""
+    backend = backend or settings.WEATHERAPI_JSON_BACKEND
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend {backend!r}, expected one of {', '.join(JSON_BACKENDS)}")
+    if backend == "orjson" or (backend == "auto" and orjson is not None):
+        if orjson is None:
+            raise ImportError("WEATHERAPI_JSON_BACKEND is 'orjson' but orjson is not installed")
+        return orjson.loads
+    return json.loads
+
+
+def loads(body: bytes | str):
+    return get_json_loads()(body)
+
+
+def can_stream() -> bool:
+    return ijson is not None
+
+
+def load_forecast(body: bytes | str, hour_fields):
+    """
+    Decode a forecast.json body keeping only `hour_fields` (dotted paths such as
+    `condition.text`) of each hourly entry. `location`, `current` and each day's
+    `day`/`astro`/`date` are kept whole; everything else (alerts, air quality) is skipped.
+
+    Returns the same shape as `loads`, so the result can go through `parse_forecast`.
+    Falls back to `loads` when ijson is not installed.
+    """
+    if ijson is None:
+        return loads(body)
+
+    hour_fields = {f"{FORECAST_HOUR_PREFIX}.{field}": field.split(".") for field in hour_fields}
+    response_json = {"forecast": {"forecastday": []}}
+    forecast_days = response_json["forecast"]["forecastday"]
+    builder = builder_prefix = None
+    hour = None
+    for prefix, event, value in ijson.parse(body, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == builder_prefix and event in ("end_map", "end_array"):
+                if builder_prefix in ("location", "current"):
+                    response_json[builder_prefix] = builder.value
+                else:
+                    forecast_days[-1][builder_prefix.rsplit(".", 1)[1]] = builder.value
+                builder = None
+        elif hour is not None:
+            path = hour_fields.get(prefix)
+            if path is not None:
+                target = hour
+                for key in path[:-1]:
+                    target = target.setdefault(key, {})
+                target[path[-1]] = value
+            elif prefix == FORECAST_HOUR_PREFIX and event == "end_map":
+                forecast_days[-1]["hour"].append(hour)
+                hour = None
+        elif prefix == FORECAST_HOUR_PREFIX and event == "start_map":
+            hour = {}
+        elif prefix in FORECAST_SUBTREES and event in ("start_map", "start_array"):
+            builder = ijson.ObjectBuilder()
+            builder_prefix = prefix
+            builder.event(event, value)
+        elif prefix == FORECAST_DAY_PREFIX and event == "start_map":
+            forecast_days.append({"hour": []})
+        elif prefix == f"{FORECAST_DAY_PREFIX}.date":
+            forecast_days[-1]["date"] = value
+        elif prefix == f"{FORECAST_DAY_PREFIX}.date_epoch":
+            forecast_days[-1]["date_epoch"] = value
+    return response_json
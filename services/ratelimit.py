@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import enum
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0  # page views and API requests
+    BACKGROUND = 1  # refresh worker and revalidation of stale readings
+    BULK = 2  # ingestion
+
+
+_priority = contextvars.ContextVar("upstream_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def upstream_priority(priority: Priority):
+    """Run upstream calls made in this context (thread or task) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def get_upstream_priority() -> Priority:
+    return _priority.get()
+
+
+class QuotaLimiter:
+    """
+    Calls-per-second and calls-per-month budget shared by every worker through a cache.
+
+    Each second and each calendar month (UTC) has a counter taken with the atomic
+    `cache.incr`, so the per-second bucket refills to `per_second` tokens at every second
+    boundary. Priorities share the budget unevenly: a priority may use only `shares` of a
+    second's tokens and stops once less than `reserves` of the month is left, so bulk and
+    background calls are deferred first and user-facing calls keep headroom. Below
+    interactive priority a share is at least one token but always leaves one for page
+    views, so with `per_second=1` only interactive calls go out. A caller without a token
+    waits for the next second for up to `max_wait` seconds. A limit of 0 turns that limit
+    off. The counters only bound every worker together in a cache they all share.
+    """
+
+    SECOND_KEY = "weatherapi:quota:second:{second}"
+    MONTH_KEY = "weatherapi:quota:month:{month}"
+    WAITING_KEY = "weatherapi:quota:waiting:{priority}"
+    DENIED_KEY = "weatherapi:quota:denied:{priority}"
+    MONTH_TIMEOUT = 32 * 24 * 3600
+
+    shares = {Priority.INTERACTIVE: 1.0, Priority.BACKGROUND: 0.5, Priority.BULK: 0.25}
+    reserves = {Priority.INTERACTIVE: 0.0, Priority.BACKGROUND: 0.05, Priority.BULK: 0.2}
+
+    def __init__(self, *, cache, per_second=0, per_month=0, max_wait=None, clock=time.time, sleep=time.sleep):
+        self.cache = cache
+        self.per_second = per_second
+        self.per_month = per_month
+        # background refreshes are rescheduled by the refresh worker, so they do not wait
+        self.max_wait = max_wait or {Priority.INTERACTIVE: 1.0, Priority.BACKGROUND: 0.0, Priority.BULK: 10.0}
+        self.clock = clock
+        self.sleep = sleep
+
+    def _month_key(self, current):
+        return self.MONTH_KEY.format(month=datetime.fromtimestamp(current, timezone.utc).strftime("%Y-%m"))
+
+    def _incr(self, key, timeout, delta=1):
+        self.cache.add(key, 0, timeout=timeout)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            # expired between add and incr
+            self.cache.set(key, delta, timeout=timeout)
+            return delta
+
+    def _decr(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            # expired or evicted; nothing left to give back
+            pass
+
+    async def _aincr(self, key, timeout, delta=1):
+        await self.cache.aadd(key, 0, timeout=timeout)
+        try:
+            return await self.cache.aincr(key, delta)
+        except ValueError:
+            await self.cache.aset(key, delta, timeout=timeout)
+            return delta
+
+    async def _adecr(self, key):
+        try:
+            await self.cache.adecr(key)
+        except ValueError:
+            pass
+
+    def second_limit(self, priority: Priority) -> int:
+        """
+        Tokens of each second `priority` may use: its share, and below interactive priority
+        at least one but never the token kept for page views (so 0 when `per_second` is 1).
+        """
+        if priority == Priority.INTERACTIVE:
+            return math.floor(self.per_second * self.shares[priority])
+        return min(self.per_second - 1, max(1, math.floor(self.per_second * self.shares[priority])))
+
+    def try_acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Take a token now; returns None on success, else "second" or "month" for the exhausted budget."""
+        current = self.clock()
+        month_key = self._month_key(current)
+        month_limit = self.per_month * (1 - self.reserves[priority])
+        if self.per_month and self.cache.get(month_key, 0) >= month_limit:
+            return "month"
+        if self.per_second:
+            second_key = self.SECOND_KEY.format(second=math.floor(current))
+            if self._incr(second_key, timeout=2) > self.second_limit(priority):
+                self._decr(second_key)
+                return "second"
+        if self.per_month and self._incr(month_key, timeout=self.MONTH_TIMEOUT) > month_limit:
+            # lost a race for the last tokens of the month
+            self.release(current)
+            return "month"
+        return None
+
+    async def atry_acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Async variant of `try_acquire`."""
+        current = self.clock()
+        month_key = self._month_key(current)
+        month_limit = self.per_month * (1 - self.reserves[priority])
+        if self.per_month and await self.cache.aget(month_key, 0) >= month_limit:
+            return "month"
+        if self.per_second:
+            second_key = self.SECOND_KEY.format(second=math.floor(current))
+            if await self._aincr(second_key, timeout=2) > self.second_limit(priority):
+                await self._adecr(second_key)
+                return "second"
+        if self.per_month and await self._aincr(month_key, timeout=self.MONTH_TIMEOUT) > month_limit:
+            await self.arelease(current)
+            return "month"
+        return None
+
+    def _release_keys(self, acquired_at):
+        acquired_at = self.clock() if acquired_at is None else acquired_at
+        return self.SECOND_KEY.format(second=math.floor(acquired_at)), self._month_key(acquired_at)
+
+    def release(self, acquired_at=None):
+        """Give back a token taken at `acquired_at` (a clock() value) by a call that was not made."""
+        for key in self._release_keys(acquired_at):
+            self._decr(key)
+
+    async def arelease(self, acquired_at=None):
+        """Async variant of `release`."""
+        for key in self._release_keys(acquired_at):
+            await self._adecr(key)
+
+    def _wait_for(self, deadline):
+        """Seconds to sleep before retrying, or None when the caller should give up."""
+        current = self.clock()
+        wake_at = math.floor(current) + 1
+        return None if wake_at > deadline else wake_at - current
+
+    def _deny(self, priority):
+        self._incr(self.DENIED_KEY.format(priority=priority.name.lower()), timeout=None)
+        return False
+
+    async def _adeny(self, priority):
+        await self._aincr(self.DENIED_KEY.format(priority=priority.name.lower()), timeout=None)
+        return False
+
+    def acquire(self, priority: Priority = Priority.INTERACTIVE) -> bool:
+        """Take a token, waiting up to `max_wait[priority]` seconds for one; False when none came."""
+        exhausted = self.try_acquire(priority)
+        if exhausted is None:
+            return True
+        deadline = self.clock() + self.max_wait[priority]
+        waiting_key = self.WAITING_KEY.format(priority=priority.name.lower())
+        self._incr(waiting_key, timeout=None)
+        try:
+            # a priority with no share of a second cannot get one by waiting
+            while exhausted == "second" and self.second_limit(priority):
+                delay = self._wait_for(deadline)
+                if delay is None:
+                    break
+                self.sleep(delay)
+                exhausted = self.try_acquire(priority)
+        finally:
+            self._decr(waiting_key)
+        return exhausted is None or self._deny(priority)
+
+    async def aacquire(self, priority: Priority = Priority.INTERACTIVE) -> bool:
+        """Async variant of `acquire`; waits without blocking the event loop."""
+        exhausted = await self.atry_acquire(priority)
+        if exhausted is None:
+            return True
+        deadline = self.clock() + self.max_wait[priority]
+        waiting_key = self.WAITING_KEY.format(priority=priority.name.lower())
+        await self._aincr(waiting_key, timeout=None)
+        try:
+            while exhausted == "second" and self.second_limit(priority):
+                delay = self._wait_for(deadline)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                exhausted = await self.atry_acquire(priority)
+        finally:
+            await self._adecr(waiting_key)
+        return exhausted is None or await self._adeny(priority)
+
+    def metrics(self) -> dict:
+        """Budget left this second and month, callers waiting for a token and calls denied, by priority."""
+        current = self.clock()
+        used_second = self.cache.get(self.SECOND_KEY.format(second=math.floor(current)), 0)
+        used_month = self.cache.get(self._month_key(current), 0)
+        names = [priority.name.lower() for priority in Priority]
+        waiting = self.cache.get_many([self.WAITING_KEY.format(priority=name) for name in names])
+        denied = self.cache.get_many([self.DENIED_KEY.format(priority=name) for name in names])
+        return {
+            "per_second": self.per_second,
+            "remaining_second": max(0, self.per_second - used_second) if self.per_second else None,
+            "per_month": self.per_month,
+            "used_month": used_month,
+            "remaining_month": max(0, self.per_month - used_month) if self.per_month else None,
+            "waiting": {name: waiting.get(self.WAITING_KEY.format(priority=name), 0) for name in names},
+            "denied": {name: denied.get(self.DENIED_KEY.format(priority=name), 0) for name in names},
+        }
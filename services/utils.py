@@ -19,6 +19,16 @@ def convert_ist_to_utc(ist_datetime_str: str) -> datetime:
     return utc_time
 
 
+def convert_epoch_to_utc(epoch: int) -> datetime:
+    """
+    Converts a unix epoch (seconds) to an aware UTC datetime.
+
+    WeatherAPI's `last_updated` string is in the location's local time, so the
+    `*_epoch` fields are the only timezone-safe timestamps in its responses.
+    """
+    return datetime.fromtimestamp(epoch, tz=pytz.utc)
+
+
 def convert_celsius_to_fahreheit(celsius):
     return 1.8 * float(celsius) + 32
 
@@ -1,11 +1,25 @@
+import asyncio
 import logging
+import os
+import random
+import threading
+import time
+import weakref
+import httpx
 import requests
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
 
 from django.conf import settings
+from django.core.cache import caches
 
-from services.utils import convert_ist_to_utc
+from services.circuitbreaker import CircuitBreaker
+from services.decoders import load_forecast, loads
+from services.ratelimit import QuotaLimiter, get_upstream_priority
+from services.utils import convert_epoch_to_utc
 
 
 logger = logging.getLogger(__name__)
@@ -15,6 +29,18 @@ class NoLocationFoundException(Exception):
     """No location found for the given query"""
 
 
+class WeatherAPIError(Exception):
+    """WeatherAPI could not be reached or answered with an error"""
+
+
+class CircuitOpenError(WeatherAPIError):
+    """WeatherAPI calls are refused while the circuit breaker is open"""
+
+
+class RateLimitedError(WeatherAPIError):
+    """No WeatherAPI call budget left for the caller's priority"""
+
+
 @dataclass
 class LocationWeatherData:
     name: str
@@ -24,6 +50,7 @@ class LocationWeatherData:
     longitude: float
     condition: str
     condition_icon: str
+    condition_code: int | None
     temperature: float
     temperature_feels_like: float
     wind_speed: float
@@ -38,6 +65,438 @@ class LocationWeatherData:
     record_timestamp: datetime
 
 
+@dataclass
+class ForecastDayData:
+    date: date
+    condition: str
+    condition_icon: str
+    condition_code: int | None
+    max_temperature: float
+    min_temperature: float
+    avg_temperature: float
+    max_wind_speed: float
+    total_precipitation: float
+    avg_humidity: float
+    chance_of_rain: int
+    chance_of_snow: int
+    uv_index: float
+    sunrise: str
+    sunset: str
+
+
+@dataclass
+class ForecastHourData:
+    forecast_timestamp: datetime
+    condition: str
+    condition_icon: str
+    condition_code: int | None
+    temperature: float
+    temperature_feels_like: float
+    wind_speed: float
+    wind_direction: str
+    pressure: float
+    precipitation: float
+    humidity: float
+    chance_of_rain: int
+    uv_index: float
+    gust_speed: float
+    visibility: float
+
+
+@dataclass
+class LocationForecastData:
+    current: LocationWeatherData
+    days: list[ForecastDayData]
+    hours: list[ForecastHourData]
+
+
+@dataclass
+class LocationSearchData:
+    name: str
+    region: str
+    country: str
+    latitude: float
+    longitude: float
+
+
+class QuotaRetry(Retry):
+    """`Retry` that takes a quota token for every retry, so retries cannot overrun the call budget."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if not get_quota_limiter().acquire(get_upstream_priority()):
+            # urllib3 returns the last response, or raises for the connection error
+            raise MaxRetryError(_pool, url, error)
+        return retry
+
+
+class WeatherAPIClient:
+    """
+    Process-wide HTTP client for WeatherAPI.
+
+    Holds a keep-alive connection pool so calls reuse TCP connections instead of
+    paying a handshake and DNS lookup each time, applies connect/read timeouts so a
+    slow upstream cannot hang a worker, and retries 5xx and connection errors a
+    bounded number of times with jittered exponential backoff. Each retry spends a
+    quota token like any other call, and is not made without one.
+    """
+
+    RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        api_key: str,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        max_retries: int = 2,
+        backoff_factor: float = 0.3,
+        backoff_jitter: float = 0.2,
+        pool_connections: int = 4,
+        pool_maxsize: int = 20,
+        gzip: bool = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = QuotaRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            status_forcelist=self.RETRY_STATUS_CODES,
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate" if gzip else "identity"
+
+    def get(self, endpoint: str, **params) -> requests.Response:
+        return self.session.get(
+            f"{self.base_url}/{endpoint}", params={"key": self.api_key, **params}, timeout=self.timeout
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_weatherapi_client() -> WeatherAPIClient:
+    """Return the shared client for this process, building it from settings on first use."""
+    global _client, _client_pid
+    # connection pools must not be shared across a fork (e.g. gunicorn preload)
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = WeatherAPIClient(
+                    base_url=settings.WEATHERAPI_BASE_URL,
+                    api_key=settings.WEATHERAPI_API_KEY,
+                    connect_timeout=settings.WEATHERAPI_CONNECT_TIMEOUT,
+                    read_timeout=settings.WEATHERAPI_READ_TIMEOUT,
+                    max_retries=settings.WEATHERAPI_MAX_RETRIES,
+                    backoff_factor=settings.WEATHERAPI_RETRY_BACKOFF,
+                    backoff_jitter=settings.WEATHERAPI_RETRY_JITTER,
+                    pool_maxsize=settings.WEATHERAPI_POOL_MAXSIZE,
+                    gzip=settings.WEATHERAPI_GZIP,
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+class AsyncWeatherAPIClient:
+    """
+    asyncio counterpart of `WeatherAPIClient` built on httpx.
+
+    Keeps a bounded keep-alive pool per event loop so a single ASGI worker can hold
+    many upstream requests in flight, with the same timeouts and retry policy (quota
+    tokens included) as the sync client.
+    """
+
+    RETRY_STATUS_CODES = WeatherAPIClient.RETRY_STATUS_CODES
+
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        api_key: str,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        max_retries: int = 2,
+        backoff_factor: float = 0.3,
+        backoff_jitter: float = 0.2,
+        max_connections: int = 100,
+        gzip: bool = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers={"Accept-Encoding": "gzip, deflate" if gzip else "identity"},
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_jitter)
+
+    async def _may_retry(self, attempt: int) -> bool:
+        return attempt < self.max_retries and await get_quota_limiter().aacquire(get_upstream_priority())
+
+    async def get(self, endpoint: str, **params) -> httpx.Response:
+        url = f"{self.base_url}/{endpoint}"
+        params = {"key": self.api_key, **params}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.get(url, params=params)
+            except httpx.TransportError:
+                if not await self._may_retry(attempt):
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUS_CODES or not await self._may_retry(attempt):
+                    return response
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# httpx pools are bound to the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_weatherapi_client() -> AsyncWeatherAPIClient:
+    """Return the shared async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncWeatherAPIClient(
+            base_url=settings.WEATHERAPI_BASE_URL,
+            api_key=settings.WEATHERAPI_API_KEY,
+            connect_timeout=settings.WEATHERAPI_CONNECT_TIMEOUT,
+            read_timeout=settings.WEATHERAPI_READ_TIMEOUT,
+            max_retries=settings.WEATHERAPI_MAX_RETRIES,
+            backoff_factor=settings.WEATHERAPI_RETRY_BACKOFF,
+            backoff_jitter=settings.WEATHERAPI_RETRY_JITTER,
+            max_connections=settings.WEATHERAPI_ASYNC_MAX_CONNECTIONS,
+            gzip=settings.WEATHERAPI_GZIP,
+        )
+    return client
+
+
+_circuit_breaker = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Return this process's circuit breaker for WeatherAPI, shared by the sync and async clients."""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        with _client_lock:
+            if _circuit_breaker is None:
+                _circuit_breaker = CircuitBreaker(
+                    window=settings.WEATHERAPI_BREAKER_WINDOW,
+                    min_calls=settings.WEATHERAPI_BREAKER_MIN_CALLS,
+                    failure_rate=settings.WEATHERAPI_BREAKER_FAILURE_RATE,
+                    slow_call=settings.WEATHERAPI_BREAKER_SLOW_CALL,
+                    open_seconds=settings.WEATHERAPI_BREAKER_OPEN_SECONDS,
+                )
+    return _circuit_breaker
+
+
+def get_quota_limiter() -> QuotaLimiter:
+    """
+    WeatherAPI call budget, shared by every worker using the WEATHER_CACHE_ALIAS cache
+    (per process with the default local-memory cache).
+    """
+    return QuotaLimiter(
+        cache=caches[settings.WEATHER_CACHE_ALIAS],
+        per_second=settings.WEATHERAPI_RATE_PER_SECOND,
+        per_month=settings.WEATHERAPI_QUOTA_PER_MONTH,
+    )
+
+
+def parse_current_weather(response_json) -> LocationWeatherData:
+    location_data = response_json["location"]
+    weather_data = response_json["current"]
+    current_condition = weather_data.get("condition", {})
+    record_timestamp = convert_epoch_to_utc(weather_data["last_updated_epoch"])
+    return LocationWeatherData(
+        name=location_data["name"],
+        region=location_data["region"],
+        country=location_data["country"],
+        latitude=location_data["lat"],
+        longitude=location_data["lon"],
+        condition=current_condition.get("text", ""),
+        condition_icon=current_condition.get("icon", ""),
+        condition_code=current_condition.get("code"),
+        temperature=weather_data["temp_c"],
+        temperature_feels_like=weather_data["feelslike_c"],
+        wind_speed=weather_data["wind_kph"],
+        wind_direction=weather_data["wind_dir"],
+        pressure=weather_data["pressure_mb"],
+        precipitation=weather_data["precip_mm"],
+        humidity=weather_data["humidity"],
+        dewpoint=weather_data["dewpoint_c"],
+        uv_index=weather_data["uv"],
+        gust_speed=weather_data["gust_kph"],
+        visibility=weather_data["vis_km"],
+        record_timestamp=record_timestamp,
+    )
+
+
+# hourly forecast keys read by `parse_forecast`; the streaming decoder drops the rest
+FORECAST_HOUR_FIELDS = (
+    "time_epoch", "condition.text", "condition.icon", "condition.code", "temp_c", "feelslike_c", "wind_kph",
+    "wind_dir", "pressure_mb", "precip_mm", "humidity", "chance_of_rain", "uv", "gust_kph", "vis_km",
+)
+
+
+def decode_forecast(body):
+    """Decode a forecast.json body, keeping only the stored hour fields when WEATHERAPI_JSON_STREAMING is on."""
+    if settings.WEATHERAPI_JSON_STREAMING:
+        return load_forecast(body, FORECAST_HOUR_FIELDS)
+    return loads(body)
+
+
+def parse_forecast(response_json) -> LocationForecastData:
+    days = []
+    hours = []
+    for forecast_day in response_json["forecast"]["forecastday"]:
+        day_data = forecast_day["day"]
+        day_condition = day_data.get("condition", {})
+        astro = forecast_day.get("astro", {})
+        days.append(ForecastDayData(
+            date=date.fromisoformat(forecast_day["date"]),
+            condition=day_condition.get("text", ""),
+            condition_icon=day_condition.get("icon", ""),
+            condition_code=day_condition.get("code"),
+            max_temperature=day_data["maxtemp_c"],
+            min_temperature=day_data["mintemp_c"],
+            avg_temperature=day_data["avgtemp_c"],
+            max_wind_speed=day_data["maxwind_kph"],
+            total_precipitation=day_data["totalprecip_mm"],
+            avg_humidity=day_data["avghumidity"],
+            chance_of_rain=day_data.get("daily_chance_of_rain", 0),
+            chance_of_snow=day_data.get("daily_chance_of_snow", 0),
+            uv_index=day_data["uv"],
+            sunrise=astro.get("sunrise", ""),
+            sunset=astro.get("sunset", ""),
+        ))
+        for hour_data in forecast_day["hour"]:
+            hour_condition = hour_data.get("condition", {})
+            hours.append(ForecastHourData(
+                forecast_timestamp=convert_epoch_to_utc(hour_data["time_epoch"]),
+                condition=hour_condition.get("text", ""),
+                condition_icon=hour_condition.get("icon", ""),
+                condition_code=hour_condition.get("code"),
+                temperature=hour_data["temp_c"],
+                temperature_feels_like=hour_data["feelslike_c"],
+                wind_speed=hour_data["wind_kph"],
+                wind_direction=hour_data["wind_dir"],
+                pressure=hour_data["pressure_mb"],
+                precipitation=hour_data["precip_mm"],
+                humidity=hour_data["humidity"],
+                chance_of_rain=hour_data.get("chance_of_rain", 0),
+                uv_index=hour_data["uv"],
+                gust_speed=hour_data["gust_kph"],
+                visibility=hour_data["vis_km"],
+            ))
+    return LocationForecastData(current=parse_current_weather(response_json), days=days, hours=hours)
+
+
+def raise_for_error_response(response):
+    try:
+        error = loads(response.content).get("error") or {}
+    except ValueError:
+        # e.g. an HTML error page from a proxy in front of WeatherAPI
+        error = {}
+    if response.status_code == 400 and error.get("code") == 1006:
+        raise NoLocationFoundException("No Location Found!")
+    logger.error(f"WeatherAPI failure! StatusCode: {response.status_code}, Error:{error}")
+    raise WeatherAPIError(f"WeatherAPI answered {response.status_code}")
+
+
+def _is_failure(status_code):
+    return status_code >= 500 or status_code == 429
+
+
+def _circuit_open():
+    return CircuitOpenError(f"WeatherAPI circuit open, next attempt in {get_circuit_breaker().retry_in():.0f}s")
+
+
+def _rate_limited(priority):
+    return RateLimitedError(f"No WeatherAPI call budget left for {priority.name.lower()} calls")
+
+
+def _admit(breaker, limiter, priority, acquired):
+    """Let an upstream call through once it holds a quota token, giving the token back if the circuit refuses it."""
+    if not acquired:
+        raise _rate_limited(priority)
+    if not breaker.allow():
+        limiter.release()
+        raise _circuit_open()
+
+
+async def _aadmit(breaker, limiter, priority, acquired):
+    """Async variant of `_admit`."""
+    if not acquired:
+        raise _rate_limited(priority)
+    if not breaker.allow():
+        await limiter.arelease()
+        raise _circuit_open()
+
+
+def weatherapi_get(endpoint: str, **params) -> requests.Response:
+    """
+    GET through the shared client, quota limiter and circuit breaker. Raises
+    `RateLimitedError` when the call budget of the current `upstream_priority` is spent,
+    `CircuitOpenError` without calling upstream while the circuit is open, and
+    `WeatherAPIError` on connection errors and timeouts; 5xx and 429 responses are
+    returned but count as failures.
+    """
+    breaker, limiter, priority = get_circuit_breaker(), get_quota_limiter(), get_upstream_priority()
+    # an open circuit must not spend quota
+    if breaker.state == breaker.OPEN:
+        raise _circuit_open()
+    _admit(breaker, limiter, priority, limiter.acquire(priority))
+    started = time.monotonic()
+    try:
+        response = get_weatherapi_client().get(endpoint, **params)
+    except requests.RequestException as error:
+        breaker.record(time.monotonic() - started, failed=True)
+        raise WeatherAPIError(f"WeatherAPI request failed: {error}") from error
+    breaker.record(time.monotonic() - started, failed=_is_failure(response.status_code))
+    return response
+
+
+async def aweatherapi_get(endpoint: str, **params) -> httpx.Response:
+    """Async variant of `weatherapi_get`."""
+    breaker, limiter, priority = get_circuit_breaker(), get_quota_limiter(), get_upstream_priority()
+    if breaker.state == breaker.OPEN:
+        raise _circuit_open()
+    await _aadmit(breaker, limiter, priority, await limiter.aacquire(priority))
+    started = time.monotonic()
+    try:
+        response = await get_async_weatherapi_client().get(endpoint, **params)
+    except httpx.HTTPError as error:
+        breaker.record(time.monotonic() - started, failed=True)
+        raise WeatherAPIError(f"WeatherAPI request failed: {error}") from error
+    breaker.record(time.monotonic() - started, failed=_is_failure(response.status_code))
+    return response
+
+
 def get_weather_data_via_api(location: str):
     """
     response:
@@ -97,39 +556,10 @@ def get_weather_data_via_api(location: str):
     }
     """
 
-    url = f"http://api.weatherapi.com/v1/current.json?key={settings.WEATHERAPI_API_KEY}&q={location}"
-    response = requests.get(url)
-    response_json = response.json()
+    response = weatherapi_get("current.json", q=location)
     if response.status_code == 200:
-        location_data = response_json["location"]
-        weather_data = response_json["current"]
-        current_condition = weather_data.get("condition", {})
-        record_timestamp = convert_ist_to_utc(weather_data["last_updated"])
-        return LocationWeatherData(
-            name=location_data["name"],
-            region=location_data["region"],
-            country=location_data["country"],
-            latitude=location_data["lat"],
-            longitude=location_data["lon"],
-            condition=current_condition.get("text", ""),
-            condition_icon=current_condition.get("icon", ""),
-            temperature=weather_data["temp_c"],
-            temperature_feels_like=weather_data["feelslike_c"],
-            wind_speed=weather_data["wind_kph"],
-            wind_direction=weather_data["wind_dir"],
-            pressure=weather_data["pressure_mb"],
-            precipitation=weather_data["precip_mm"],
-            humidity=weather_data["humidity"],
-            dewpoint=weather_data["dewpoint_c"],
-            uv_index=weather_data["uv"],
-            gust_speed=weather_data["gust_kph"],
-            visibility=weather_data["vis_km"],
-            record_timestamp=record_timestamp,
-        )
-    if response.status_code == 400 and response_json["error"]["code"] == 1006:
-        raise NoLocationFoundException("No Location Found!")
-    logger.error(f"WeatherAPI failure! StatusCode: {response.status_code}, Error:{response_json.get('error')}")
-    raise Exception(f"Something went wrong!")
+        return parse_current_weather(loads(response.content))
+    raise_for_error_response(response)
 
 
 def get_weather_forecast_data_via_api(location: str, days=1):
@@ -296,36 +726,57 @@ def get_weather_forecast_data_via_api(location: str, days=1):
     }
     """
 
-    url = f"http://api.weatherapi.com/v1/forecast.json?key={settings.WEATHERAPI_API_KEY}&q={location}&days={days}"
-    response = requests.get(url)
-    response_json = response.json()
+    response = weatherapi_get("forecast.json", q=location, days=days)
+    if response.status_code == 200:
+        return parse_forecast(decode_forecast(response.content))
+    raise_for_error_response(response)
+
+
+async def aget_weather_data_via_api(location: str):
+    """Async variant of `get_weather_data_via_api`."""
+    response = await aweatherapi_get("current.json", q=location)
+    if response.status_code == 200:
+        return parse_current_weather(loads(response.content))
+    raise_for_error_response(response)
+
+
+async def aget_weather_forecast_data_via_api(location: str, days=1):
+    """Async variant of `get_weather_forecast_data_via_api`."""
+    response = await aweatherapi_get("forecast.json", q=location, days=days)
     if response.status_code == 200:
-        location_data = response_json["location"]
-        weather_data = response_json["current"]
-        current_condition = weather_data.get("condition", {})
-        record_timestamp = convert_ist_to_utc(weather_data["last_updated"])
-        return LocationWeatherData(
-            name=location_data["name"],
-            region=location_data["region"],
-            country=location_data["country"],
-            latitude=location_data["lat"],
-            longitude=location_data["lon"],
-            condition=current_condition.get("text", ""),
-            condition_icon=current_condition.get("icon", ""),
-            temperature=weather_data["temp_c"],
-            temperature_feels_like=weather_data["feelslike_c"],
-            wind_speed=weather_data["wind_kph"],
-            wind_direction=weather_data["wind_dir"],
-            pressure=weather_data["pressure_mb"],
-            precipitation=weather_data["precip_mm"],
-            humidity=weather_data["humidity"],
-            dewpoint=weather_data["dewpoint_c"],
-            uv_index=weather_data["uv"],
-            gust_speed=weather_data["gust_kph"],
-            visibility=weather_data["vis_km"],
-            record_timestamp=record_timestamp,
+        return parse_forecast(decode_forecast(response.content))
+    raise_for_error_response(response)
+
+
+def parse_search_results(response_json) -> list[LocationSearchData]:
+    return [
+        LocationSearchData(
+            name=result["name"], region=result["region"], country=result["country"],
+            latitude=result["lat"], longitude=result["lon"],
         )
-    if response.status_code == 400 and response_json["error"]["code"] == 1006:
-        raise NoLocationFoundException("No Location Found!")
-    logger.error(f"WeatherAPI failure! StatusCode: {response.status_code}, Error:{response_json.get('error')}")
-    raise Exception(f"Something went wrong!")
+        for result in response_json
+    ]
+
+
+def search_locations_via_api(query: str) -> list[LocationSearchData]:
+    """
+    Places matching a partial name, for autocomplete.
+
+    response:
+    status_code: 200
+    json: [
+        {
+            "id": 1117553,
+            "name": "Warangal",
+            "region": "Andhra Pradesh",
+            "country": "India",
+            "lat": 18.0,
+            "lon": 79.58,
+            "url": "warangal-andhra-pradesh-india"
+        }
+    ]
+    """
+    response = weatherapi_get("search.json", q=query)
+    if response.status_code == 200:
+        return parse_search_results(loads(response.content))
+    raise_for_error_response(response)
@@ -1,3 +1,26 @@
 from django.contrib import admin
 
-# Register your models here.
+from weather.models import AlertRule, LocationAlias, TrackedLocation
+
+
+@admin.register(TrackedLocation)
+class TrackedLocationAdmin(admin.ModelAdmin):
+    list_display = ("location", "priority", "refresh_interval", "request_count", "last_requested_on", "next_refresh_on", "is_active")
+    list_filter = ("is_active",)
+    list_editable = ("priority", "refresh_interval", "is_active")
+    list_select_related = ("location",)
+    search_fields = ("location__name",)
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ("name", "field", "operator", "threshold", "country", "is_active", "updated_on")
+    list_filter = ("is_active", "field", "country")
+    list_editable = ("threshold", "is_active")
+    search_fields = ("name", "country")
+
+
+@admin.register(LocationAlias)
+class LocationAliasAdmin(admin.ModelAdmin):
+    list_display = ("query", "location", "created_on")
+    search_fields = ("query", "location__name")
@@ -0,0 +1,126 @@
+"""
+Alert rules compiled for bulk evaluation.
+
+Active `AlertRule` rows are read once (and cached in the weather cache for
+WEATHER_ALERT_RULES_TTL seconds) and compiled two ways:
+
+- `q()` / `fired_count()`: ORM expressions, so "which locations are extreme" and "how
+  many rules fired for each" are part of a single query over the latest readings.
+- `masks()`: one boolean NumPy row per rule over columns of readings, for evaluating
+  readings already in memory without a query per location.
+
+`matches()` checks a single reading in plain Python, which is cheaper than either for
+the one reading shown on a page.
+"""
+import operator
+from collections import namedtuple
+from functools import reduce
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from weather.cache import get_weather_cache
+from weather.models import AlertRule
+
+
+ALERT_RULES_KEY = "weather:alert-rules"
+OPERATORS = {
+    AlertRule.Operator.GT: operator.gt,
+    AlertRule.Operator.GTE: operator.ge,
+    AlertRule.Operator.LT: operator.lt,
+    AlertRule.Operator.LTE: operator.le,
+}
+MASK_OPERATORS = {
+    AlertRule.Operator.GT: np.greater,
+    AlertRule.Operator.GTE: np.greater_equal,
+    AlertRule.Operator.LT: np.less,
+    AlertRule.Operator.LTE: np.less_equal,
+}
+CompiledRule = namedtuple('CompiledRule', ('name', 'field', 'operator', 'threshold', 'country'))
+
+
+class AlertRules:
+    """An ordered set of alert rules; a reading matches a rule when its field compares true against the threshold."""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def fields(self):
+        return tuple(dict.fromkeys(rule.field for rule in self.rules))
+
+    @staticmethod
+    def _rule_q(rule, prefix):
+        condition = Q(**{f'{prefix}{rule.field}__{rule.operator}': rule.threshold})
+        if rule.country:
+            condition &= Q(**{f'{prefix}location__country': rule.country})
+        return condition
+
+    def q(self, prefix=''):
+        """Filter matching rows that break at least one rule; `prefix` reaches the reading through a relation."""
+        conditions = [self._rule_q(rule, prefix) for rule in self.rules]
+        # without rules nothing matches
+        return reduce(operator.or_, conditions) if conditions else Q(pk__in=[])
+
+    def fired_count(self, prefix=''):
+        """Expression counting the rules a row breaks."""
+        cases = [
+            Case(When(self._rule_q(rule, prefix), then=Value(1)), default=Value(0), output_field=IntegerField())
+            for rule in self.rules
+        ]
+        return reduce(operator.add, cases) if cases else Value(0)
+
+    def masks(self, columns, countries=None):
+        """
+        `(rules, rows)` boolean matrix of which rows break which rule. `columns` maps each
+        field in `fields` to a float array; `countries` is an array of the rows' countries,
+        needed only when a rule is limited to a country.
+        """
+        rows = len(next(iter(columns.values()))) if columns else 0
+        masks = np.zeros((len(self.rules), rows), dtype=bool)
+        if countries is not None and any(rule.country for rule in self.rules):
+            # compare small integer codes instead of strings once per rule
+            names, codes = np.unique(np.asarray(countries, dtype=object), return_inverse=True)
+            lookup = {name: code for code, name in enumerate(names)}
+        for index, rule in enumerate(self.rules):
+            MASK_OPERATORS[rule.operator](columns[rule.field], rule.threshold, out=masks[index])
+            if rule.country:
+                if countries is None:
+                    raise ValueError(f"Rule {rule.name!r} is limited to {rule.country} but no countries were given")
+                masks[index] &= codes == lookup.get(rule.country, -1)
+        return masks
+
+    def matches(self, reading, country=None):
+        """The rules a single reading (anything with the rule fields as attributes) breaks, in rule order."""
+        return [
+            rule for rule in self.rules
+            if (not rule.country or rule.country == country)
+            and OPERATORS[rule.operator](getattr(reading, rule.field), rule.threshold)
+        ]
+
+
+def get_alert_rules() -> AlertRules:
+    """The active alert rules, cached for WEATHER_ALERT_RULES_TTL seconds."""
+    cache = get_weather_cache()
+    rules = cache.get(ALERT_RULES_KEY)
+    if rules is None:
+        rules = [
+            CompiledRule(*values) for values in AlertRule.objects.filter(is_active=True).order_by('id').values_list(
+                'name', 'field', 'operator', 'threshold', 'country'
+            )
+        ]
+        cache.set(ALERT_RULES_KEY, rules, timeout=settings.WEATHER_ALERT_RULES_TTL)
+    return AlertRules(rules)
+
+
+@receiver(post_save, sender=AlertRule)
+@receiver(post_delete, sender=AlertRule)
+def invalidate_alert_rules(**kwargs):
+    # other processes pick up the change within WEATHER_ALERT_RULES_TTL unless the cache is shared
+    get_weather_cache().delete(ALERT_RULES_KEY)
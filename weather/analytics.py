@@ -0,0 +1,189 @@
+"""
+Vectorized statistics over a location's reading history.
+
+History is loaded as one NumPy column per metric (plus int64 epochs) straight from a
+values_list query with the measurements cast to floats, so no model instances or
+Decimals are built. Every statistic below is a whole-array pass: cumulative sums with
+`searchsorted` for time-based rolling means, `reduceat` for daily extremes, `np.where`
+for the derived heat index and wind chill. Only the EWMA walks the series, and only in
+chunks spanning hundreds of half-lives, never per row.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import NotSupportedError
+from django.db.models import BigIntegerField, FloatField, Func
+from django.db.models.functions import Cast
+
+from services.utils import convert_epoch_to_utc
+from weather.models import LocationWeather
+
+
+ANALYTICS_FIELDS = ('temperature', 'wind_speed', 'pressure', 'precipitation', 'humidity', 'dewpoint')
+PERCENTILES = (5, 50, 95)
+# change per hour between consecutive readings that is reported as rapid
+RATE_OF_CHANGE_THRESHOLDS = {'temperature': 3, 'pressure': 1.5, 'wind_speed': 20}
+# consecutive readings further apart than this are not compared
+RATE_OF_CHANGE_MAX_GAP = 3 * 60 * 60
+# most recent rapid changes reported
+RAPID_CHANGES_LIMIT = 10
+# EWMA chunks are limited to this many half-lives so exp() stays finite
+EWMA_CHUNK_HALFLIVES = 500
+UNIX_EPOCH_DATE = date(1970, 1, 1)
+
+
+class EpochSeconds(Func):
+    """Seconds since the Unix epoch of a datetime expression."""
+    output_field = BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"EpochSeconds is not implemented for {connection.vendor}")
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # %%%% survives both the template and the backend's parameter formatting as a literal %
+        return super().as_sql(
+            compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)", **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template="EXTRACT(EPOCH FROM %(expressions)s)::bigint", **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template="UNIX_TIMESTAMP(%(expressions)s)", **extra_context)
+
+
+def load_history(location_id, since, fields=ANALYTICS_FIELDS):
+    """`{'epoch': int64 array, field: float64 array, ...}` of a location's readings since `since`, oldest first."""
+    rows = LocationWeather.objects.filter(
+        location_id=location_id, record_timestamp__gte=since
+    ).order_by('record_timestamp').values_list(
+        EpochSeconds('record_timestamp'), *(Cast(field, FloatField()) for field in fields)
+    )
+    data = np.array(list(rows), dtype=np.float64).reshape(-1, len(fields) + 1)
+    history = {'epoch': data[:, 0].astype(np.int64)}
+    for column, field in enumerate(fields, start=1):
+        history[field] = np.ascontiguousarray(data[:, column])
+    return history
+
+
+def rolling_mean(epochs, values, window):
+    """Mean of the readings within the `window` seconds up to and including each reading."""
+    starts = np.searchsorted(epochs, epochs - window, side='right')
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+
+def ewma(epochs, values, halflife):
+    """
+    Exponentially weighted moving average for irregularly spaced readings: a reading's
+    weight halves every `halflife` seconds.
+
+    Uses the closed form y_t = D_t * (d_s * y_(s-1) + sum_(s<=k<=t) (1 - d_k) * x_k / D_k),
+    with d_k the decay since the previous reading and D_t the decay since the chunk start.
+    """
+    if not len(values):
+        return np.empty(0)
+    rate = np.log(2) / halflife
+    decay = np.exp(-np.diff(epochs, prepend=epochs[0]) * rate)
+    chunk_ids = (epochs - epochs[0]) // int(EWMA_CHUNK_HALFLIVES * halflife)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(chunk_ids)) + 1, [len(values)]))
+    result = np.empty(len(values))
+    carry = values[0]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        elapsed = (epochs[lo:hi] - epochs[lo]) * rate
+        weighted = np.cumsum((1 - decay[lo:hi]) * values[lo:hi] * np.exp(elapsed))
+        result[lo:hi] = (decay[lo] * carry + weighted) * np.exp(-elapsed)
+        carry = result[hi - 1]
+    return result
+
+
+def daily_extremes(epochs, values, utc_offset=0):
+    """`(days, minimums, maximums)` per calendar day, days counted from 1970-01-01 at `utc_offset` seconds."""
+    days = (epochs + utc_offset) // 86400
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1))
+    return days[starts], np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+def heat_index(temperature, humidity):
+    """NWS heat index (Rothfusz regression with its adjustments) in Celsius."""
+    t = temperature * 1.8 + 32
+    rh = humidity
+    simple = 0.5 * (t + 61 + (t - 68) * 1.2 + rh * 0.094)
+    full = (
+        -42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh - 6.83783e-3 * t ** 2
+        - 5.481717e-2 * rh ** 2 + 1.22874e-3 * t ** 2 * rh + 8.5282e-4 * t * rh ** 2 - 1.99e-6 * t ** 2 * rh ** 2
+    )
+    dry = (rh < 13) & (t >= 80) & (t <= 112)
+    full = np.where(dry, full - (13 - rh) / 4 * np.sqrt(np.clip(17 - np.abs(t - 95), 0, None) / 17), full)
+    humid = (rh > 85) & (t >= 80) & (t <= 87)
+    full = np.where(humid, full + (rh - 85) / 10 * (87 - t) / 5, full)
+    index = np.where((simple + t) / 2 >= 80, full, simple)
+    return (index - 32) / 1.8
+
+
+def wind_chill(temperature, wind_speed):
+    """Wind chill in Celsius (wind in km/h); the air temperature where the formula does not apply."""
+    speed = np.power(np.clip(wind_speed, 0, None), 0.16)
+    chill = 13.12 + 0.6215 * temperature - 11.37 * speed + 0.3965 * temperature * speed
+    return np.where((temperature <= 10) & (wind_speed > 4.8), chill, temperature)
+
+
+def rapid_changes(epochs, values, threshold, max_gap=RATE_OF_CHANGE_MAX_GAP):
+    """Indexes of readings whose change per hour from the previous reading exceeds `threshold`, and the rates."""
+    gaps = np.diff(epochs)
+    rates = np.divide(np.diff(values) * 3600, gaps, out=np.zeros(len(gaps)), where=gaps > 0)
+    indexes = np.flatnonzero((np.abs(rates) > threshold) & (gaps <= max_gap) & (gaps > 0)) + 1
+    return indexes, rates[indexes - 1]
+
+
+def summarize_history(history, rolling_window, ewma_halflife, utc_offset=0):
+    """Statistics of a loaded history, as plain Python values ready for templates and JSON."""
+    epochs = history['epoch']
+    if not len(epochs):
+        return None
+    temperature = history['temperature']
+    summary = {
+        'count': len(epochs),
+        'first_timestamp': convert_epoch_to_utc(int(epochs[0])),
+        'last_timestamp': convert_epoch_to_utc(int(epochs[-1])),
+    }
+    # only the latest rolling mean is reported, so average just the last window
+    window_start = np.searchsorted(epochs, epochs[-1] - rolling_window, side='right')
+    for field in ANALYTICS_FIELDS:
+        values = history[field]
+        percentiles = np.percentile(values, PERCENTILES)
+        summary[field] = {
+            **{f'p{percentile}': round(float(value), 2) for percentile, value in zip(PERCENTILES, percentiles)},
+            'rolling_mean': round(float(values[window_start:].mean()), 2),
+            'ewma': round(float(ewma(epochs, values, ewma_halflife)[-1]), 2),
+        }
+
+    days, minimums, maximums = daily_extremes(epochs, temperature, utc_offset)
+    summary['daily_temperature'] = [
+        {'date': UNIX_EPOCH_DATE + timedelta(days=int(day)), 'min': round(float(low), 2), 'max': round(float(high), 2)}
+        for day, low, high in zip(days, minimums, maximums)
+    ]
+
+    heat = heat_index(temperature, history['humidity'])
+    chill = wind_chill(temperature, history['wind_speed'])
+    summary['heat_index'] = {'latest': round(float(heat[-1]), 2), 'max': round(float(heat.max()), 2)}
+    summary['wind_chill'] = {'latest': round(float(chill[-1]), 2), 'min': round(float(chill.min()), 2)}
+
+    changes = []
+    for field, threshold in RATE_OF_CHANGE_THRESHOLDS.items():
+        indexes, rates = rapid_changes(epochs, history[field], threshold)
+        changes.extend(
+            {
+                'field': field,
+                'timestamp': convert_epoch_to_utc(int(epochs[index])),
+                'rate_per_hour': round(float(rate), 2),
+            }
+            for index, rate in zip(indexes[-RAPID_CHANGES_LIMIT:], rates[-RAPID_CHANGES_LIMIT:])
+        )
+    summary['rapid_changes'] = sorted(
+        changes, key=lambda change: change['timestamp'], reverse=True
+    )[:RAPID_CHANGES_LIMIT]
+    return summary
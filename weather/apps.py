@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class WeatherConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'weather'
+
+    def ready(self):
+        # registers the signal handlers that drop cached alert rules
+        from weather import alerts  # noqa: F401
+        # registers the startup check that the quota limiter's cache is shared
+        from weather import checks  # noqa: F401
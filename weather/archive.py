@@ -0,0 +1,314 @@
+"""
+Columnar archive of old readings, read through memory maps.
+
+`archive_readings` moves readings older than WEATHER_ARCHIVE_AFTER_DAYS (and already
+folded into the rollups, so hourly/daily trends do not change) out of `LocationWeather`
+into per-month segments under WEATHER_ARCHIVE_DIR:
+
+    <YYYY-MM>/<segment>/location_id.npy, epoch.npy, condition_id.npy, created_on.npy,
+                        wind_direction.npy, <metric>.npy ..., locations.npy, offsets.npy
+
+Each `.npy` file is one fixed-width column (int64 epochs and ids, float64 metrics, 2-byte
+wind directions) sorted by (location_id, epoch). `locations`/`offsets` index the rows of
+each location, so a reader bisects to a location's rows and then to the time range, and
+reduces memory-mapped slices of just the columns it needs without copying or parsing.
+A segment is written to a hidden staging directory in the transaction that deletes its
+rows from the DB and renamed into place once that transaction commits, so readers never
+see a reading twice (only briefly miss it between the commit and the rename), and a
+rolled back delete leaves no segment behind.
+"""
+import heapq
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from functools import partial
+from operator import itemgetter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import FloatField, IntegerField, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils.timezone import now, timedelta
+
+from weather.analytics import EpochSeconds
+from weather.history import METRICS
+from weather.models import LocationWeather, RollupWatermark
+
+
+logger = logging.getLogger(__name__)
+
+# name of the rollup high-water mark kept by `weather.services.update_weather_rollups`
+ROLLUP_WATERMARK = "locationweather"
+INDEX_COLUMNS = {'location_id': np.int64, 'epoch': np.int64}
+ARCHIVE_COLUMNS = {
+    **INDEX_COLUMNS,
+    'condition_id': np.int64,
+    'created_on': np.int64,
+    'wind_direction': 'S2',
+    **{metric: np.float64 for metric in METRICS},
+}
+
+
+def _month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(moment):
+    return (moment.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _month_name(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y-%m')
+
+
+class Segment:
+    """Memory-mapped columns of one archive segment, opened lazily."""
+
+    def __init__(self, path):
+        self.path = path
+        self.locations = np.load(os.path.join(path, 'locations.npy'))
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self._columns = {}
+
+    def column(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r')
+        return column
+
+    def rows(self, location_id, since=None, until=None):
+        """`(lo, hi)` row range of a location's readings with `since <= epoch < until`."""
+        position = np.searchsorted(self.locations, location_id)
+        if position == len(self.locations) or self.locations[position] != location_id:
+            return 0, 0
+        lo, hi = int(self.offsets[position]), int(self.offsets[position + 1])
+        epochs = self.column('epoch')[lo:hi]
+        if since is not None:
+            lo += int(np.searchsorted(epochs, since, side='left'))
+        if until is not None:
+            hi = int(self.offsets[position]) + int(np.searchsorted(epochs, until, side='left'))
+        return lo, max(lo, hi)
+
+
+# segment path -> Segment; segments are immutable once renamed into place
+_segments = {}
+
+
+def _get_segment(path):
+    segment = _segments.get(path)
+    if segment is None:
+        segment = _segments[path] = Segment(path)
+    return segment
+
+
+def iter_segments(since=None, until=None):
+    """Segments of the months overlapping [since, until), oldest month first."""
+    root = settings.WEATHER_ARCHIVE_DIR
+    if not os.path.isdir(root):
+        return
+    first = _month_name(since) if since is not None else None
+    last = _month_name(until) if until is not None else None
+    for month in sorted(os.listdir(root)):
+        if month.startswith('.') or (first and month < first) or (last and month > last):
+            continue
+        month_path = os.path.join(root, month)
+        for name in sorted(os.listdir(month_path)):
+            if not name.startswith('.'):
+                yield _get_segment(os.path.join(month_path, name))
+
+
+def _epoch(moment):
+    return None if moment is None else int(moment.timestamp())
+
+
+def _archived_slices(location_ids, since, until):
+    for segment in iter_segments(since, until):
+        for location_id in location_ids:
+            lo, hi = segment.rows(location_id, _epoch(since), _epoch(until))
+            if hi > lo:
+                yield location_id, segment, lo, hi
+
+
+def _empty_aggregates(fields):
+    aggregates = {'count': 0}
+    for field in fields:
+        aggregates.update({f'{field}__sum': 0.0, f'{field}__min': None, f'{field}__max': None})
+    return aggregates
+
+
+def _fold_slice(aggregates, segment, lo, hi, fields):
+    aggregates['count'] += hi - lo
+    for field in fields:
+        values = segment.column(field)[lo:hi]
+        aggregates[f'{field}__sum'] += float(values.sum())
+        low, high = float(values.min()), float(values.max())
+        current_min, current_max = aggregates[f'{field}__min'], aggregates[f'{field}__max']
+        aggregates[f'{field}__min'] = low if current_min is None else min(current_min, low)
+        aggregates[f'{field}__max'] = high if current_max is None else max(current_max, high)
+
+
+def aggregate_archived(location_ids, since=None, until=None, fields=METRICS):
+    """
+    Count, sum, min and max of each field over the archived readings of `location_ids`
+    in [since, until), keyed like `{field}__sum`. Reduces memory-mapped slices in place.
+    """
+    aggregates = _empty_aggregates(fields)
+    for _, segment, lo, hi in _archived_slices(location_ids, since, until):
+        _fold_slice(aggregates, segment, lo, hi, fields)
+    return aggregates
+
+
+def aggregate_archived_by_location(location_ids, since=None, until=None, fields=METRICS):
+    """
+    `aggregate_archived` of each of `location_ids` in one pass over the segments, by
+    location id; locations without archived readings in the window are left out.
+    """
+    by_location = {}
+    for location_id, segment, lo, hi in _archived_slices(location_ids, since, until):
+        aggregates = by_location.get(location_id)
+        if aggregates is None:
+            aggregates = by_location[location_id] = _empty_aggregates(fields)
+        _fold_slice(aggregates, segment, lo, hi, fields)
+    return by_location
+
+
+def load_archived_history(location_ids, since=None, until=None, fields=METRICS):
+    """`{'epoch': ..., field: ...}` arrays of the archived readings of `location_ids`, oldest first."""
+    slices = list(_archived_slices(location_ids, since, until))
+    history = {
+        name: np.concatenate([segment.column(name)[lo:hi] for _, segment, lo, hi in slices])
+        if slices else np.empty(0, dtype=ARCHIVE_COLUMNS[name])
+        for name in ('epoch', *fields)
+    }
+    if len(location_ids) > 1 and len(history['epoch']):
+        order = np.argsort(history['epoch'], kind='stable')
+        history = {name: values[order] for name, values in history.items()}
+    return history
+
+
+def _iter_slice(segment, lo, hi, columns, chunk_size):
+    for start in range(lo, hi, chunk_size):
+        end = min(start + chunk_size, hi)
+        yield from zip(*(segment.column(name)[start:end].tolist() for name in columns))
+
+
+def iter_archived_readings(location_ids, since=None, until=None, chunk_size=None):
+    """
+    `(epoch, condition_id, wind_direction, *METRICS)` tuples of the archived readings of
+    `location_ids` in [since, until), oldest first. Slices are copied `chunk_size` rows
+    at a time and merged lazily, so memory does not grow with the archive. `condition_id`
+    is -1 for readings without a condition; `wind_direction` is bytes.
+    """
+    chunk_size = chunk_size or settings.WEATHER_ARCHIVE_CHUNK_SIZE
+    columns = ('epoch', 'condition_id', 'wind_direction', *METRICS)
+    return heapq.merge(*(
+        _iter_slice(segment, lo, hi, columns, chunk_size)
+        for _, segment, lo, hi in _archived_slices(location_ids, since, until)
+    ), key=itemgetter(0))
+
+
+def has_archive(since=None, until=None):
+    return next(iter_segments(since, until), None) is not None
+
+
+def _write_segment(readings, month_path, count):
+    """
+    Write `count` readings (tuples in ARCHIVE_COLUMNS order, sorted) as a new segment in a
+    staging directory readers skip; returns the staging path, for `_publish_segment`.
+    """
+    os.makedirs(month_path, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.segment-', dir=month_path)
+    try:
+        columns = {
+            name: np.lib.format.open_memmap(os.path.join(staging, f'{name}.npy'), mode='w+', dtype=dtype, shape=(count,))
+            for name, dtype in ARCHIVE_COLUMNS.items()
+        }
+        position = 0
+        chunk = []
+        for row in readings:
+            chunk.append(row)
+            if len(chunk) == settings.WEATHER_ARCHIVE_CHUNK_SIZE:
+                position = _write_chunk(columns, chunk, position)
+                chunk = []
+        position = _write_chunk(columns, chunk, position)
+        if position != count:
+            raise RuntimeError(f"Expected {count} readings to archive, read {position}")
+
+        location_ids = columns['location_id']
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(location_ids)) + 1)) if count else np.empty(0, np.int64)
+        np.save(os.path.join(staging, 'locations.npy'), np.asarray(location_ids[starts]))
+        np.save(os.path.join(staging, 'offsets.npy'), np.concatenate((starts, [count])).astype(np.int64))
+        for column in columns.values():
+            column.flush()
+        del columns
+        return staging
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _publish_segment(staging, path):
+    try:
+        os.rename(staging, path)
+    except OSError:
+        # the rows are already deleted; the readings stay in the staging directory
+        logger.exception(f"Failed to publish archive segment {staging} as {path}")
+        raise
+
+
+def _write_chunk(columns, chunk, position):
+    if not chunk:
+        return position
+    end = position + len(chunk)
+    for index, (name, column) in enumerate(columns.items()):
+        column[position:end] = [row[index] for row in chunk]
+    return end
+
+
+def archive_readings(older_than_days=None) -> int:
+    """
+    Move readings older than `older_than_days` (default WEATHER_ARCHIVE_AFTER_DAYS) that
+    are already folded into the rollups into one new segment per month. Returns the
+    number of readings archived.
+    """
+    older_than_days = settings.WEATHER_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = now() - timedelta(days=older_than_days)
+    watermark = RollupWatermark.objects.filter(name=ROLLUP_WATERMARK).values_list('last_updated_on', flat=True).first()
+    if watermark is None:
+        return 0
+    eligible = LocationWeather.objects.filter(record_timestamp__lt=cutoff, updated_on__lte=watermark)
+    oldest = eligible.order_by('record_timestamp').values_list('record_timestamp', flat=True).first()
+    archived = 0
+    month = _month_start(oldest) if oldest else None
+    while month is not None and month < cutoff:
+        month_end = min(_next_month(month), cutoff)
+        readings = eligible.filter(record_timestamp__gte=month, record_timestamp__lt=month_end)
+        last_id = readings.order_by('-id').values_list('id', flat=True).first()
+        if last_id is not None:
+            # pin the rows: later upserts of these readings do not change which rows move
+            readings = readings.filter(id__lte=last_id)
+            count = readings.count()
+            rows = readings.order_by('location_id', 'record_timestamp').values_list(
+                'location_id', EpochSeconds('record_timestamp'),
+                Coalesce('condition_id', Value(-1), output_field=IntegerField()), EpochSeconds('created_on'),
+                'wind_direction', *(Cast(metric, FloatField()) for metric in METRICS),
+            ).iterator(chunk_size=settings.WEATHER_ARCHIVE_CHUNK_SIZE)
+            month_path = os.path.join(settings.WEATHER_ARCHIVE_DIR, _month_name(month))
+            path = os.path.join(month_path, datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f'))
+            with transaction.atomic():
+                staging = _write_segment(rows, month_path, count)
+                try:
+                    readings.delete()
+                except BaseException:
+                    # nothing was deleted, so the segment would double count every reading
+                    shutil.rmtree(staging, ignore_errors=True)
+                    raise
+                # readers must not see the segment while the rows may still be rolled back
+                transaction.on_commit(partial(_publish_segment, staging, path))
+            archived += count
+            logger.info(f"Archived {count} readings of {_month_name(month)} to {path}")
+        month = _next_month(month)
+    return archived
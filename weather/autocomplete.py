@@ -0,0 +1,203 @@
+"""
+Process-local prefix index of known places for search-box suggestions.
+
+Every stored `Location` is kept as a "name, region, country" label in a sorted array, so
+the suggestions for a prefix are the contiguous run that starts where `bisect` places
+it: no DB query and no upstream call per keystroke. The index is built from the DB on
+first use, gains locations as this process stores them and is rebuilt every
+WEATHER_AUTOCOMPLETE_REBUILD_INTERVAL seconds to pick up those stored by other
+processes; the stale index keeps being served while one background thread rebuilds
+it. With WEATHER_AUTOCOMPLETE_UPSTREAM on, a prefix with too few known matches is also
+searched on WeatherAPI in the background; its results are served from an LRU of
+WEATHER_AUTOCOMPLETE_UPSTREAM_CACHE_SIZE prefixes from the next keystroke on.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from services.ratelimit import Priority, upstream_priority
+from services.weatherapi import WeatherAPIError, search_locations_via_api
+from weather.cache import normalize_location
+from weather.models import Location
+
+
+logger = logging.getLogger(__name__)
+
+
+def location_label(name, region, country) -> str:
+    """What a suggestion shows and submits; WeatherAPI resolves it back to the place."""
+    return ", ".join(part for part in (name.title(), region, country) if part)
+
+
+class PrefixIndex:
+    """Labels sorted by normalized key; a prefix's matches are one slice found with bisect."""
+
+    def __init__(self, labels=()):
+        entries = sorted({normalize_location(label): label for label in labels}.items())
+        self.keys = [key for key, _ in entries]
+        self.labels = [label for _, label in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, label) -> bool:
+        key = normalize_location(label)
+        position = bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return False
+        self.keys.insert(position, key)
+        self.labels.insert(position, label)
+        return True
+
+    def search(self, prefix, limit) -> list[str]:
+        """Up to `limit` labels whose key starts with the normalized `prefix`, in key order."""
+        prefix = normalize_location(prefix)
+        start = bisect_left(self.keys, prefix)
+        matches = []
+        for key, label in zip(self.keys[start:start + limit], self.labels[start:start + limit]):
+            if not key.startswith(prefix):
+                break
+            matches.append(label)
+        return matches
+
+
+class LocationSuggestions:
+    """The prefix index of stored locations plus an LRU of WeatherAPI search results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._index = None
+        self._built_on = 0.0
+        self._building = False
+        self._upstream = OrderedDict()
+        self._searching = set()
+        self._executor = None
+        self.builds = 0
+        self.upstream_searches = 0
+
+    def _build(self):
+        labels = [
+            location_label(*row)
+            for row in Location.objects.values_list('name', 'region', 'country').iterator(chunk_size=10000)
+        ]
+        index = PrefixIndex(labels)
+        with self._lock:
+            self._index, self._built_on = index, time.monotonic()
+            self.builds += 1
+        return index
+
+    def index(self) -> PrefixIndex:
+        """
+        The index, built from the DB by one thread on first use. Once older than the rebuild
+        interval it is still returned while a single background build replaces it.
+        """
+        index = self._index
+        if index is None:
+            with self._build_lock:
+                index = self._index
+                if index is None:
+                    index = self._build()
+        elif time.monotonic() - self._built_on > settings.WEATHER_AUTOCOMPLETE_REBUILD_INTERVAL:
+            self._schedule_rebuild()
+        return index
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # callers hold self._lock
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-autocomplete")
+        return self._executor
+
+    def _schedule_rebuild(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            executor = self._get_executor()
+        executor.submit(self._rebuild)
+
+    def _rebuild(self):
+        try:
+            self._build()
+        except Exception:
+            logger.exception("Failed to rebuild the location suggestions index")
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._building = False
+
+    def add(self, location: Location):
+        """Index a location this process just stored; it is picked up by the next build otherwise."""
+        with self._lock:
+            if self._index is not None:
+                self._index.add(location_label(location.name, location.region, location.country))
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._upstream.clear()
+            self.builds = self.upstream_searches = 0
+
+    def search(self, prefix, limit=None) -> list[str]:
+        """Suggestions for `prefix`: known places first, then WeatherAPI's matches once searched."""
+        limit = limit or settings.WEATHER_AUTOCOMPLETE_LIMIT
+        prefix = normalize_location(prefix)
+        if not prefix:
+            return []
+        index = self.index()
+        with self._lock:
+            suggestions = index.search(prefix, limit)
+            if len(suggestions) >= limit or not settings.WEATHER_AUTOCOMPLETE_UPSTREAM:
+                return suggestions
+            upstream = self._upstream.get(prefix)
+            if upstream is not None:
+                self._upstream.move_to_end(prefix)
+        if upstream is None:
+            if len(prefix) >= settings.WEATHER_AUTOCOMPLETE_UPSTREAM_MIN_LENGTH:
+                self._schedule_upstream_search(prefix)
+            return suggestions
+        known = {normalize_location(label) for label in suggestions}
+        suggestions += [label for label in upstream if normalize_location(label) not in known]
+        return suggestions[:limit]
+
+    def _schedule_upstream_search(self, prefix):
+        with self._lock:
+            if prefix in self._searching:
+                return
+            self._searching.add(prefix)
+            executor = self._get_executor()
+        executor.submit(self._search_upstream, prefix)
+
+    def _search_upstream(self, prefix):
+        try:
+            # background priority: a burst of typing cannot crowd page views out of the call budget
+            with upstream_priority(Priority.BACKGROUND):
+                results = search_locations_via_api(prefix)
+            labels = list(dict.fromkeys(
+                location_label(result.name, result.region, result.country) for result in results
+            ))
+            with self._lock:
+                self.upstream_searches += 1
+                self._upstream[prefix] = labels
+                while len(self._upstream) > settings.WEATHER_AUTOCOMPLETE_UPSTREAM_CACHE_SIZE:
+                    self._upstream.popitem(last=False)
+        except WeatherAPIError as error:
+            logger.info(f"No WeatherAPI suggestions for {prefix!r}: {error}")
+        except Exception:
+            logger.exception(f"Failed to search WeatherAPI for {prefix!r}")
+        finally:
+            with self._lock:
+                self._searching.discard(prefix)
+
+
+location_suggestions = LocationSuggestions()
+
+
+def suggest_locations(prefix, limit=None) -> list[str]:
+    return location_suggestions.search(prefix, limit)
@@ -0,0 +1,156 @@
+import math
+import re
+from datetime import timedelta
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.timezone import now
+
+from weather.models import LocationWeather
+
+
+CURRENT_WEATHER_KEY = "weather:current:{location_id}"
+CACHE_HITS_KEY = "weather:stats:hits"
+CACHE_MISSES_KEY = "weather:stats:misses"
+# a "lat,lon" query
+COORDINATES = re.compile(r"^(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)$")
+
+
+def normalize_location(name: str) -> str:
+    """
+    Normalize a location query so equivalent spellings share a cache key: collapsed
+    whitespace, lower case, ", " between parts, and "lat,lon" queries rounded to two
+    decimals (about a kilometre).
+    """
+    name = " ".join(name.split()).lower()
+    coordinates = COORDINATES.match(name)
+    if coordinates:
+        return ",".join(f"{float(value):.2f}" for value in coordinates.groups())
+    return re.sub(r"\s*,\s*", ", ", name)
+
+
+def location_key(template, **values) -> str:
+    """
+    `template` formatted with an md5 of each value: normalized queries contain spaces and
+    commas ("new york", "warangal, india"), which memcached rejects in keys.
+    """
+    return template.format(**{name: md5(value.encode()).hexdigest() for name, value in values.items()})
+
+
+def get_weather_cache():
+    return caches[settings.WEATHER_CACHE_ALIAS]
+
+
+def get_reading_expiry(weather: LocationWeather):
+    """
+    A reading is fresh until the next expected upstream update, i.e. `record_timestamp`
+    plus WEATHER_CACHE_TTL. A reading we just fetched is always kept for at least
+    WEATHER_CACHE_MIN_TTL so a late upstream update does not turn every request into a miss.
+    """
+    expires_at = weather.record_timestamp + timedelta(seconds=settings.WEATHER_CACHE_TTL)
+    if weather.created_on:
+        expires_at = max(expires_at, weather.created_on + timedelta(seconds=settings.WEATHER_CACHE_MIN_TTL))
+    return expires_at
+
+
+def get_reading_ttl(weather: LocationWeather) -> float:
+    """Seconds left before the reading goes stale (negative when already stale)."""
+    return (get_reading_expiry(weather) - now()).total_seconds()
+
+
+def is_reading_fresh(weather: LocationWeather) -> bool:
+    return get_reading_ttl(weather) > 0
+
+
+def _incr_counter(key):
+    cache = get_weather_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+async def _aincr_counter(key):
+    cache = get_weather_cache()
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, timeout=None)
+
+
+def peek_cached_weather(location_id: int | None):
+    """Like `get_cached_weather` but without touching the hit/miss counters."""
+    if location_id is None:
+        return None
+    weather = get_weather_cache().get(CURRENT_WEATHER_KEY.format(location_id=location_id))
+    if weather is not None and is_reading_fresh(weather):
+        return weather
+    return None
+
+
+def get_cached_weather(location_id: int | None):
+    """
+    Return the cached reading of a location if it is still fresh, otherwise None (always
+    for a query not resolved to a location yet, `location_id` None).
+    """
+    weather = peek_cached_weather(location_id)
+    _incr_counter(CACHE_HITS_KEY if weather is not None else CACHE_MISSES_KEY)
+    return weather
+
+
+def set_cached_weather(weather: LocationWeather):
+    """Cache a reading under its location until it goes stale."""
+    ttl = get_reading_ttl(weather)
+    if ttl <= 0:
+        return
+    get_weather_cache().set(
+        CURRENT_WEATHER_KEY.format(location_id=weather.location_id), weather, timeout=math.ceil(ttl)
+    )
+
+
+async def apeek_cached_weather(location_id: int | None):
+    """Async variant of `peek_cached_weather`."""
+    if location_id is None:
+        return None
+    weather = await get_weather_cache().aget(CURRENT_WEATHER_KEY.format(location_id=location_id))
+    if weather is not None and is_reading_fresh(weather):
+        return weather
+    return None
+
+
+async def aget_cached_weather(location_id: int | None):
+    """Async variant of `get_cached_weather`."""
+    weather = await apeek_cached_weather(location_id)
+    await _aincr_counter(CACHE_HITS_KEY if weather is not None else CACHE_MISSES_KEY)
+    return weather
+
+
+async def aset_cached_weather(weather: LocationWeather):
+    """Async variant of `set_cached_weather`."""
+    ttl = get_reading_ttl(weather)
+    if ttl <= 0:
+        return
+    await get_weather_cache().aset(
+        CURRENT_WEATHER_KEY.format(location_id=weather.location_id), weather, timeout=math.ceil(ttl)
+    )
+
+
+def get_cache_stats():
+    """Hit/miss counters shared by every worker using the same cache backend."""
+    cache = get_weather_cache()
+    hits = cache.get(CACHE_HITS_KEY, 0)
+    misses = cache.get(CACHE_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_cache_stats():
+    get_weather_cache().delete_many([CACHE_HITS_KEY, CACHE_MISSES_KEY])
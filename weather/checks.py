@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+# caches that keep their entries inside one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_quota_cache(app_configs, **kwargs):
+    """The WeatherAPI call budget is only shared by every worker through a cache they all reach."""
+    if not (settings.WEATHERAPI_RATE_PER_SECOND or settings.WEATHERAPI_QUOTA_PER_MONTH):
+        return []
+    backend = settings.CACHES.get(settings.WEATHER_CACHE_ALIAS, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"The WeatherAPI quota limiter counts calls in the {settings.WEATHER_CACHE_ALIAS!r} cache, "
+            f"which uses {backend} and is not shared between processes.",
+            hint="Set DJANGO_CACHE_BACKEND and DJANGO_CACHE_LOCATION to a shared cache such as Redis or "
+                 "Memcached, or turn the limits off with WEATHERAPI_RATE_PER_SECOND=0 and WEATHERAPI_QUOTA_PER_MONTH=0.",
+            id='weather.W001',
+        )
+    ]
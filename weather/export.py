@@ -0,0 +1,127 @@
+"""
+Streaming export of stored readings as NDJSON or CSV, optionally gzipped.
+
+Rows are read with `QuerySet.iterator(chunk_size=...)` (a server-side cursor where the
+backend has one, `fetchmany` batches on SQLite) as plain tuples, formatted one at a time
+and yielded in buffers of about WEATHER_EXPORT_BUFFER_SIZE bytes, so memory stays flat
+however many rows are exported. Readings moved to the archive (see `weather.archive`)
+are read from their memory-mapped segments the same chunk at a time and merged into the
+stream in timestamp order.
+"""
+import csv
+import heapq
+import json
+import zlib
+from datetime import datetime, time, timezone
+from operator import itemgetter
+
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils.dateparse import parse_date, parse_datetime
+
+from weather.archive import has_archive, iter_archived_readings
+from weather.history import METRICS
+from weather.models import Location, LocationWeather, WeatherCondition
+
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+EXPORT_COLUMNS = ('location', 'record_timestamp', 'condition', 'wind_direction', *METRICS)
+
+
+def parse_export_time(value):
+    """An ISO date or datetime as an aware datetime (UTC unless an offset is given); raises ValueError."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime {value!r}")
+        moment = datetime.combine(day, time())
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def get_export_queryset(location_id, since=None, until=None):
+    """Readings of a location in [since, until), oldest first, as tuples in EXPORT_COLUMNS order."""
+    readings = LocationWeather.objects.filter(location_id=location_id)
+    if since is not None:
+        readings = readings.filter(record_timestamp__gte=since)
+    if until is not None:
+        readings = readings.filter(record_timestamp__lt=until)
+    return readings.order_by('record_timestamp').values_list(
+        'location__name', 'record_timestamp', 'condition__text', 'wind_direction',
+        *(Cast(metric, FloatField()) for metric in METRICS),
+    )
+
+
+def _iter_archived_rows(location_id, since, until):
+    """Archived readings of a location in [since, until), oldest first, as tuples in EXPORT_COLUMNS order."""
+    if not has_archive(since, until):
+        return
+    name = Location.objects.values_list('name', flat=True).get(pk=location_id)
+    conditions = dict(WeatherCondition.objects.values_list('id', 'text'))
+    readings = iter_archived_readings([location_id], since, until, chunk_size=settings.WEATHER_EXPORT_CHUNK_SIZE)
+    for epoch, condition_id, wind_direction, *metrics in readings:
+        record_timestamp = datetime.fromtimestamp(epoch, timezone.utc)
+        yield name, record_timestamp, conditions.get(condition_id), wind_direction.decode(), *metrics
+
+
+def _iter_rows(location_id, since, until):
+    stored = get_export_queryset(location_id, since, until).iterator(chunk_size=settings.WEATHER_EXPORT_CHUNK_SIZE)
+    for row in heapq.merge(_iter_archived_rows(location_id, since, until), stored, key=itemgetter(1)):
+        yield row[0], row[1].isoformat(), *row[2:]
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n'
+
+
+class _Echo:
+    """File-like object whose `write` returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _buffered(lines):
+    """Join formatted lines into byte chunks of about WEATHER_EXPORT_BUFFER_SIZE."""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= settings.WEATHER_EXPORT_BUFFER_SIZE:
+            yield ''.join(buffer).encode()
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_readings(location_id, export_format='ndjson', since=None, until=None, compress=False):
+    """Byte chunks of a location's readings in `export_format` ('ndjson' or 'csv'), gzipped when `compress`."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    rows = _iter_rows(location_id, since, until)
+    lines = iter_ndjson(rows) if export_format == 'ndjson' else iter_csv(rows)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if compress else chunks
@@ -1,7 +1,25 @@
 from django import forms
+from django.conf import settings
 
 
 class LocationSearchForm(forms.Form):
     location = forms.CharField(
         max_length=100, required=True, help_text="Enter location name"
     )
+
+
+class LocationCompareForm(forms.Form):
+    locations = forms.CharField(
+        max_length=10000, required=True, help_text="Comma-separated location names"
+    )
+
+    def clean_locations(self):
+        locations = [name.strip().lower() for name in self.cleaned_data['locations'].split(',')]
+        locations = list(dict.fromkeys(name for name in locations if name))
+        if not locations:
+            raise forms.ValidationError("Enter at least one location.")
+        if len(locations) > settings.WEATHER_COMPARE_MAX_LOCATIONS:
+            raise forms.ValidationError(
+                f"Compare at most {settings.WEATHER_COMPARE_MAX_LOCATIONS} locations at a time."
+            )
+        return locations
@@ -0,0 +1,102 @@
+"""
+Geohashes and distances for coordinate lookups.
+
+A location's geohash (stored on `Location.geohash`) interleaves the bits of its
+longitude and latitude, so every place inside a grid cell shares the cell's hash as a
+prefix and a bounding box is covered by a handful of prefix ranges on one index. The
+covering over-approximates the box; callers filter the candidates on the exact
+coordinates.
+"""
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# sorts after every geohash character, so [cell, cell + RANGE_END) holds the cell's hashes
+RANGE_END = "~"
+PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=PRECISION) -> str:
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        coordinate, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def location_geohash(latitude, longitude) -> str:
+    """Geohash stored for a location; blank when its coordinates are unknown."""
+    return "" if latitude is None or longitude is None else encode(latitude, longitude)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of the cells of a geohash `precision`."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def covering_cells(south, west, north, east, max_cells=32) -> list[str]:
+    """
+    Geohash prefixes of the cells covering a box, at the finest precision that needs at
+    most `max_cells` of them. A box crossing the antimeridian has `west > east`.
+    """
+    if west > east:
+        return sorted(set(covering_cells(south, west, north, 180.0, max_cells // 2))
+                      | set(covering_cells(south, -180.0, north, east, max_cells // 2)))
+    south, north = max(-90.0, float(south)), min(90.0, float(north))
+    west, east = max(-180.0, float(west)), min(180.0, float(east))
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor((north + 90) / height) - math.floor((south + 90) / height) + 1
+        columns = math.floor((east + 180) / width) - math.floor((west + 180) / width) + 1
+        if rows * columns <= max_cells or precision == 1:
+            break
+    cells = set()
+    for row in range(rows):
+        latitude = min(south + row * height, north)
+        for column in range(columns):
+            cells.add(encode(latitude, min(west + column * width, east), precision))
+        cells.add(encode(latitude, east, precision))
+    for column in range(columns):
+        cells.add(encode(north, min(west + column * width, east), precision))
+    cells.add(encode(north, east, precision))
+    return sorted(cells)
+
+
+def bounding_box(latitude, longitude, km):
+    """(south, west, north, east) of the box enclosing a `km` circle around a point."""
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = km / KM_PER_DEGREE
+    cos = math.cos(math.radians(latitude))
+    lon_delta = 180.0 if cos < 1e-9 else min(180.0, lat_delta / cos)
+    west, east = longitude - lon_delta, longitude + lon_delta
+    if lon_delta >= 180.0:
+        west, east = -180.0, 180.0
+    else:
+        west, east = (west + 540) % 360 - 180, (east + 540) % 360 - 180
+    return max(-90.0, latitude - lat_delta), west, min(90.0, latitude + lat_delta), east
+
+
+def distance_km(latitude1, longitude1, latitude2, longitude2) -> float:
+    """Great-circle (haversine) distance between two points."""
+    phi1, phi2 = math.radians(float(latitude1)), math.radians(float(latitude2))
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(float(longitude2) - float(longitude1))
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
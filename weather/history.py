@@ -0,0 +1,268 @@
+"""
+Process-local recent history of readings, kept as columnar ring buffers.
+
+Each location gets fixed-capacity `array('d')` columns (one per metric) plus an int64
+epoch column, so "last 24h" trends read floats directly instead of materializing
+`LocationWeather` rows and their `Decimal` fields. A buffer is filled from the DB on
+first use (or when a worker serves its first request), appended to when readings are stored by this process, and
+topped up from the DB every WEATHER_HISTORY_SYNC_INTERVAL seconds so readings stored
+by other processes (e.g. the refresh worker) show up. Beyond
+WEATHER_HISTORY_MAX_LOCATIONS the least recently used location is evicted.
+
+Only trends read the buffers. Alert checks look at one current reading per location:
+`check_for_extreme_conditions` gets the reading the request already holds, and
+`evaluate_location_alerts` casts `LatestWeather` columns to float in one query. Neither
+materializes history rows, and a buffer may lag the DB by a sync interval, so both
+stay off the buffers.
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DatabaseError, connection
+from django.utils.timezone import now, timedelta
+
+from services.utils import convert_epoch_to_utc
+from weather.models import LocationWeather, TrackedLocation
+
+
+logger = logging.getLogger(__name__)
+
+METRICS = (
+    'temperature', 'temperature_feels_like', 'wind_speed', 'pressure', 'precipitation', 'humidity', 'dewpoint',
+    'uv_index', 'gust_speed', 'visibility',
+)
+RecentReading = namedtuple('RecentReading', ('epoch', *METRICS))
+
+
+class RingBuffer:
+    """Fixed-capacity columns of one location's readings, oldest to newest."""
+
+    def __init__(self, capacity, covered_since):
+        self.capacity = capacity
+        self.epochs = array('q', [0]) * capacity
+        self.columns = {metric: array('d', [0.0]) * capacity for metric in METRICS}
+        self.start = 0
+        self.size = 0
+        # every reading at or after this epoch is in the buffer
+        self.covered_since = covered_since
+        self.synced_on = time.monotonic()
+
+    def __len__(self):
+        return self.size
+
+    def _index(self, position):
+        return (self.start + position) % self.capacity
+
+    @property
+    def nbytes(self):
+        return self.epochs.itemsize * self.capacity * (1 + len(self.columns))
+
+    @property
+    def newest_epoch(self):
+        return self.epochs[self._index(self.size - 1)] if self.size else None
+
+    def append(self, epoch, values):
+        """
+        Add a reading (`values` in METRICS order). A reading for the newest epoch replaces
+        it; an older one cannot be placed, so the buffer stops covering the time before it.
+        """
+        newest = self.newest_epoch
+        if newest is not None and epoch < newest:
+            self.covered_since = max(self.covered_since, epoch + 1)
+            return
+        if newest is not None and epoch == newest:
+            index = self._index(self.size - 1)
+        elif self.size < self.capacity:
+            index = self._index(self.size)
+            self.size += 1
+        else:
+            index = self.start
+            self.start = self._index(1)
+            self.covered_since = max(self.covered_since, self.epochs[index] + 1)
+        self.epochs[index] = epoch
+        for column, value in zip(self.columns.values(), values):
+            column[index] = value
+
+    def _segments(self, since):
+        """Physical (lo, hi) slices holding the readings at or after `since`."""
+        # epochs are sorted in logical order; bisect over the two physical runs
+        head = self.epochs[self.start:min(self.start + self.size, self.capacity)]
+        tail = self.epochs[:max(0, self.start + self.size - self.capacity)]
+        position = bisect_left(head, since)
+        if position < len(head):
+            return [(self.start + position, self.start + len(head)), (0, len(tail))]
+        return [(bisect_left(tail, since), len(tail))]
+
+    def aggregate(self, since):
+        """
+        Count and average/min/max of each metric over the readings at or after `since`
+        (keyed like the ORM aggregates, e.g. `temperature__avg`), or None when the buffer
+        does not cover the whole window.
+        """
+        if since < self.covered_since:
+            return None
+        segments = [(lo, hi) for lo, hi in self._segments(since) if hi > lo]
+        aggregates = {'count': sum(hi - lo for lo, hi in segments)}
+        for metric, column in self.columns.items():
+            values = [column[lo:hi] for lo, hi in segments]
+            if aggregates['count']:
+                aggregates[f'{metric}__avg'] = sum(map(sum, values)) / aggregates['count']
+                aggregates[f'{metric}__min'] = min(map(min, values))
+                aggregates[f'{metric}__max'] = max(map(max, values))
+            else:
+                aggregates[f'{metric}__avg'] = aggregates[f'{metric}__min'] = aggregates[f'{metric}__max'] = None
+        return aggregates
+
+    def latest(self):
+        if not self.size:
+            return None
+        index = self._index(self.size - 1)
+        return RecentReading(self.epochs[index], *(column[index] for column in self.columns.values()))
+
+
+def _epoch(timestamp):
+    return int(timestamp.timestamp())
+
+
+def _load_readings(location_id, after):
+    """(epoch, *metrics) of the stored readings of a location after `after`, oldest first, without model instances."""
+    rows = LocationWeather.objects.filter(
+        location_id=location_id, record_timestamp__gt=after
+    ).order_by('record_timestamp').values_list('record_timestamp', *METRICS)
+    return [(_epoch(row[0]), [float(value) for value in row[1:]]) for row in rows]
+
+
+class RecentHistoryStore:
+    """LRU map of location id -> RingBuffer, bounded by WEATHER_HISTORY_MAX_LOCATIONS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+
+    def _load(self, location_id):
+        since = now() - timedelta(hours=settings.WEATHER_HISTORY_WINDOW_HOURS)
+        readings = _load_readings(location_id, since)
+        buffer = RingBuffer(settings.WEATHER_HISTORY_CAPACITY, covered_since=_epoch(since))
+        for epoch, values in readings:
+            buffer.append(epoch, values)
+        with self._lock:
+            self.loads += 1
+            # another thread may have loaded it meanwhile
+            buffer = self._buffers.setdefault(location_id, buffer)
+            self._buffers.move_to_end(location_id)
+            while len(self._buffers) > settings.WEATHER_HISTORY_MAX_LOCATIONS:
+                self._buffers.popitem(last=False)
+                self.evictions += 1
+        return buffer
+
+    def _sync(self, location_id, buffer):
+        newest = buffer.newest_epoch
+        if newest is None:
+            after = now() - timedelta(hours=settings.WEATHER_HISTORY_WINDOW_HOURS)
+        else:
+            after = convert_epoch_to_utc(newest)
+        readings = _load_readings(location_id, after)
+        with self._lock:
+            for epoch, values in readings:
+                buffer.append(epoch, values)
+            buffer.synced_on = time.monotonic()
+
+    def get(self, location_id) -> RingBuffer:
+        """The buffer of a location, loaded or topped up from the DB when needed."""
+        with self._lock:
+            buffer = self._buffers.get(location_id)
+            if buffer is not None:
+                self._buffers.move_to_end(location_id)
+        if buffer is None:
+            return self._load(location_id)
+        if time.monotonic() - buffer.synced_on > settings.WEATHER_HISTORY_SYNC_INTERVAL:
+            self._sync(location_id, buffer)
+        return buffer
+
+    def aggregate(self, location_id, since):
+        buffer = self.get(location_id)
+        with self._lock:
+            return buffer.aggregate(_epoch(since))
+
+    def latest(self, location_id):
+        buffer = self.get(location_id)
+        with self._lock:
+            return buffer.latest()
+
+    def extend(self, entries):
+        """Append stored readings to the buffers already held; other locations load on first use."""
+        with self._lock:
+            for entry in entries:
+                buffer = self._buffers.get(entry.location_id)
+                if buffer is not None:
+                    buffer.append(
+                        _epoch(entry.record_timestamp), [float(getattr(entry, metric)) for metric in METRICS]
+                    )
+
+    def warm(self, location_ids):
+        for location_id in location_ids:
+            self.get(location_id)
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'locations': len(self._buffers),
+                'readings': sum(len(buffer) for buffer in self._buffers.values()),
+                'bytes': sum(buffer.nbytes for buffer in self._buffers.values()),
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+
+recent_history = RecentHistoryStore()
+
+
+def warm_recent_history():
+    """Load the most requested active locations, up to WEATHER_HISTORY_MAX_LOCATIONS, into this process."""
+    if not (settings.WEATHER_HISTORY_STORE and settings.WEATHER_HISTORY_WARM_ON_STARTUP):
+        return
+    location_ids = TrackedLocation.objects.filter(is_active=True).order_by('-request_count').values_list(
+        'location_id', flat=True
+    )[:settings.WEATHER_HISTORY_MAX_LOCATIONS]
+    try:
+        recent_history.warm(location_ids)
+    except DatabaseError:
+        # e.g. a worker starting before migrations ran; buffers then load on first use
+        logger.exception("Failed to warm recent history")
+        return
+    logger.info(f"Warmed recent history: {recent_history.stats()}")
+
+
+def _warm_in_background():
+    try:
+        warm_recent_history()
+    finally:
+        # the thread ends here; do not leave its connection open
+        connection.close()
+
+
+def _warm_on_first_request(**kwargs):
+    # only the receiver that manages to disconnect itself warms
+    if request_started.disconnect(_warm_on_first_request):
+        threading.Thread(target=_warm_in_background, name="weather-history-warm", daemon=True).start()
+
+
+def warm_recent_history_on_first_request():
+    """
+    Warm this process's recent history in a background thread once it serves its first
+    request: never at import (e.g. in a master that preloads the app before forking),
+    in management commands, or on the request thread.
+    """
+    request_started.connect(_warm_on_first_request)
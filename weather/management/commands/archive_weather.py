@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from weather.archive import archive_readings
+
+
+class Command(BaseCommand):
+    help = "Move rolled-up readings older than the archive age out of the DB into per-month columnar segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=float, default=settings.WEATHER_ARCHIVE_AFTER_DAYS,
+            help="Archive readings recorded more than this many days ago",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        archived = archive_readings(older_than_days=options["older_than_days"])
+        self.stdout.write(
+            f"Archived {archived} readings to {settings.WEATHER_ARCHIVE_DIR} in {time.perf_counter() - started:.2f}s"
+        )
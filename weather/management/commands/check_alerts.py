@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from weather.alerts import get_alert_rules
+from weather.selectors import evaluate_location_alerts, get_extreme_locations
+
+
+class Command(BaseCommand):
+    help = "Evaluate the active alert rules against the newest reading of every tracked location."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all-locations", action="store_true",
+            help="Find extreme locations among all stored locations with a single query instead",
+        )
+
+    def handle(self, *args, **options):
+        rules = get_alert_rules()
+        started = time.perf_counter()
+        if options["all_locations"]:
+            extreme = list(get_extreme_locations(rules))
+            elapsed = time.perf_counter() - started
+            for reading in extreme:
+                self.stdout.write(f"{reading.location.name}: {reading.rules_fired} rules fired")
+            self.stdout.write(
+                f"{len(extreme)} extreme locations, {sum(reading.rules_fired for reading in extreme)} rules fired "
+                f"({len(rules)} rules) in {elapsed * 1000:.1f}ms"
+            )
+            return
+        result = evaluate_location_alerts(rules=rules)
+        elapsed = time.perf_counter() - started
+        for name, count in result["by_rule"].items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(
+            f"Evaluated {len(rules)} rules against {result['locations']} locations: {len(result['alerting'])} "
+            f"alerting, {result['rules_fired']} rules fired in {elapsed * 1000:.1f}ms"
+        )
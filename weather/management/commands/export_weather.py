@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from weather.export import EXPORT_FORMATS, export_readings, parse_export_time
+from weather.resolver import resolve_location
+from weather.selectors import get_location
+
+
+class Command(BaseCommand):
+    help = "Stream the stored readings of a location as NDJSON or CSV to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("location")
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+        parser.add_argument("--since", help="ISO date or datetime (UTC unless an offset is given), inclusive")
+        parser.add_argument("--until", help="ISO date or datetime (UTC unless an offset is given), exclusive")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+        parser.add_argument("--output", "-o", default="-", help="Output file, '-' for stdout")
+
+    def handle(self, *args, **options):
+        try:
+            since, until = (
+                parse_export_time(options[key]) if options[key] else None for key in ("since", "until")
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        location = get_location(resolve_location(options["location"]))
+        if location is None:
+            raise CommandError(f"No stored location for {options['location']!r}")
+
+        started = time.perf_counter()
+        chunks = export_readings(location.id, options["format"], since, until, options["gzip"])
+        written = 0
+        output = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        self.stderr.write(f"Exported {written} bytes in {time.perf_counter() - started:.2f}s")
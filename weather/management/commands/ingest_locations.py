@@ -0,0 +1,45 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services.weatherapi import NoLocationFoundException
+from weather.services import ingest_locations
+
+
+class Command(BaseCommand):
+    help = "Fetch and store the current weather for a list of locations (one per line) from a file or stdin."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", nargs="?", default="-", help="File with one location per line, '-' for stdin")
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.WEATHER_INGEST_CONCURRENCY,
+            help="Max upstream calls in flight",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.WEATHER_INGEST_BATCH_SIZE,
+            help="Rows per bulk insert transaction",
+        )
+
+    def handle(self, *args, **options):
+        if options["file"] == "-":
+            lines = sys.stdin.readlines()
+        else:
+            with open(options["file"]) as file:
+                lines = file.readlines()
+        locations = list(dict.fromkeys(
+            line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")
+        ))
+
+        def on_failure(location, error):
+            reason = "no location found" if isinstance(error, NoLocationFoundException) else repr(error)
+            self.stderr.write(f"{location}: {reason}")
+
+        report = ingest_locations(
+            locations, concurrency=options["concurrency"], batch_size=options["batch_size"], on_failure=on_failure
+        )
+        self.stdout.write(
+            f"Ingested {report.rows} rows from {len(locations)} locations "
+            f"({len(report.failures)} failed) in {report.elapsed:.2f}s: "
+            f"{report.rows_per_second:.1f} rows/s, {report.upstream_calls_per_second:.1f} upstream calls/s"
+        )
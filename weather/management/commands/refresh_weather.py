@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from weather.services import refresh_tracked_locations
+
+
+class Command(BaseCommand):
+    help = "Keep tracked locations fresh so page views read from the DB/cache instead of calling WeatherAPI."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run a single refresh cycle and exit")
+        parser.add_argument(
+            "--cycle-interval", type=float, default=30, help="Seconds to sleep between refresh cycles"
+        )
+        parser.add_argument(
+            "--budget", type=int, default=settings.WEATHER_REFRESH_BUDGET, help="Max upstream calls per cycle"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.WEATHER_REFRESH_CONCURRENCY,
+            help="Max upstream calls in flight",
+        )
+        parser.add_argument(
+            "--jitter", type=float, default=settings.WEATHER_REFRESH_JITTER,
+            help="Max random seconds added to each location's next refresh",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            metrics = refresh_tracked_locations(
+                budget=options["budget"], concurrency=options["concurrency"], jitter=options["jitter"]
+            )
+            self.stdout.write(
+                f"refreshed={metrics['refreshed']} failed={metrics['failed']} "
+                f"rate_limited={metrics['rate_limited']} locked={metrics['locked']} due={metrics['due']} "
+                f"deferred={metrics['deferred']} expired={metrics['expired']} "
+                f"lag_avg={metrics['avg_lag']}s lag_max={metrics['max_lag']}s duration={metrics['duration']}s "
+                f"quota_left={metrics['quota']['remaining_month']}"
+            )
+            if options["once"]:
+                return
+            time.sleep(options["cycle_interval"])
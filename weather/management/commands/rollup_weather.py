@@ -0,0 +1,21 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from weather.services import update_weather_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the hourly and daily rollup buckets touched by readings stored since the rollup high-water mark."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.WEATHER_ROLLUP_BATCH_SIZE,
+            help="Readings scanned per transaction",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        processed = update_weather_rollups(batch_size=options["batch_size"])
+        self.stdout.write(f"Rolled up {processed} readings in {time.perf_counter() - started:.2f}s")
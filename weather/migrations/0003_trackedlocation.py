@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0002_locationweather_condition_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackedLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Normalized location query', max_length=255, unique=True)),
+                ('priority', models.SmallIntegerField(default=0, help_text='Higher priorities are refreshed first')),
+                ('refresh_interval', models.PositiveIntegerField(help_text='Seconds between refreshes')),
+                ('request_count', models.PositiveIntegerField(default=0, help_text='Page views, counted at most once per WEATHER_TRACKING_DEBOUNCE seconds')),
+                ('last_requested_on', models.DateTimeField(blank=True, null=True)),
+                ('last_refreshed_on', models.DateTimeField(blank=True, null=True)),
+                ('next_refresh_on', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['is_active', 'next_refresh_on'], name='weather_tra_is_acti_57f704_idx')],
+            },
+        ),
+    ]
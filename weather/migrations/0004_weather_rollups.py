@@ -0,0 +1,84 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0003_trackedlocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyWeatherRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('bucket_start', models.DateTimeField(help_text='Start of the bucket in UTC')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('wind_speed_sum', models.FloatField(default=0)),
+                ('wind_speed_min', models.FloatField(null=True)),
+                ('wind_speed_max', models.FloatField(null=True)),
+                ('pressure_sum', models.FloatField(default=0)),
+                ('pressure_min', models.FloatField(null=True)),
+                ('pressure_max', models.FloatField(null=True)),
+                ('precipitation_sum', models.FloatField(default=0)),
+                ('precipitation_min', models.FloatField(null=True)),
+                ('precipitation_max', models.FloatField(null=True)),
+                ('humidity_sum', models.FloatField(default=0)),
+                ('humidity_min', models.FloatField(null=True)),
+                ('humidity_max', models.FloatField(null=True)),
+                ('dewpoint_sum', models.FloatField(default=0)),
+                ('dewpoint_min', models.FloatField(null=True)),
+                ('dewpoint_max', models.FloatField(null=True)),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('name', 'bucket_start'), name='dailyweatherrollup_name_bucket_start_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyWeatherRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('bucket_start', models.DateTimeField(help_text='Start of the bucket in UTC')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('wind_speed_sum', models.FloatField(default=0)),
+                ('wind_speed_min', models.FloatField(null=True)),
+                ('wind_speed_max', models.FloatField(null=True)),
+                ('pressure_sum', models.FloatField(default=0)),
+                ('pressure_min', models.FloatField(null=True)),
+                ('pressure_max', models.FloatField(null=True)),
+                ('precipitation_sum', models.FloatField(default=0)),
+                ('precipitation_min', models.FloatField(null=True)),
+                ('precipitation_max', models.FloatField(null=True)),
+                ('humidity_sum', models.FloatField(default=0)),
+                ('humidity_min', models.FloatField(null=True)),
+                ('humidity_max', models.FloatField(null=True)),
+                ('dewpoint_sum', models.FloatField(default=0)),
+                ('dewpoint_min', models.FloatField(null=True)),
+                ('dewpoint_max', models.FloatField(null=True)),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('name', 'bucket_start'), name='hourlyweatherrollup_name_bucket_start_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+DEDUPLICATE_BATCH_SIZE = 1000
+
+
+def deduplicate_readings(apps, schema_editor):
+    """Keep the oldest row of every (name, record_timestamp) group, deleting the rest in batches."""
+    LocationWeather = apps.get_model('weather', 'LocationWeather')
+    duplicates = (
+        LocationWeather.objects.values('name', 'record_timestamp')
+        .annotate(keep_id=Min('id'), rows=Count('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    while True:
+        groups = list(duplicates[:DEDUPLICATE_BATCH_SIZE])
+        if not groups:
+            break
+        for group in groups:
+            LocationWeather.objects.filter(
+                name=group['name'], record_timestamp=group['record_timestamp']
+            ).exclude(id=group['keep_id']).delete()
+
+
+def reset_rollups(apps, schema_editor):
+    """The rollups counted every duplicate; rebuild them from the deduplicated readings."""
+    for model_name in ('HourlyWeatherRollup', 'DailyWeatherRollup', 'RollupWatermark'):
+        apps.get_model('weather', model_name).objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    # commit each deduplication batch instead of holding one huge transaction
+    atomic = False
+
+    dependencies = [
+        ('weather', '0004_weather_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_readings, migrations.RunPython.noop),
+        migrations.RunPython(reset_rollups, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='locationweather',
+            name='weather_loc_name_289acd_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='locationweather',
+            constraint=models.UniqueConstraint(fields=('name', 'record_timestamp'), name='locationweather_name_record_timestamp_uniq'),
+        ),
+    ]
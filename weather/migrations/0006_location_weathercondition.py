@@ -0,0 +1,166 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def move_to_locations_and_conditions(apps, schema_editor):
+    """Point every reading at its interned Location and WeatherCondition rows."""
+    LocationWeather = apps.get_model('weather', 'LocationWeather')
+    Location = apps.get_model('weather', 'Location')
+    WeatherCondition = apps.get_model('weather', 'WeatherCondition')
+
+    location_rows = (
+        LocationWeather.objects.values('name', 'region', 'country')
+        .annotate(latitude=Max('latitude'), longitude=Max('longitude'))
+        .order_by()
+    )
+    for row in location_rows:
+        location = Location.objects.create(**row)
+        LocationWeather.objects.filter(
+            name=row['name'], region=row['region'], country=row['country']
+        ).update(location=location)
+
+    condition_rows = LocationWeather.objects.values_list('condition_text', 'condition_icon').distinct().order_by()
+    for text, icon in condition_rows:
+        if not text and not icon:
+            continue
+        condition = WeatherCondition.objects.create(text=text, icon=icon)
+        LocationWeather.objects.filter(condition_text=text, condition_icon=icon).update(condition=condition)
+
+
+def reset_rollups(apps, schema_editor):
+    """Rollups are re-keyed by location; rebuild them from the readings."""
+    for model_name in ('HourlyWeatherRollup', 'DailyWeatherRollup', 'RollupWatermark'):
+        apps.get_model('weather', model_name).objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0005_locationweather_unique_reading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Lower-cased location name', max_length=255)),
+                ('region', models.CharField(max_length=255)),
+                ('country', models.CharField(max_length=255)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'region', 'country'), name='location_name_region_country_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WeatherCondition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.PositiveIntegerField(blank=True, help_text='WeatherAPI condition code', null=True)),
+                ('text', models.CharField(blank=True, max_length=300)),
+                ('icon', models.URLField(blank=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('text', 'icon'), name='weathercondition_text_icon_uniq')],
+            },
+        ),
+        migrations.RenameField(
+            model_name='locationweather',
+            old_name='condition',
+            new_name='condition_text',
+        ),
+        migrations.AddField(
+            model_name='locationweather',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='weather.location'),
+        ),
+        migrations.AddField(
+            model_name='locationweather',
+            name='condition',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='weather.weathercondition'),
+        ),
+        migrations.RunPython(move_to_locations_and_conditions),
+        migrations.RemoveConstraint(
+            model_name='locationweather',
+            name='locationweather_name_record_timestamp_uniq',
+        ),
+        migrations.RemoveField(
+            model_name='locationweather',
+            name='name',
+        ),
+        migrations.RemoveField(
+            model_name='locationweather',
+            name='region',
+        ),
+        migrations.RemoveField(
+            model_name='locationweather',
+            name='country',
+        ),
+        migrations.RemoveField(
+            model_name='locationweather',
+            name='latitude',
+        ),
+        migrations.RemoveField(
+            model_name='locationweather',
+            name='longitude',
+        ),
+        migrations.RemoveField(
+            model_name='locationweather',
+            name='condition_text',
+        ),
+        migrations.RemoveField(
+            model_name='locationweather',
+            name='condition_icon',
+        ),
+        migrations.AlterField(
+            model_name='locationweather',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='weather.location'),
+        ),
+        migrations.AddConstraint(
+            model_name='locationweather',
+            constraint=models.UniqueConstraint(fields=('location', 'record_timestamp'), name='locationweather_location_record_timestamp_uniq'),
+        ),
+        migrations.RunPython(reset_rollups, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='dailyweatherrollup',
+            name='dailyweatherrollup_name_bucket_start_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='hourlyweatherrollup',
+            name='hourlyweatherrollup_name_bucket_start_uniq',
+        ),
+        migrations.RemoveField(
+            model_name='dailyweatherrollup',
+            name='name',
+        ),
+        migrations.RemoveField(
+            model_name='hourlyweatherrollup',
+            name='name',
+        ),
+        migrations.AddField(
+            model_name='dailyweatherrollup',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='weather.location'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='hourlyweatherrollup',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='weather.location'),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='dailyweatherrollup',
+            constraint=models.UniqueConstraint(fields=('location', 'bucket_start'), name='dailyweatherrollup_location_bucket_start_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyweatherrollup',
+            constraint=models.UniqueConstraint(fields=('location', 'bucket_start'), name='hourlyweatherrollup_location_bucket_start_uniq'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0006_location_weathercondition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Forecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days', models.PositiveSmallIntegerField(help_text='Days covered by the issue')),
+                ('issued_on', models.DateTimeField(help_text='Upstream update time of the issue in UTC')),
+                ('expires_on', models.DateTimeField()),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast', to='weather.location')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ForecastDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text="Date in the location's timezone")),
+                ('max_temperature', models.DecimalField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5)),
+                ('min_temperature', models.DecimalField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5)),
+                ('avg_temperature', models.DecimalField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5)),
+                ('max_wind_speed', models.DecimalField(decimal_places=2, help_text='Wind speed in kilometers per hour', max_digits=5)),
+                ('total_precipitation', models.DecimalField(decimal_places=2, help_text='Precipitation in millimeters', max_digits=6)),
+                ('avg_humidity', models.DecimalField(decimal_places=2, help_text='Humidity percentage', max_digits=5)),
+                ('chance_of_rain', models.PositiveSmallIntegerField(help_text='Percentage')),
+                ('chance_of_snow', models.PositiveSmallIntegerField(help_text='Percentage')),
+                ('uv_index', models.DecimalField(decimal_places=1, max_digits=4)),
+                ('sunrise', models.CharField(blank=True, help_text='Local time, e.g. 05:44 AM', max_length=16)),
+                ('sunset', models.CharField(blank=True, help_text='Local time, e.g. 08:20 PM', max_length=16)),
+                ('condition', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='weather.weathercondition')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_days', to='weather.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'date'), name='forecastday_location_date_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ForecastHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('forecast_timestamp', models.DateTimeField(help_text='Start of the hour in UTC')),
+                ('temperature', models.DecimalField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5)),
+                ('temperature_feels_like', models.DecimalField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5)),
+                ('wind_speed', models.DecimalField(decimal_places=2, help_text='Wind speed in kilometers per hour', max_digits=5)),
+                ('wind_direction', models.CharField(max_length=3)),
+                ('pressure', models.DecimalField(decimal_places=2, help_text='Pressure in millibars', max_digits=6)),
+                ('precipitation', models.DecimalField(decimal_places=2, help_text='Precipitation in millimeters', max_digits=5)),
+                ('humidity', models.DecimalField(decimal_places=2, help_text='Humidity percentage', max_digits=5)),
+                ('chance_of_rain', models.PositiveSmallIntegerField(help_text='Percentage')),
+                ('uv_index', models.DecimalField(decimal_places=1, max_digits=4)),
+                ('gust_speed', models.DecimalField(decimal_places=2, help_text='Gust in kilometers per hour', max_digits=5)),
+                ('visibility', models.DecimalField(decimal_places=2, help_text='Visibility in kilometers', max_digits=5)),
+                ('condition', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='weather.weathercondition')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_hours', to='weather.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('location', 'forecast_timestamp'), name='forecasthour_location_forecast_timestamp_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0007_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Shown in the alert, e.g. Extreme temperature', max_length=100)),
+                ('field', models.CharField(choices=[('temperature', 'Temperature'), ('temperature_feels_like', 'Feels like'), ('wind_speed', 'Wind speed'), ('gust_speed', 'Gust speed'), ('pressure', 'Pressure'), ('precipitation', 'Precipitation'), ('humidity', 'Humidity'), ('dewpoint', 'Dew point'), ('uv_index', 'UV index'), ('visibility', 'Visibility')], max_length=32)),
+                ('operator', models.CharField(choices=[('gt', '>'), ('gte', '>='), ('lt', '<'), ('lte', '<=')], max_length=3)),
+                ('threshold', models.FloatField()),
+                ('country', models.CharField(blank=True, help_text='Only locations in this country; blank for all', max_length=255)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
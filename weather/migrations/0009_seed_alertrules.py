@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+# the thresholds previously hardcoded in `check_for_extreme_conditions`
+DEFAULT_RULES = [
+    ("Extreme temperature", "temperature", "gt", 35),
+    ("Extreme temperature", "temperature", "lt", 0),
+    ("High wind speed", "wind_speed", "gt", 100),
+    ("High humidity", "humidity", "gt", 90),
+    ("Extreme pressure", "pressure", "lt", 980),
+    ("Extreme pressure", "pressure", "gt", 1050),
+]
+
+
+def seed_alert_rules(apps, schema_editor):
+    AlertRule = apps.get_model("weather", "AlertRule")
+    AlertRule.objects.bulk_create(
+        AlertRule(name=name, field=field, operator=operator, threshold=threshold)
+        for name, field, operator, threshold in DEFAULT_RULES
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0008_alertrule'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_alert_rules, migrations.RunPython.noop),
+    ]
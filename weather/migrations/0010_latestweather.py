@@ -0,0 +1,72 @@
+# Generated by Django 5.1.1 on 2026-10-18 02:49
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+BACKFILL_BATCH_SIZE = 1000
+SNAPSHOT_FIELDS = (
+    'location_id', 'condition_id', 'temperature', 'temperature_feels_like', 'wind_speed', 'wind_direction',
+    'pressure', 'precipitation', 'humidity', 'dewpoint', 'uv_index', 'gust_speed', 'visibility',
+    'record_timestamp', 'created_on',
+)
+
+
+def backfill_latest_weather(apps, schema_editor):
+    """Copy the newest reading of every location, found with one index probe per location."""
+    Location = apps.get_model('weather', 'Location')
+    LocationWeather = apps.get_model('weather', 'LocationWeather')
+    LatestWeather = apps.get_model('weather', 'LatestWeather')
+    newest = LocationWeather.objects.filter(location=OuterRef('pk')).order_by('-record_timestamp').values('pk')[:1]
+    readings = LocationWeather.objects.filter(
+        pk__in=Location.objects.values(newest=Subquery(newest))
+    ).values(*SNAPSHOT_FIELDS)
+    batch = []
+    for reading in readings.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        batch.append(LatestWeather(**reading))
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            LatestWeather.objects.bulk_create(batch)
+            batch = []
+    LatestWeather.objects.bulk_create(batch)
+    # auto_now_add stamped the copies with the migration time: restore the readings' own
+    reading = LocationWeather.objects.filter(
+        location=OuterRef('location'), record_timestamp=OuterRef('record_timestamp')
+    ).values('created_on')[:1]
+    LatestWeather.objects.update(created_on=Subquery(reading))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0009_seed_alertrules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestWeather',
+            fields=[
+                ('temperature', models.DecimalField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('-100')), django.core.validators.MaxValueValidator(Decimal('60'))])),
+                ('temperature_feels_like', models.DecimalField(decimal_places=2, help_text='Temperature in Celsius', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('-100')), django.core.validators.MaxValueValidator(Decimal('60'))])),
+                ('wind_speed', models.DecimalField(decimal_places=2, help_text='Wind speed in kilometers per hour', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('wind_direction', models.CharField(choices=[('N', 'North'), ('S', 'South'), ('E', 'East'), ('W', 'West'), ('NE', 'Northeast'), ('SE', 'Southeast'), ('SW', 'Southwest'), ('NW', 'Northwest')], max_length=2)),
+                ('pressure', models.DecimalField(decimal_places=2, help_text='Pressure in millibars', max_digits=6, validators=[django.core.validators.MinValueValidator(Decimal('870')), django.core.validators.MaxValueValidator(Decimal('1080'))])),
+                ('precipitation', models.DecimalField(decimal_places=2, help_text='Precipitation in millimeters', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('humidity', models.DecimalField(decimal_places=2, help_text='Humidity percentage', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0')), django.core.validators.MaxValueValidator(Decimal('100'))])),
+                ('dewpoint', models.DecimalField(decimal_places=2, help_text='Dewpoint in Celsius', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('-100')), django.core.validators.MaxValueValidator(Decimal('60'))])),
+                ('uv_index', models.IntegerField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(11)])),
+                ('gust_speed', models.DecimalField(decimal_places=2, help_text='Gust in kilometers per hour', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('visibility', models.DecimalField(decimal_places=2, help_text='Visibility in kilometers', max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('record_timestamp', models.DateTimeField(help_text='Time in UTC')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest_weather', serialize=False, to='weather.location')),
+                ('condition', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='weather.weathercondition')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(backfill_latest_weather, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-18 03:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0010_latestweather'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(help_text='Normalized search query', max_length=255, unique=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='weather.location')),
+            ],
+            options={
+                'verbose_name_plural': 'location aliases',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+from weather.geo import encode
+
+
+def backfill_geohashes(apps, schema_editor):
+    """Hash the coordinates of the locations stored so far."""
+    Location = apps.get_model('weather', 'Location')
+    locations = Location.objects.filter(latitude__isnull=False, longitude__isnull=False).only('latitude', 'longitude')
+    batch = []
+    for location in locations.iterator(chunk_size=1000):
+        location.geohash = encode(location.latitude, location.longitude)
+        batch.append(location)
+        if len(batch) == 1000:
+            Location.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Location.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0011_locationalias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, help_text='Geohash of the coordinates, for lookups by area', max_length=12),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+    ]
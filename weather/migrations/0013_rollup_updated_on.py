@@ -0,0 +1,45 @@
+# Generated by Django 5.1.1 on 2026-10-18 04:20
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def move_watermark_to_updated_on(apps, schema_editor):
+    """
+    Readings already folded keep their `created_on` as update time and set the new mark;
+    the others keep the migration time, so the next rollup run picks them up.
+    """
+    LocationWeather = apps.get_model('weather', 'LocationWeather')
+    RollupWatermark = apps.get_model('weather', 'RollupWatermark')
+    for watermark in RollupWatermark.objects.all():
+        folded = LocationWeather.objects.filter(id__lte=watermark.last_id)
+        folded.update(updated_on=F('created_on'))
+        watermark.last_updated_on = folded.aggregate(last=Max('created_on'))['last']
+        watermark.save(update_fields=['last_updated_on'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0012_location_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='locationweather',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='last_updated_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(move_watermark_to_updated_on, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='rollupwatermark',
+            name='last_id',
+        ),
+    ]
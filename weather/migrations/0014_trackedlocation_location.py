@@ -0,0 +1,58 @@
+# Generated by Django 5.1.1 on 2026-10-18 05:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def link_tracked_locations(apps, schema_editor):
+    """
+    Point each tracked query at the location it resolves to: its alias, else the first
+    location of that name. Queries resolving to an already tracked location are folded
+    into it; those resolving to none are dropped.
+    """
+    Location = apps.get_model('weather', 'Location')
+    LocationAlias = apps.get_model('weather', 'LocationAlias')
+    TrackedLocation = apps.get_model('weather', 'TrackedLocation')
+    tracked_by_location = {}
+    for tracked in TrackedLocation.objects.order_by('-request_count', 'id'):
+        location_id = (
+            LocationAlias.objects.filter(query=tracked.name).values_list('location_id', flat=True).first()
+            or Location.objects.filter(name=tracked.name).order_by('id').values_list('id', flat=True).first()
+        )
+        if location_id is None:
+            tracked.delete()
+        elif location_id in tracked_by_location:
+            TrackedLocation.objects.filter(pk=tracked_by_location[location_id]).update(
+                request_count=F('request_count') + tracked.request_count
+            )
+            tracked.delete()
+        else:
+            tracked.location_id = location_id
+            tracked.save(update_fields=['location'])
+            tracked_by_location[location_id] = tracked.pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0013_rollup_updated_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trackedlocation',
+            name='location',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tracking', to='weather.location'),
+        ),
+        migrations.RunPython(link_tracked_locations, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='trackedlocation',
+            name='location',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tracking', to='weather.location'),
+        ),
+        migrations.RemoveField(
+            model_name='trackedlocation',
+            name='name',
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 
 from services.utils import convert_celsius_to_fahreheit, convert_kmph_to_mph
+from weather.geo import location_geohash
 
 
 class WindDirectionChoices(models.TextChoices):
@@ -19,14 +20,63 @@ class WindDirectionChoices(models.TextChoices):
     NW = "NW", _("Northwest")
 
 
-class LocationWeather(models.Model):
-    name = models.CharField(max_length=255)
+class Location(models.Model):
+    name = models.CharField(max_length=255, help_text="Lower-cased location name")
     region = models.CharField(max_length=255)
     country = models.CharField(max_length=255)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
-    condition = models.CharField(max_length=300, blank=True)
-    condition_icon = models.URLField(blank=True)
+    geohash = models.CharField(
+        max_length=12, blank=True, db_index=True, help_text="Geohash of the coordinates, for lookups by area"
+    )
+
+    class Meta:
+        # the unique index also serves lookups by name
+        constraints = [
+            models.UniqueConstraint(fields=["name", "region", "country"], name="location_name_region_country_uniq")
+        ]
+
+    def __str__(self):
+        return f"{self.name}, {self.region}, {self.country}"
+
+    def save(self, *args, **kwargs):
+        self.geohash = location_geohash(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
+
+class LocationAlias(models.Model):
+    """A normalized search query and the stored location WeatherAPI resolved it to."""
+    query = models.CharField(max_length=255, unique=True, help_text="Normalized search query")
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="aliases")
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "location aliases"
+
+    def __str__(self):
+        return f"{self.query} -> {self.location.name}"
+
+
+class WeatherCondition(models.Model):
+    """Interned condition text/icon pairs shared by all readings."""
+    code = models.PositiveIntegerField(null=True, blank=True, help_text="WeatherAPI condition code")
+    text = models.CharField(max_length=300, blank=True)
+    icon = models.URLField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["text", "icon"], name="weathercondition_text_icon_uniq")
+        ]
+
+    def __str__(self):
+        return self.text
+
+
+class WeatherReading(models.Model):
+    """Conditions at a location at `record_timestamp`."""
+    condition = models.ForeignKey(
+        WeatherCondition, on_delete=models.PROTECT, related_name="+", null=True, blank=True
+    )
     temperature = models.DecimalField(
         max_digits=5, decimal_places=2, 
         help_text="Temperature in Celsius", 
@@ -80,8 +130,11 @@ class LocationWeather(models.Model):
     record_timestamp = models.DateTimeField(help_text="Time in UTC")
     created_on = models.DateTimeField(auto_now_add=True)
 
+    # set on a stored reading served in place of a fresh one while WeatherAPI is failing
+    is_stale = False
+
     class Meta:
-        indexes = [models.Index(fields=["name", "-record_timestamp"])]
+        abstract = True
 
     @property
     def temperature_in_fahrenheit(self):
@@ -98,4 +151,215 @@ class LocationWeather(models.Model):
         return self.record_timestamp.astimezone(kolkata_tz).time()
 
     def __str__(self):
-        return f"{self.name} ({self.record_timestamp.strftime('%Y-%m-%d %H:%M:%S')})"
+        return f"{self.location.name} ({self.record_timestamp.strftime('%Y-%m-%d %H:%M:%S')})"
+
+
+class LocationWeather(WeatherReading):
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="readings")
+    # bumped when an upsert rewrites the reading, so the rollups fold it again
+    updated_on = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # the unique index also serves the latest-first lookups per location
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location", "record_timestamp"], name="locationweather_location_record_timestamp_uniq"
+            )
+        ]
+
+
+class LatestWeather(WeatherReading):
+    """
+    Copy of the newest reading of each location, upserted in the same transaction as the
+    readings, so current conditions are a primary-key lookup instead of a latest-first
+    scan of `LocationWeather`.
+    """
+    location = models.OneToOneField(
+        Location, on_delete=models.CASCADE, primary_key=True, related_name="latest_weather"
+    )
+
+
+class Forecast(models.Model):
+    """The forecast issue currently stored for a location, reused until `expires_on`."""
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, related_name="forecast")
+    days = models.PositiveSmallIntegerField(help_text="Days covered by the issue")
+    issued_on = models.DateTimeField(help_text="Upstream update time of the issue in UTC")
+    expires_on = models.DateTimeField()
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.location.name} ({self.days} days, expires {self.expires_on.strftime('%Y-%m-%d %H:%M')})"
+
+
+class ForecastDay(models.Model):
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="forecast_days")
+    date = models.DateField(help_text="Date in the location's timezone")
+    condition = models.ForeignKey(
+        WeatherCondition, on_delete=models.PROTECT, related_name="+", null=True, blank=True
+    )
+    max_temperature = models.DecimalField(max_digits=5, decimal_places=2, help_text="Temperature in Celsius")
+    min_temperature = models.DecimalField(max_digits=5, decimal_places=2, help_text="Temperature in Celsius")
+    avg_temperature = models.DecimalField(max_digits=5, decimal_places=2, help_text="Temperature in Celsius")
+    max_wind_speed = models.DecimalField(
+        max_digits=5, decimal_places=2, help_text="Wind speed in kilometers per hour"
+    )
+    total_precipitation = models.DecimalField(
+        max_digits=6, decimal_places=2, help_text="Precipitation in millimeters"
+    )
+    avg_humidity = models.DecimalField(max_digits=5, decimal_places=2, help_text="Humidity percentage")
+    chance_of_rain = models.PositiveSmallIntegerField(help_text="Percentage")
+    chance_of_snow = models.PositiveSmallIntegerField(help_text="Percentage")
+    uv_index = models.DecimalField(max_digits=4, decimal_places=1)
+    sunrise = models.CharField(max_length=16, blank=True, help_text="Local time, e.g. 05:44 AM")
+    sunset = models.CharField(max_length=16, blank=True, help_text="Local time, e.g. 08:20 PM")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["location", "date"], name="forecastday_location_date_uniq")
+        ]
+
+    def __str__(self):
+        return f"{self.location_id} ({self.date})"
+
+
+class ForecastHour(models.Model):
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="forecast_hours")
+    forecast_timestamp = models.DateTimeField(help_text="Start of the hour in UTC")
+    condition = models.ForeignKey(
+        WeatherCondition, on_delete=models.PROTECT, related_name="+", null=True, blank=True
+    )
+    temperature = models.DecimalField(max_digits=5, decimal_places=2, help_text="Temperature in Celsius")
+    temperature_feels_like = models.DecimalField(
+        max_digits=5, decimal_places=2, help_text="Temperature in Celsius"
+    )
+    wind_speed = models.DecimalField(max_digits=5, decimal_places=2, help_text="Wind speed in kilometers per hour")
+    wind_direction = models.CharField(max_length=3)
+    pressure = models.DecimalField(max_digits=6, decimal_places=2, help_text="Pressure in millibars")
+    precipitation = models.DecimalField(max_digits=5, decimal_places=2, help_text="Precipitation in millimeters")
+    humidity = models.DecimalField(max_digits=5, decimal_places=2, help_text="Humidity percentage")
+    chance_of_rain = models.PositiveSmallIntegerField(help_text="Percentage")
+    uv_index = models.DecimalField(max_digits=4, decimal_places=1)
+    gust_speed = models.DecimalField(max_digits=5, decimal_places=2, help_text="Gust in kilometers per hour")
+    visibility = models.DecimalField(max_digits=5, decimal_places=2, help_text="Visibility in kilometers")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location", "forecast_timestamp"], name="forecasthour_location_forecast_timestamp_uniq"
+            )
+        ]
+
+    @property
+    def forecast_time_to_asia_kolkata(self):
+        kolkata_tz = pytz.timezone('Asia/Kolkata')
+        return self.forecast_timestamp.astimezone(kolkata_tz).time()
+
+    def __str__(self):
+        return f"{self.location_id} ({self.forecast_timestamp.strftime('%Y-%m-%d %H:%M')})"
+
+
+class TrackedLocation(models.Model):
+    """A location kept fresh by the `refresh_weather` worker instead of by page views."""
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, related_name="tracking")
+    priority = models.SmallIntegerField(default=0, help_text="Higher priorities are refreshed first")
+    refresh_interval = models.PositiveIntegerField(help_text="Seconds between refreshes")
+    request_count = models.PositiveIntegerField(
+        default=0, help_text="Page views, counted at most once per WEATHER_TRACKING_DEBOUNCE seconds"
+    )
+    last_requested_on = models.DateTimeField(null=True, blank=True)
+    last_refreshed_on = models.DateTimeField(null=True, blank=True)
+    next_refresh_on = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["is_active", "next_refresh_on"])]
+
+    def __str__(self):
+        return str(self.location)
+
+
+class WeatherRollup(models.Model):
+    """Count, sum, min and max of each numeric reading for one location over one time bucket."""
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="+")
+    bucket_start = models.DateTimeField(help_text="Start of the bucket in UTC")
+    count = models.PositiveIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_min = models.FloatField(null=True)
+    temperature_max = models.FloatField(null=True)
+    wind_speed_sum = models.FloatField(default=0)
+    wind_speed_min = models.FloatField(null=True)
+    wind_speed_max = models.FloatField(null=True)
+    pressure_sum = models.FloatField(default=0)
+    pressure_min = models.FloatField(null=True)
+    pressure_max = models.FloatField(null=True)
+    precipitation_sum = models.FloatField(default=0)
+    precipitation_min = models.FloatField(null=True)
+    precipitation_max = models.FloatField(null=True)
+    humidity_sum = models.FloatField(default=0)
+    humidity_min = models.FloatField(null=True)
+    humidity_max = models.FloatField(null=True)
+    dewpoint_sum = models.FloatField(default=0)
+    dewpoint_min = models.FloatField(null=True)
+    dewpoint_max = models.FloatField(null=True)
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=["location", "bucket_start"], name="%(class)s_location_bucket_start_uniq")
+        ]
+
+    def __str__(self):
+        return f"{self.location_id} ({self.bucket_start.strftime('%Y-%m-%d %H:%M')})"
+
+
+class HourlyWeatherRollup(WeatherRollup):
+    pass
+
+
+class DailyWeatherRollup(WeatherRollup):
+    pass
+
+
+class RollupWatermark(models.Model):
+    """High-water mark of the `LocationWeather.updated_on` times already folded into the rollups."""
+    name = models.CharField(max_length=100, unique=True)
+    last_updated_on = models.DateTimeField(null=True, blank=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_updated_on}"
+
+
+class AlertRule(models.Model):
+    """A threshold on one reading field, e.g. `temperature > 35`, optionally limited to one country."""
+
+    class Operator(models.TextChoices):
+        GT = "gt", ">"
+        GTE = "gte", ">="
+        LT = "lt", "<"
+        LTE = "lte", "<="
+
+    FIELD_CHOICES = [
+        ("temperature", _("Temperature")),
+        ("temperature_feels_like", _("Feels like")),
+        ("wind_speed", _("Wind speed")),
+        ("gust_speed", _("Gust speed")),
+        ("pressure", _("Pressure")),
+        ("precipitation", _("Precipitation")),
+        ("humidity", _("Humidity")),
+        ("dewpoint", _("Dew point")),
+        ("uv_index", _("UV index")),
+        ("visibility", _("Visibility")),
+    ]
+
+    name = models.CharField(max_length=100, help_text="Shown in the alert, e.g. Extreme temperature")
+    field = models.CharField(max_length=32, choices=FIELD_CHOICES)
+    operator = models.CharField(max_length=3, choices=Operator.choices)
+    threshold = models.FloatField()
+    country = models.CharField(max_length=255, blank=True, help_text="Only locations in this country; blank for all")
+    is_active = models.BooleanField(default=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        scope = f" in {self.country}" if self.country else ""
+        return f"{self.name}: {self.field} {self.get_operator_display()} {self.threshold:g}{scope}"
@@ -0,0 +1,149 @@
+"""
+Resolution of search queries to stored locations.
+
+WeatherAPI resolves many spellings to one place ("Warangal", "warangal, india",
+"18.00,79.58"), but readings, the cache and tracking are keyed by `Location` id, so
+without this each spelling went upstream on every request. A query answered once is
+recorded as a `LocationAlias` of the location it resolved to, and later requests for it
+read that location's entries. Queries WeatherAPI did not recognise are remembered for
+WEATHER_UNKNOWN_LOCATION_TTL seconds, so repeating a typo costs no upstream call. A "lat,lon" query with no alias resolves to the stored location within
+WEATHER_NEARBY_KM, so it reuses that location's reading. Aliases and unknown queries
+are read through the weather cache.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from services.weatherapi import NoLocationFoundException
+from weather.cache import COORDINATES, get_weather_cache, location_key, normalize_location
+from weather.models import Location, LocationAlias
+from weather.selectors import get_nearest_location_id
+
+
+ALIAS_KEY = "weather:alias:{query}"
+UNKNOWN_KEY = "weather:unknown:{query}"
+# cached for a query nothing is known about yet; location ids start at 1
+UNRESOLVED = 0
+
+
+def _get_nearby(query):
+    """Id of the stored location within WEATHER_NEARBY_KM of a "lat,lon" query, or None."""
+    coordinates = COORDINATES.match(query)
+    if coordinates is None:
+        return None
+    return get_nearest_location_id(*map(float, coordinates.groups()), settings.WEATHER_NEARBY_KM)
+
+
+def _get_aliases(queries):
+    """
+    `{query: location id}` of the normalized queries recorded as an alias, or naming
+    exactly one stored location, in one query. A name shared by several places (e.g.
+    "london") resolves only through an alias.
+    """
+    queries = set(queries)
+    aliases, named = {}, {}
+    rows = Location.objects.filter(Q(aliases__query__in=queries) | Q(name__in=queries)).order_by('id').values_list(
+        'id', 'name', 'aliases__query'
+    )
+    for location_id, name, alias in rows:
+        if alias in queries:
+            aliases[alias] = location_id
+        if name in queries:
+            named.setdefault(name, set()).add(location_id)
+    return {**{name: ids.pop() for name, ids in named.items() if len(ids) == 1}, **aliases}
+
+
+def _get_alias(query):
+    """Location id of a normalized query from the alias index, or UNRESOLVED."""
+    return _get_aliases([query]).get(query) or _get_nearby(query) or UNRESOLVED
+
+
+def resolve_location(query: str) -> int | None:
+    """
+    Id of the stored location a search query resolves to, or None while nothing is known
+    about it. Raises `NoLocationFoundException` for a query WeatherAPI recently did not
+    recognise.
+    """
+    query = normalize_location(query)
+    alias_key, unknown_key = location_key(ALIAS_KEY, query=query), location_key(UNKNOWN_KEY, query=query)
+    cache = get_weather_cache()
+    found = cache.get_many([alias_key, unknown_key])
+    if unknown_key in found:
+        raise NoLocationFoundException("No Location Found!")
+    location_id = found.get(alias_key)
+    if location_id is None:
+        location_id = _get_alias(query)
+        cache.set(alias_key, location_id, timeout=settings.WEATHER_ALIAS_CACHE_TTL)
+    return location_id or None
+
+
+async def aresolve_location(query: str) -> int | None:
+    """Async variant of `resolve_location`."""
+    query = normalize_location(query)
+    alias_key, unknown_key = location_key(ALIAS_KEY, query=query), location_key(UNKNOWN_KEY, query=query)
+    cache = get_weather_cache()
+    found = await cache.aget_many([alias_key, unknown_key])
+    if unknown_key in found:
+        raise NoLocationFoundException("No Location Found!")
+    location_id = found.get(alias_key)
+    if location_id is None:
+        location_id = await sync_to_async(_get_alias)(query)
+        await cache.aset(alias_key, location_id, timeout=settings.WEATHER_ALIAS_CACHE_TTL)
+    return location_id or None
+
+
+def resolve_locations(queries) -> tuple[dict, set]:
+    """
+    `resolve_location` for many normalized queries in one cache round trip and at most
+    one query: `({query: location id or None}, {unknown queries})`.
+    """
+    keys = {
+        query: (location_key(ALIAS_KEY, query=query), location_key(UNKNOWN_KEY, query=query)) for query in queries
+    }
+    cache = get_weather_cache()
+    found = cache.get_many([key for pair in keys.values() for key in pair])
+    unknown = {query for query, (_, unknown_key) in keys.items() if unknown_key in found}
+    resolved = {
+        query: found[alias_key] for query, (alias_key, _) in keys.items()
+        if query not in unknown and alias_key in found
+    }
+    missing = [query for query in keys if query not in unknown and query not in resolved]
+    if missing:
+        aliases = _get_aliases(missing)
+        looked_up = {query: aliases.get(query) or _get_nearby(query) or UNRESOLVED for query in missing}
+        cache.set_many(
+            {keys[query][0]: location_id for query, location_id in looked_up.items()},
+            timeout=settings.WEATHER_ALIAS_CACHE_TTL,
+        )
+        resolved.update(looked_up)
+    return {query: location_id or None for query, location_id in resolved.items()}, unknown
+
+
+def remember_location_alias(query: str, location: Location):
+    """Record that WeatherAPI resolved `query` to `location`."""
+    query = normalize_location(query)
+    alias_key = location_key(ALIAS_KEY, query=query)
+    cache = get_weather_cache()
+    if cache.get(alias_key) == location.id:
+        return
+    LocationAlias.objects.update_or_create(query=query, defaults={'location': location})
+    cache.set(alias_key, location.id, timeout=settings.WEATHER_ALIAS_CACHE_TTL)
+
+
+async def aremember_location_alias(query: str, location: Location):
+    """Async variant of `remember_location_alias`."""
+    await sync_to_async(remember_location_alias)(query, location)
+
+
+def remember_unknown_location(query: str):
+    """Answer `query` with `NoLocationFoundException` without calling WeatherAPI for a while."""
+    get_weather_cache().set(
+        location_key(UNKNOWN_KEY, query=normalize_location(query)), True, timeout=settings.WEATHER_UNKNOWN_LOCATION_TTL
+    )
+
+
+async def aremember_unknown_location(query: str):
+    """Async variant of `remember_unknown_location`."""
+    await get_weather_cache().aset(
+        location_key(UNKNOWN_KEY, query=normalize_location(query)), True, timeout=settings.WEATHER_UNKNOWN_LOCATION_TTL
+    )
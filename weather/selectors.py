@@ -1,62 +1,474 @@
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils.timezone import now, timedelta
 from django.db import models
+from django.db.models.functions import Cast
 
-from weather.models import LocationWeather
+from weather.alerts import get_alert_rules
+from weather.analytics import load_history, summarize_history
+from weather.archive import aggregate_archived, aggregate_archived_by_location, has_archive, load_archived_history
+from weather.geo import RANGE_END, bounding_box, covering_cells, distance_km
+from weather.history import recent_history
+from weather.models import (
+    DailyWeatherRollup,
+    Forecast,
+    ForecastDay,
+    ForecastHour,
+    HourlyWeatherRollup,
+    LatestWeather,
+    Location,
+    LocationWeather,
+    TrackedLocation,
+)
 
 
-def get_latest_weather_for_location(name):
-    """Fetch the latest weather data for a given location by name."""
-    return LocationWeather.objects.filter(name=name).order_by('-record_timestamp').first()
+def get_location(location_id):
+    """The stored location with this id, or None."""
+    return Location.objects.filter(pk=location_id).first()
 
 
-def get_weather_trends(name, days=1):
-    """Calculate average weather trends (e.g., temperature, humidity) over the last 'days' days."""
+def get_latest_weather_for_location(location_id):
+    """Fetch the latest weather data for a given location by id, from the `LatestWeather` snapshot."""
+    return LatestWeather.objects.select_related('location', 'condition').filter(location_id=location_id).first()
+
+
+async def aget_latest_weather_for_location(location_id):
+    """Async variant of `get_latest_weather_for_location`."""
+    return await LatestWeather.objects.select_related('location', 'condition').filter(
+        location_id=location_id
+    ).afirst()
+
+
+def get_latest_weather(location_ids=None):
+    """Current conditions of every location (or of those in `location_ids`) in one query, by location id."""
+    latest = LatestWeather.objects.select_related('location', 'condition')
+    if location_ids is not None:
+        latest = latest.filter(location_id__in=location_ids)
+    return {weather.location_id: weather for weather in latest}
+
+
+def _in_box(queryset, south, west, north, east, prefix=''):
+    """
+    Filter `queryset` (of locations, or of rows with a `location` when `prefix` is
+    'location__') to a box: prefix ranges of the covering geohash cells select the
+    candidates on the geohash index, the coordinates trim them to the box.
+    """
+    cells = models.Q()
+    for cell in covering_cells(south, west, north, east):
+        cells |= models.Q(**{f'{prefix}geohash__gte': cell, f'{prefix}geohash__lt': cell + RANGE_END})
+    if west <= east:
+        longitude = models.Q(**{f'{prefix}longitude__range': (west, east)})
+    else:
+        # across the antimeridian
+        longitude = models.Q(**{f'{prefix}longitude__gte': west}) | models.Q(**{f'{prefix}longitude__lte': east})
+    return queryset.filter(cells, longitude, **{f'{prefix}latitude__range': (south, north)})
+
+
+def get_latest_weather_in_box(south, west, north, east, limit=None):
+    """Current conditions of the stored locations inside a box (e.g. a map view) in one query."""
+    # unordered: ordering by geohash has SQLite walk the whole index instead of the cell ranges
+    latest = _in_box(
+        LatestWeather.objects.select_related('location', 'condition'), south, west, north, east, prefix='location__'
+    )
+    return list(latest[:limit] if limit else latest)
+
+
+def get_nearest_latest_weather(latitude, longitude, km):
+    """(current conditions, distance in km) of the stored location nearest to a point within `km`, or None."""
+    nearest = None
+    for weather in _in_box(
+        LatestWeather.objects.select_related('location', 'condition'), *bounding_box(latitude, longitude, km),
+        prefix='location__',
+    ):
+        distance = distance_km(latitude, longitude, weather.location.latitude, weather.location.longitude)
+        if distance <= km and (nearest is None or distance < nearest[1]):
+            nearest = weather, distance
+    return nearest
+
+
+def get_nearest_location_id(latitude, longitude, km):
+    """Id of the stored location nearest to a point within `km`, or None."""
+    nearest = None
+    rows = _in_box(Location.objects.all(), *bounding_box(latitude, longitude, km)).values_list(
+        'id', 'latitude', 'longitude'
+    )
+    for location_id, location_latitude, location_longitude in rows:
+        distance = distance_km(latitude, longitude, location_latitude, location_longitude)
+        if distance <= km and (nearest is None or distance < nearest[1]):
+            nearest = location_id, distance
+    return nearest and nearest[0]
+
+
+# model field -> suffix used in the trend keys (e.g. `average_wind`)
+TREND_FIELDS = {
+    'temperature': 'temperature',
+    'wind_speed': 'wind',
+    'pressure': 'pressure',
+    'precipitation': 'precipitation',
+    'humidity': 'humidity',
+    'dewpoint': 'dewpoint',
+}
+ROLLUP_FIELDS = tuple(TREND_FIELDS)
+
+
+def _location_filter(location_id):
+    """Lookup of one location by id, or of several when `location_id` is a list of ids."""
+    return {'location_id': location_id} if isinstance(location_id, int) else {'location_id__in': location_id}
+
+
+def _get_trends_queryset(location_id, days):
+    days = settings.WEATHER_TRENDS_WINDOW_DAYS if days is None else days
     end_time = now()
     start_time = end_time - timedelta(days=days)
-    
-    weather_data = LocationWeather.objects.filter(
-        name=name,
+    # served by the (location, record_timestamp) unique index
+    return LocationWeather.objects.filter(
+        **_location_filter(location_id),
         record_timestamp__range=[start_time, end_time]
+    ), days
+
+
+def _get_trends_aggregates():
+    aggregates = {'count': models.Count('id')}
+    for field in TREND_FIELDS:
+        aggregates[f'{field}__avg'] = models.Avg(field)
+        aggregates[f'{field}__min'] = models.Min(field)
+        aggregates[f'{field}__max'] = models.Max(field)
+    return aggregates
+
+
+def _format_trends(aggregates, days, latest):
+    trends = {'count': aggregates['count'], 'window_hours': round(days * 24, 2)}
+    for field, suffix in TREND_FIELDS.items():
+        average = aggregates[f'{field}__avg']
+        trends[f'average_{suffix}'] = round(average, 2)
+        trends[f'min_{suffix}'] = round(aggregates[f'{field}__min'], 2)
+        trends[f'max_{suffix}'] = round(aggregates[f'{field}__max'], 2)
+        # how far the latest reading is from the window average
+        trends[f'{suffix}_delta'] = round(float(getattr(latest, field)) - float(average), 2) if latest else None
+    return trends
+
+
+def _get_rollup_queryset(location_id, days):
+    """
+    Rollups of the smallest grain that keeps the window O(buckets): hourly up to
+    WEATHER_ROLLUP_HOURLY_MAX_DAYS, daily beyond. The window is widened to whole buckets.
+    """
+    days = settings.WEATHER_TRENDS_WINDOW_DAYS if days is None else days
+    start_time = now() - timedelta(days=days)
+    if days <= settings.WEATHER_ROLLUP_HOURLY_MAX_DAYS:
+        model, bucket_start = HourlyWeatherRollup, start_time.replace(minute=0, second=0, microsecond=0)
+    else:
+        model, bucket_start = DailyWeatherRollup, start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    return model.objects.filter(**_location_filter(location_id), bucket_start__gte=bucket_start), days
+
+
+def _get_rollup_trends_aggregates():
+    aggregates = {'count': models.Sum('count')}
+    for field in ROLLUP_FIELDS:
+        aggregates[f'{field}__sum'] = models.Sum(f'{field}_sum')
+        aggregates[f'{field}__min'] = models.Min(f'{field}_min')
+        aggregates[f'{field}__max'] = models.Max(f'{field}_max')
+    return aggregates
+
+
+def _add_rollup_averages(aggregates):
+    if aggregates['count']:
+        for field in ROLLUP_FIELDS:
+            aggregates[f'{field}__avg'] = aggregates[f'{field}__sum'] / aggregates['count']
+    return aggregates
+
+
+def _merge_archived_aggregates(aggregates, archived):
+    """Fold `aggregate_archived` output into raw-reading trend aggregates, in place."""
+    count = aggregates['count'] + archived['count']
+    for field in TREND_FIELDS:
+        stored = aggregates['count'] and float(aggregates[f'{field}__avg']) * aggregates['count']
+        aggregates[f'{field}__avg'] = (stored + archived[f'{field}__sum']) / count
+        for suffix, pick in (('min', min), ('max', max)):
+            values = [aggregates[f'{field}__{suffix}'], archived[f'{field}__{suffix}']]
+            aggregates[f'{field}__{suffix}'] = pick(float(value) for value in values if value is not None)
+    aggregates['count'] = count
+    return aggregates
+
+
+def _add_archived_aggregates(aggregates, location_id, days):
+    """Fold the archived readings of the window (see `weather.archive`) into raw-reading trend aggregates."""
+    since = now() - timedelta(days=days)
+    if not has_archive(since):
+        return aggregates
+    archived = aggregate_archived([location_id], since, fields=TREND_FIELDS)
+    if not archived['count']:
+        return aggregates
+    return _merge_archived_aggregates(aggregates, archived)
+
+
+def _add_archived_aggregates_by_location(rows, location_ids, days):
+    """
+    `_add_archived_aggregates` of the grouped rows of many locations, by location id, with
+    one pass over the window's segments. Locations whose readings in the window are all
+    archived get a row too.
+    """
+    since = now() - timedelta(days=days)
+    if not has_archive(since):
+        return rows
+    archived = aggregate_archived_by_location(location_ids, since, fields=TREND_FIELDS)
+    for location_id, aggregates in archived.items():
+        if location_id not in rows:
+            rows[location_id] = {
+                'location_id': location_id, **{key: None for key in _get_trends_aggregates()}, 'count': 0
+            }
+        _merge_archived_aggregates(rows[location_id], aggregates)
+    return rows
+
+
+def _get_recent_history_aggregates(location_id, days):
+    """Trend aggregates from the in-process history, or None when it is off or does not cover the window."""
+    if not settings.WEATHER_HISTORY_STORE:
+        return None
+    return recent_history.aggregate(location_id, now() - timedelta(days=days))
+
+
+def get_weather_trends(location_id, days=None, latest=None):
+    """
+    Calculate weather trends (average, min, max and latest-vs-average delta of temperature,
+    wind, pressure, precipitation, humidity and dewpoint) over the last `days` days, in a
+    single aggregate query. `days` defaults to WEATHER_TRENDS_WINDOW_DAYS.
+
+    Windows covered by the in-process recent history (WEATHER_HISTORY_STORE) are computed
+    without a query. Otherwise reads the hourly/daily rollups when WEATHER_TRENDS_FROM_ROLLUPS
+    is set, or aggregates the raw readings.
+    """
+    days = settings.WEATHER_TRENDS_WINDOW_DAYS if days is None else days
+    aggregates = _get_recent_history_aggregates(location_id, days)
+    if aggregates is not None:
+        latest = latest or recent_history.latest(location_id)
+    elif settings.WEATHER_TRENDS_FROM_ROLLUPS:
+        rollups, days = _get_rollup_queryset(location_id, days)
+        aggregates = _add_rollup_averages(rollups.aggregate(**_get_rollup_trends_aggregates()))
+    else:
+        weather_data, days = _get_trends_queryset(location_id, days)
+        aggregates = _add_archived_aggregates(weather_data.aggregate(**_get_trends_aggregates()), location_id, days)
+    if not aggregates['count']:
+        return None
+    return _format_trends(aggregates, days, latest or get_latest_weather_for_location(location_id))
+
+
+async def aget_weather_trends(location_id, days=None, latest=None):
+    """Async variant of `get_weather_trends`."""
+    days = settings.WEATHER_TRENDS_WINDOW_DAYS if days is None else days
+    aggregates = None
+    if settings.WEATHER_HISTORY_STORE:
+        aggregates = await sync_to_async(_get_recent_history_aggregates)(location_id, days)
+    if aggregates is not None:
+        latest = latest or await sync_to_async(recent_history.latest)(location_id)
+    elif settings.WEATHER_TRENDS_FROM_ROLLUPS:
+        rollups, days = _get_rollup_queryset(location_id, days)
+        aggregates = _add_rollup_averages(await rollups.aaggregate(**_get_rollup_trends_aggregates()))
+    else:
+        weather_data, days = _get_trends_queryset(location_id, days)
+        aggregates = await sync_to_async(_add_archived_aggregates)(
+            await weather_data.aaggregate(**_get_trends_aggregates()), location_id, days
+        )
+    if not aggregates['count']:
+        return None
+    return _format_trends(aggregates, days, latest or await aget_latest_weather_for_location(location_id))
+
+
+def get_weather_trends_for_locations(location_ids, days=None, latest=None):
+    """
+    `get_weather_trends` of many locations, by location id, in a single grouped query
+    over the rollups or raw readings. `latest` maps ids to the readings the deltas are
+    taken from; locations without readings in the window are left out.
+    """
+    days = settings.WEATHER_TRENDS_WINDOW_DAYS if days is None else days
+    location_ids = list(location_ids)
+    latest = latest or {}
+    if settings.WEATHER_TRENDS_FROM_ROLLUPS:
+        queryset, days = _get_rollup_queryset(location_ids, days)
+        aggregates = _get_rollup_trends_aggregates()
+    else:
+        queryset, days = _get_trends_queryset(location_ids, days)
+        aggregates = _get_trends_aggregates()
+    rows = {row['location_id']: row for row in queryset.values('location_id').annotate(**aggregates).order_by()}
+    if settings.WEATHER_TRENDS_FROM_ROLLUPS:
+        for row in rows.values():
+            _add_rollup_averages(row)
+    else:
+        _add_archived_aggregates_by_location(rows, location_ids, days)
+    return {
+        location_id: _format_trends(row, days, latest.get(location_id))
+        for location_id, row in rows.items() if row['count']
+    }
+
+
+def get_weather_history(location_id, days=None):
+    """Per-bucket average, min and max of each reading over the last `days` days, oldest first."""
+    rollups, _ = _get_rollup_queryset(location_id, days)
+    history = []
+    for rollup in rollups.order_by('bucket_start'):
+        bucket = {'bucket_start': rollup.bucket_start, 'count': rollup.count}
+        for field in ROLLUP_FIELDS:
+            bucket[f'{field}_avg'] = round(getattr(rollup, f'{field}_sum') / rollup.count, 2)
+            bucket[f'{field}_min'] = getattr(rollup, f'{field}_min')
+            bucket[f'{field}_max'] = getattr(rollup, f'{field}_max')
+        history.append(bucket)
+    return history
+
+
+def _add_archived_history(history, location_id, since):
+    """Prepend the archived readings since `since` to a history loaded from the DB."""
+    if not has_archive(since):
+        return history
+    archived = load_archived_history([location_id], since, fields=tuple(field for field in history if field != 'epoch'))
+    if not len(archived['epoch']):
+        return history
+    merged = {field: np.concatenate((archived[field], history[field])) for field in history}
+    if len(history['epoch']) and archived['epoch'][-1] > history['epoch'][0]:
+        # readings stored late for times already archived
+        order = np.argsort(merged['epoch'], kind='stable')
+        merged = {field: values[order] for field, values in merged.items()}
+    return merged
+
+
+def get_weather_analytics(location_id, days=None):
+    """
+    Percentiles, rolling mean, EWMA, daily temperature extremes, heat index, wind chill and
+    rapid changes of a location's readings over the last `days` days (default
+    WEATHER_ANALYTICS_WINDOW_DAYS), or None without readings. See `weather.analytics`.
+    """
+    days = settings.WEATHER_ANALYTICS_WINDOW_DAYS if days is None else days
+    since = now() - timedelta(days=days)
+    history = _add_archived_history(load_history(location_id, since), location_id, since)
+    summary = summarize_history(
+        history,
+        rolling_window=settings.WEATHER_ANALYTICS_ROLLING_HOURS * 3600,
+        ewma_halflife=settings.WEATHER_ANALYTICS_EWMA_HALFLIFE_HOURS * 3600,
     )
+    if summary is not None:
+        summary['window_days'] = days
+    return summary
 
-    if weather_data.exists():
-        avg_temp = weather_data.aggregate(models.Avg('temperature'))['temperature__avg']
-        avg_wind = weather_data.aggregate(models.Avg('wind_speed'))['wind_speed__avg']
-        avg_pressure = weather_data.aggregate(models.Avg('pressure'))['pressure__avg']
-        avg_precipitation = weather_data.aggregate(models.Avg('precipitation'))['precipitation__avg']
-        avg_humidity = weather_data.aggregate(models.Avg('humidity'))['humidity__avg']
-        avg_dewpoint = weather_data.aggregate(models.Avg('dewpoint'))['dewpoint__avg']
-        return {
-            'average_temperature': round(avg_temp, 2),
-            'average_wind': round(avg_wind, 2),
-            'average_pressure': round(avg_pressure, 2),
-            'average_precipitation': round(avg_precipitation, 2),
-            'average_humidity': round(avg_humidity, 2),
-            'average_dewpoint': round(avg_dewpoint, 2),
-        }
-    return None
 
+async def aget_weather_analytics(location_id, days=None):
+    """Async variant of `get_weather_analytics`."""
+    return await sync_to_async(get_weather_analytics)(location_id, days)
 
-def check_for_extreme_conditions(weather_data):
-    """Check if the current weather data contains extreme conditions."""
-    extreme_conditions = []
-    
-    if weather_data.temperature > 35 or weather_data.temperature < 0:
-        extreme_conditions.append('Extreme temperature')
-    if weather_data.wind_speed > 100:
-        extreme_conditions.append('High wind speed')
-    if weather_data.humidity > 90:
-        extreme_conditions.append('High humidity')
-    if weather_data.pressure < 980 or weather_data.pressure > 1050:
-        extreme_conditions.append('Extreme pressure')
 
-    return extreme_conditions if extreme_conditions else None
+def check_for_extreme_conditions(weather_data, rules=None):
+    """The names of the alert rules (default: the active ones) a reading breaks, in rule order, or None."""
+    rules = get_alert_rules() if rules is None else rules
+    location = getattr(weather_data, 'location', None)
+    fired = rules.matches(weather_data, country=location.country if location else None)
+    return list(dict.fromkeys(rule.name for rule in fired)) or None
 
 
-def get_weather_alert(weather_data: LocationWeather):
+def get_weather_alert(weather_data: LocationWeather, rules=None):
     """return any alerts for extreme conditions."""
     if weather_data:
-        extreme_conditions = check_for_extreme_conditions(weather_data)
+        extreme_conditions = check_for_extreme_conditions(weather_data, rules)
         if extreme_conditions:
             return f"Alert: {', '.join(extreme_conditions)}"
     return None
+
+
+async def aget_weather_alert(weather_data: LocationWeather):
+    """Async variant of `get_weather_alert`."""
+    return await sync_to_async(get_weather_alert)(weather_data)
+
+
+def get_extreme_locations(rules=None):
+    """
+    Current conditions that break at least one alert rule (default: the active ones), most
+    rules fired first, each annotated with `rules_fired`. A single query over `LatestWeather`.
+    """
+    rules = get_alert_rules() if rules is None else rules
+    return LatestWeather.objects.filter(rules.q()).annotate(
+        rules_fired=rules.fired_count()
+    ).select_related('location', 'condition').order_by('-rules_fired', 'location__name')
+
+
+def evaluate_location_alerts(location_ids=None, rules=None):
+    """
+    Evaluate the alert rules (default: the active ones) in memory against the current
+    conditions of each location in `location_ids` (default: the active tracked locations),
+    loaded as float columns in one query.
+
+    Returns the number of locations evaluated, the total rules fired, how often each rule
+    name fired, and the rules fired per alerting location id.
+    """
+    rules = get_alert_rules() if rules is None else rules
+    if location_ids is None:
+        location_ids = TrackedLocation.objects.filter(is_active=True).values('location_id')
+    rows = LatestWeather.objects.filter(location_id__in=location_ids).values_list(
+        'location_id', 'location__country', *(Cast(field, models.FloatField()) for field in rules.fields)
+    )
+    rows = list(rows)
+    values = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(rules.fields))
+    masks = rules.masks(
+        {field: values[:, column] for column, field in enumerate(rules.fields)},
+        countries=[row[1] for row in rows],
+    )
+    by_rule = {}
+    for rule, count in zip(rules.rules, masks.sum(axis=1)):
+        by_rule[rule.name] = by_rule.get(rule.name, 0) + int(count)
+    fired = masks.sum(axis=0)
+    return {
+        'locations': len(rows),
+        'rules_fired': int(fired.sum()),
+        'by_rule': by_rule,
+        'alerting': {rows[index][0]: int(fired[index]) for index in np.flatnonzero(fired)},
+    }
+
+
+def get_due_tracked_locations(due_by=None):
+    """Active tracked locations due for a refresh, most important first."""
+    return TrackedLocation.objects.select_related('location').filter(
+        is_active=True, next_refresh_on__lte=due_by or now()
+    ).order_by('-priority', '-request_count', 'next_refresh_on')
+
+
+def get_location_forecast(location_id):
+    """The stored forecast issue for a location by id, fresh or not."""
+    return Forecast.objects.select_related('location').filter(location_id=location_id).first()
+
+
+async def aget_location_forecast(location_id):
+    """Async variant of `get_location_forecast`."""
+    return await Forecast.objects.select_related('location').filter(location_id=location_id).afirst()
+
+
+def is_forecast_fresh(forecast: Forecast, days) -> bool:
+    return forecast.expires_on > now() and forecast.days >= days
+
+
+def _get_forecast_days_queryset(forecast: Forecast, days):
+    return ForecastDay.objects.select_related('condition').filter(
+        location_id=forecast.location_id
+    ).order_by('date')[:days]
+
+
+def _get_forecast_hours_queryset(forecast: Forecast, hours):
+    # keep the hour in progress
+    start_time = now() - timedelta(hours=1)
+    return ForecastHour.objects.select_related('condition').filter(
+        location_id=forecast.location_id, forecast_timestamp__gt=start_time
+    ).order_by('forecast_timestamp')[:hours]
+
+
+def get_forecast(forecast: Forecast, days=None, hours=24):
+    """Stored daily forecast (first `days` days) and the next `hours` hourly entries of an issue."""
+    days = forecast.days if days is None else days
+    return {
+        'days': list(_get_forecast_days_queryset(forecast, days)),
+        'hours': list(_get_forecast_hours_queryset(forecast, hours)),
+    }
+
+
+async def aget_forecast(forecast: Forecast, days=None, hours=24):
+    """Async variant of `get_forecast`."""
+    days = forecast.days if days is None else days
+    return {
+        'days': [day async for day in _get_forecast_days_queryset(forecast, days)],
+        'hours': [hour async for hour in _get_forecast_hours_queryset(forecast, hours)],
+    }
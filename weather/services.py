@@ -1,8 +1,162 @@
-from dataclasses import asdict
-from datetime import datetime
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
 
-from services.weatherapi import get_weather_data_via_api, LocationWeatherData
-from weather.models import LocationWeather
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.models import Count, F, FloatField, Max, Min, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils.timezone import now
+
+from services.weatherapi import (
+    aget_weather_data_via_api,
+    aget_weather_forecast_data_via_api,
+    get_weather_data_via_api,
+    get_weather_forecast_data_via_api,
+    CircuitOpenError,
+    LocationForecastData,
+    LocationWeatherData,
+    NoLocationFoundException,
+    RateLimitedError,
+    WeatherAPIError,
+    get_quota_limiter,
+)
+from services.ratelimit import Priority, get_upstream_priority, upstream_priority
+from weather.archive import aggregate_archived, has_archive
+from weather.autocomplete import location_label, location_suggestions
+from weather.cache import (
+    aget_cached_weather,
+    apeek_cached_weather,
+    aset_cached_weather,
+    get_cached_weather,
+    get_weather_cache,
+    is_reading_fresh,
+    normalize_location,
+    peek_cached_weather,
+    set_cached_weather,
+)
+from weather.geo import location_geohash
+from weather.history import recent_history
+from weather.models import (
+    DailyWeatherRollup,
+    Forecast,
+    ForecastDay,
+    ForecastHour,
+    HourlyWeatherRollup,
+    LatestWeather,
+    Location,
+    LocationWeather,
+    RollupWatermark,
+    TrackedLocation,
+    WeatherCondition,
+)
+from weather.resolver import (
+    aremember_location_alias,
+    aremember_unknown_location,
+    aresolve_location,
+    remember_location_alias,
+    remember_unknown_location,
+    resolve_location,
+    resolve_locations,
+)
+from weather.selectors import (
+    ROLLUP_FIELDS,
+    aget_latest_weather_for_location,
+    aget_location_forecast,
+    get_due_tracked_locations,
+    get_latest_weather,
+    get_latest_weather_for_location,
+    get_location_forecast,
+    is_forecast_fresh,
+)
+from weather.singleflight import acache_lock, cache_lock, location_fetches
+
+
+logger = logging.getLogger(__name__)
+
+TRACKING_DEBOUNCE_KEY = "weather:tracked:{location_id}"
+REFRESH_METRICS_KEY = "weather:refresh:metrics"
+# attempts, and seconds between them (growing linearly), at a refresh whose writes hit a locked database
+LOCKED_RETRIES = 3
+LOCKED_RETRY_DELAY = 0.05
+ROLLUP_LOCK_KEY = "weather:lock:rollups"
+ROLLUP_WATERMARK = "locationweather"
+# measurements refreshed when a reading for the same (location, record_timestamp) is stored again
+LOCATIONWEATHER_UPDATE_FIELDS = [
+    'condition', 'temperature', 'temperature_feels_like', 'wind_speed', 'wind_direction', 'pressure',
+    'precipitation', 'humidity', 'dewpoint', 'uv_index', 'gust_speed', 'visibility',
+]
+LATESTWEATHER_UPDATE_FIELDS = [*LOCATIONWEATHER_UPDATE_FIELDS, 'record_timestamp', 'created_on']
+# values copied from the parsed forecast entries; also refreshed when an entry is stored again
+FORECASTDAY_FIELDS = [
+    'max_temperature', 'min_temperature', 'avg_temperature', 'max_wind_speed', 'total_precipitation',
+    'avg_humidity', 'chance_of_rain', 'chance_of_snow', 'uv_index', 'sunrise', 'sunset',
+]
+FORECASTHOUR_FIELDS = [
+    'temperature', 'temperature_feels_like', 'wind_speed', 'wind_direction', 'pressure', 'precipitation',
+    'humidity', 'chance_of_rain', 'uv_index', 'gust_speed', 'visibility',
+]
+
+# (text, icon) -> WeatherCondition; only committed rows are interned
+_weather_conditions = {}
+
+
+def get_or_create_location(*, name, region, country, latitude, longitude) -> Location:
+    location, created = Location.objects.get_or_create(
+        name=name.lower(), region=region, country=country,
+        defaults={'latitude': latitude, 'longitude': longitude},
+    )
+    if created:
+        transaction.on_commit(lambda: location_suggestions.add(location))
+    return location
+
+
+def get_or_create_weather_condition(*, code, text, icon):
+    """Interned condition row for a text/icon pair, cached per process once committed."""
+    if not text and not icon:
+        return None
+    key = (text, icon)
+    condition = _weather_conditions.get(key)
+    if condition is None:
+        condition, _ = WeatherCondition.objects.get_or_create(text=text, icon=icon, defaults={'code': code})
+        transaction.on_commit(lambda: _weather_conditions.setdefault(key, condition))
+    return condition
+
+
+def _get_or_create_locations(weather_data: list[LocationWeatherData]):
+    """Resolve the locations of many readings with one read, one insert and one re-read."""
+    coordinates = {
+        (data.name.lower(), data.region, data.country): (data.latitude, data.longitude) for data in weather_data
+    }
+
+    def fetch():
+        return {
+            (location.name, location.region, location.country): location
+            for location in Location.objects.filter(name__in={key[0] for key in coordinates})
+        }
+
+    locations = fetch()
+    missing = [key for key in coordinates if key not in locations]
+    if missing:
+        Location.objects.bulk_create(
+            [
+                Location(
+                    name=name, region=region, country=country, latitude=latitude, longitude=longitude,
+                    # bulk_create skips Location.save
+                    geohash=location_geohash(latitude, longitude),
+                )
+                for (name, region, country), (latitude, longitude) in
+                ((key, coordinates[key]) for key in missing)
+            ],
+            ignore_conflicts=True,
+        )
+        locations = fetch()
+    return locations
 
 
 def create_locationweater_entry(
@@ -14,6 +168,7 @@ def create_locationweater_entry(
     longitude,
     condition,
     condition_icon,
+    condition_code=None,
     temperature,
     temperature_feels_like,
     wind_speed,
@@ -27,15 +182,12 @@ def create_locationweater_entry(
     visibility,
     record_timestamp: datetime,
 ) -> LocationWeather:
-    """Create a new weather entry for a specific location."""
-    return LocationWeather.objects.create(
-        name=name.lower(),
-        region=region,
-        country=country,
-        latitude=latitude,
-        longitude=longitude,
-        condition=condition,
-        condition_icon=condition_icon,
+    """Create (or update in place) the weather entry for a location at `record_timestamp`."""
+    entry = LocationWeather(
+        location=get_or_create_location(
+            name=name, region=region, country=country, latitude=latitude, longitude=longitude
+        ),
+        condition=get_or_create_weather_condition(code=condition_code, text=condition, icon=condition_icon),
         temperature=temperature,
         temperature_feels_like=temperature_feels_like,
         wind_speed=wind_speed,
@@ -49,9 +201,792 @@ def create_locationweater_entry(
         visibility=visibility,
         record_timestamp=record_timestamp,
     )
+    return upsert_locationweather_entries([entry])[0]
+
+
+def upsert_locationweather_entries(entries: list[LocationWeather]) -> list[LocationWeather]:
+    """
+    Insert weather entries in a single transaction. An entry for a (location, record_timestamp)
+    that is already stored updates that row instead of adding a duplicate, so re-fetching
+    an unchanged upstream reading is idempotent.
+    """
+    # one statement must not touch the same row twice; keep the last entry per key
+    entries = list({(entry.location_id, entry.record_timestamp): entry for entry in entries}.values())
+    with transaction.atomic():
+        entries = LocationWeather.objects.bulk_create(
+            entries,
+            batch_size=settings.WEATHER_INGEST_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['location', 'record_timestamp'],
+            update_fields=[*LOCATIONWEATHER_UPDATE_FIELDS, 'updated_on'],
+        )
+        update_latest_weather(entries)
+        transaction.on_commit(update_weather_rollups_on_ingest)
+        if settings.WEATHER_HISTORY_STORE:
+            transaction.on_commit(lambda: recent_history.extend(entries))
+    return entries
+
+
+def update_latest_weather(entries: list[LocationWeather]):
+    """
+    Copy the newest of `entries` per location into `LatestWeather` unless a newer reading
+    is already there. Must run in the transaction that stores the entries; the snapshot
+    rows are locked first so concurrent ingests cannot move a location back in time.
+    """
+    newest = {}
+    for entry in entries:
+        if entry.location_id not in newest or entry.record_timestamp > newest[entry.location_id].record_timestamp:
+            newest[entry.location_id] = entry
+    stored = dict(
+        LatestWeather.objects.select_for_update().filter(location_id__in=newest).values_list(
+            'location_id', 'record_timestamp'
+        )
+    )
+    snapshots = [
+        LatestWeather(location=entry.location, **{field: getattr(entry, field) for field in LATESTWEATHER_UPDATE_FIELDS})
+        for location_id, entry in newest.items()
+        if location_id not in stored or entry.record_timestamp >= stored[location_id]
+    ]
+    LatestWeather.objects.bulk_create(
+        snapshots,
+        batch_size=settings.WEATHER_INGEST_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['location'],
+        update_fields=LATESTWEATHER_UPDATE_FIELDS,
+    )
+
+
+def bulk_create_locationweather_entries(weather_data: list[LocationWeatherData]) -> list[LocationWeather]:
+    """Create (or update in place) weather entries for many readings in a single transaction."""
+    with transaction.atomic():
+        locations = _get_or_create_locations(weather_data)
+        return upsert_locationweather_entries([
+            LocationWeather(
+                location=locations[(data.name.lower(), data.region, data.country)],
+                condition=get_or_create_weather_condition(
+                    code=data.condition_code, text=data.condition, icon=data.condition_icon
+                ),
+                temperature=data.temperature,
+                temperature_feels_like=data.temperature_feels_like,
+                wind_speed=data.wind_speed,
+                wind_direction=data.wind_direction,
+                pressure=data.pressure,
+                precipitation=data.precipitation,
+                humidity=data.humidity,
+                dewpoint=data.dewpoint,
+                uv_index=data.uv_index,
+                gust_speed=data.gust_speed,
+                visibility=data.visibility,
+                record_timestamp=data.record_timestamp,
+            )
+            for data in weather_data
+        ])
+
+
+async def acreate_locationweater_entry(**fields) -> LocationWeather:
+    """Async variant of `create_locationweater_entry`."""
+    return await sync_to_async(create_locationweater_entry)(**fields)
+
+
+def _fetch_key(query, location_id):
+    """Key shared by concurrent fetches of a location: its id once resolved, else the normalized query."""
+    return f"location:{location_id}" if location_id else normalize_location(query)
+
+
+def _location_query(location: Location) -> str:
+    """What to ask WeatherAPI for a stored location; its name alone may match another place."""
+    return location_label(location.name, location.region, location.country)
+
+
+def fetch_location_current_weather(query) -> LocationWeather:
+    """
+    Read-through lookup of the current weather for a location.
+
+    Served from the cache while the reading is fresh, then from the latest stored row,
+    and only calls WeatherAPI (and stores a new row) once the stored reading is stale.
+    Concurrent misses for the same location share a single upstream call. Every spelling
+    WeatherAPI resolves to the same place shares one entry (see `weather.resolver`).
+    """
+    location_id = resolve_location(query)
+    weather = get_cached_weather(location_id)
+    if weather is not None:
+        return weather
+    if settings.WEATHER_BACKGROUND_REFRESH and location_id is not None:
+        # the refresh worker keeps stored readings fresh; only unseen locations go upstream
+        weather = get_latest_weather_for_location(location_id)
+        if weather is not None:
+            return weather
+    return refresh_location_weather(query, location_id)
+
+
+def refresh_location_weather(query, location_id=None) -> LocationWeather:
+    """
+    Bring the stored reading for a location (`location_id`, or whatever WeatherAPI resolves
+    `query` to while unknown) up to date, sharing any in-flight fetch for it.
+    """
+    return location_fetches.do(
+        _fetch_key(query, location_id), lambda: _refresh_location_weather(query, location_id)
+    )
+
+
+def _refresh_location_weather(query, location_id) -> LocationWeather:
+    stored = weather = get_latest_weather_for_location(location_id) if location_id else None
+    if weather is None or not is_reading_fresh(weather):
+        with cache_lock(_fetch_key(query, location_id)) as acquired:
+            if not acquired:
+                # another worker held the lock and has most likely resolved and cached the location
+                location_id = location_id or resolve_location(query)
+            weather = None if acquired else peek_cached_weather(location_id)
+            if weather is None:
+                try:
+                    weather_data: LocationWeatherData = get_weather_data_via_api(location=query)
+                except NoLocationFoundException:
+                    remember_unknown_location(query)
+                    raise
+                except WeatherAPIError:
+                    if stored is None or not _serves_stale():
+                        raise
+                    return serve_stale_weather(stored)
+                weather = create_locationweater_entry(**asdict(weather_data))
+                remember_location_alias(query, weather.location)
+    set_cached_weather(weather)
+    return weather
+
+
+# locations with a revalidation queued or running, and the pool running them
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+_revalidation_executor = None
+
+
+def _serves_stale():
+    """Only page views fall back to stored data; background work must see the failure to retry it."""
+    return get_upstream_priority() == Priority.INTERACTIVE
+
+
+def serve_stale_weather(weather: LocationWeather) -> LocationWeather:
+    """
+    Mark a stored reading `is_stale` to serve it while WeatherAPI is failing, and queue a
+    background refresh of its location. The reading is not cached, so the next request
+    retries upstream unless the circuit breaker is open.
+    """
+    weather.is_stale = True
+    schedule_revalidation(weather.location)
+    return weather
+
+
+def schedule_revalidation(location: Location) -> bool:
+    """Refresh a location in the background unless a refresh of it is already queued."""
+    global _revalidation_executor
+    with _revalidating_lock:
+        if location.id in _revalidating:
+            return False
+        _revalidating.add(location.id)
+        if _revalidation_executor is None:
+            _revalidation_executor = ThreadPoolExecutor(
+                max_workers=settings.WEATHER_REVALIDATE_CONCURRENCY, thread_name_prefix="weather-revalidate"
+            )
+    _revalidation_executor.submit(_revalidate_location_weather, location)
+    return True
+
+
+def _revalidate_location_weather(location: Location):
+    try:
+        with upstream_priority(Priority.BACKGROUND):
+            refresh_location_weather(_location_query(location), location.id)
+        logger.info(f"Revalidated weather for {location}")
+    except WeatherAPIError as error:
+        logger.info(f"Weather for {location} not revalidated: {error}")
+    except Exception:
+        logger.exception(f"Failed to revalidate weather for {location}")
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(location.id)
+        close_old_connections()
+
+
+async def afetch_location_current_weather(query) -> LocationWeather:
+    """Async variant of `fetch_location_current_weather`."""
+    location_id = await aresolve_location(query)
+    weather = await aget_cached_weather(location_id)
+    if weather is not None:
+        return weather
+    if settings.WEATHER_BACKGROUND_REFRESH and location_id is not None:
+        weather = await aget_latest_weather_for_location(location_id)
+        if weather is not None:
+            return weather
+    return await location_fetches.ado(
+        _fetch_key(query, location_id), lambda: _arefresh_location_weather(query, location_id)
+    )
+
+
+async def _arefresh_location_weather(query, location_id) -> LocationWeather:
+    stored = weather = await aget_latest_weather_for_location(location_id) if location_id else None
+    if weather is None or not is_reading_fresh(weather):
+        async with acache_lock(_fetch_key(query, location_id)) as acquired:
+            if not acquired:
+                location_id = location_id or await aresolve_location(query)
+            weather = None if acquired else await apeek_cached_weather(location_id)
+            if weather is None:
+                try:
+                    weather_data: LocationWeatherData = await aget_weather_data_via_api(location=query)
+                except NoLocationFoundException:
+                    await aremember_unknown_location(query)
+                    raise
+                except WeatherAPIError:
+                    if stored is None or not _serves_stale():
+                        raise
+                    return serve_stale_weather(stored)
+                weather = await acreate_locationweater_entry(**asdict(weather_data))
+                await aremember_location_alias(query, weather.location)
+    await aset_cached_weather(weather)
+    return weather
+
+
+def _refresh_for_comparison(query, location_id):
+    try:
+        return refresh_location_weather(query, location_id)
+    finally:
+        close_old_connections()
+
+
+def fetch_locations_current_weather(names, *, concurrency=None):
+    """
+    Current weather for many locations, as `({name: weather}, {name: error})` keyed by
+    normalized name.
+
+    Stored readings come from one `LatestWeather` query; only locations whose reading is
+    missing or stale (or, with WEATHER_BACKGROUND_REFRESH, missing) go to WeatherAPI,
+    with at most `concurrency` calls in flight, each through `refresh_location_weather`
+    so they share in-flight fetches and the cache with page views.
+    """
+    concurrency = settings.WEATHER_COMPARE_CONCURRENCY if concurrency is None else concurrency
+    names = list(dict.fromkeys(normalize_location(name) for name in names))
+    resolved, unknown = resolve_locations(names)
+    errors = {name: NoLocationFoundException("No Location Found!") for name in unknown}
+    latest = get_latest_weather({location_id for location_id in resolved.values() if location_id})
+    weather = {
+        name: latest[location_id] for name, location_id in resolved.items()
+        if location_id in latest and (settings.WEATHER_BACKGROUND_REFRESH or is_reading_fresh(latest[location_id]))
+    }
+    stale = [name for name in resolved if name not in weather]
+    if stale:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(_refresh_for_comparison, name, resolved[name]): name for name in stale}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    weather[name] = future.result()
+                except Exception as error:
+                    if not isinstance(error, NoLocationFoundException):
+                        logger.exception(f"Failed to refresh weather for {name}")
+                    errors[name] = error
+    return {name: weather[name] for name in names if name in weather}, errors
+
+
+def store_location_forecast(location: Location, forecast_data: LocationForecastData, days) -> Forecast:
+    """
+    Replace the stored forecast of a location with a new issue in one transaction.
+
+    Days and hours are upserted in place on (location, date) and (location, forecast_timestamp),
+    and entries the new issue no longer covers are dropped, so each location keeps exactly
+    one issue's worth of rows.
+    """
+    def condition(data):
+        return get_or_create_weather_condition(code=data.condition_code, text=data.condition, icon=data.condition_icon)
+
+    forecast_days = [
+        ForecastDay(
+            location=location, date=data.date, condition=condition(data),
+            **{field: getattr(data, field) for field in FORECASTDAY_FIELDS},
+        )
+        for data in forecast_data.days
+    ]
+    forecast_hours = [
+        ForecastHour(
+            location=location, forecast_timestamp=data.forecast_timestamp, condition=condition(data),
+            **{field: getattr(data, field) for field in FORECASTHOUR_FIELDS},
+        )
+        for data in forecast_data.hours
+    ]
+    with transaction.atomic():
+        if forecast_days:
+            ForecastDay.objects.filter(location=location).exclude(
+                date__range=[forecast_days[0].date, forecast_days[-1].date]
+            ).delete()
+            ForecastDay.objects.bulk_create(
+                forecast_days, update_conflicts=True, unique_fields=['location', 'date'],
+                update_fields=['condition', *FORECASTDAY_FIELDS],
+            )
+        if forecast_hours:
+            ForecastHour.objects.filter(location=location).exclude(
+                forecast_timestamp__range=[forecast_hours[0].forecast_timestamp, forecast_hours[-1].forecast_timestamp]
+            ).delete()
+            ForecastHour.objects.bulk_create(
+                forecast_hours, update_conflicts=True, unique_fields=['location', 'forecast_timestamp'],
+                update_fields=['condition', *FORECASTHOUR_FIELDS],
+            )
+        forecast, _ = Forecast.objects.update_or_create(
+            location=location,
+            defaults={
+                'days': days,
+                'issued_on': forecast_data.current.record_timestamp,
+                'expires_on': now() + timedelta(seconds=settings.WEATHER_FORECAST_TTL),
+            },
+        )
+    return forecast
+
+
+def fetch_location_forecast(query, days=None) -> Forecast:
+    """
+    Read-through lookup of the forecast issue for a location.
+
+    The stored issue is reused until it expires (WEATHER_FORECAST_TTL) or covers fewer
+    than `days` days; only then is WeatherAPI called, once for every concurrent caller.
+    """
+    days = days or settings.WEATHER_FORECAST_DAYS
+    location_id = resolve_location(query)
+    forecast = get_location_forecast(location_id) if location_id else None
+    if forecast is not None and (is_forecast_fresh(forecast, days) or settings.WEATHER_BACKGROUND_REFRESH):
+        return forecast
+    return refresh_location_forecast(query, location_id, days)
+
+
+def refresh_location_forecast(query, location_id, days) -> Forecast:
+    """Fetch and store a new forecast issue, sharing any in-flight fetch for the location."""
+    key = f"forecast:{_fetch_key(query, location_id)}"
+    return location_fetches.do(key, lambda: _refresh_location_forecast(query, location_id, days))
+
+
+def _refresh_location_forecast(query, location_id, days) -> Forecast:
+    stored = forecast = get_location_forecast(location_id) if location_id else None
+    if forecast is None or not is_forecast_fresh(forecast, days):
+        with cache_lock(f"forecast:{_fetch_key(query, location_id)}") as acquired:
+            if not acquired:
+                # another worker held the lock and has most likely stored a new issue
+                location_id = location_id or resolve_location(query)
+            forecast = None if acquired or location_id is None else get_location_forecast(location_id)
+            if forecast is None or not is_forecast_fresh(forecast, days):
+                try:
+                    forecast_data: LocationForecastData = get_weather_forecast_data_via_api(location=query, days=days)
+                except NoLocationFoundException:
+                    remember_unknown_location(query)
+                    raise
+                except WeatherAPIError:
+                    # an expired issue beats no forecast while WeatherAPI is failing
+                    if stored is None or not _serves_stale():
+                        raise
+                    return stored
+                # the forecast response carries the current conditions too
+                weather = create_locationweater_entry(**asdict(forecast_data.current))
+                forecast = store_location_forecast(weather.location, forecast_data, days)
+                remember_location_alias(query, weather.location)
+                set_cached_weather(weather)
+    return forecast
+
+
+async def afetch_location_forecast(query, days=None) -> Forecast:
+    """Async variant of `fetch_location_forecast`."""
+    days = days or settings.WEATHER_FORECAST_DAYS
+    location_id = await aresolve_location(query)
+    forecast = await aget_location_forecast(location_id) if location_id else None
+    if forecast is not None and (is_forecast_fresh(forecast, days) or settings.WEATHER_BACKGROUND_REFRESH):
+        return forecast
+    key = f"forecast:{_fetch_key(query, location_id)}"
+    return await location_fetches.ado(key, lambda: _arefresh_location_forecast(query, location_id, days))
+
+
+async def _arefresh_location_forecast(query, location_id, days) -> Forecast:
+    stored = forecast = await aget_location_forecast(location_id) if location_id else None
+    if forecast is None or not is_forecast_fresh(forecast, days):
+        async with acache_lock(f"forecast:{_fetch_key(query, location_id)}") as acquired:
+            if not acquired:
+                location_id = location_id or await aresolve_location(query)
+            forecast = None if acquired or location_id is None else await aget_location_forecast(location_id)
+            if forecast is None or not is_forecast_fresh(forecast, days):
+                try:
+                    forecast_data: LocationForecastData = await aget_weather_forecast_data_via_api(
+                        location=query, days=days
+                    )
+                except NoLocationFoundException:
+                    await aremember_unknown_location(query)
+                    raise
+                except WeatherAPIError:
+                    if stored is None or not _serves_stale():
+                        raise
+                    return stored
+                weather = await acreate_locationweater_entry(**asdict(forecast_data.current))
+                forecast = await sync_to_async(store_location_forecast)(weather.location, forecast_data, days)
+                await aremember_location_alias(query, weather.location)
+                await aset_cached_weather(weather)
+    return forecast
+
+
+def track_location_request(location_id):
+    """
+    Record a page view for a location so the refresh worker keeps it fresh.
+
+    Writes at most once per WEATHER_TRACKING_DEBOUNCE seconds per location so popular
+    locations do not turn every page view into a DB write.
+    """
+    debounce_key = TRACKING_DEBOUNCE_KEY.format(location_id=location_id)
+    if not get_weather_cache().add(debounce_key, 1, settings.WEATHER_TRACKING_DEBOUNCE):
+        return
+    current_time = now()
+    updated = TrackedLocation.objects.filter(location_id=location_id).update(
+        request_count=F('request_count') + 1, last_requested_on=current_time, is_active=True
+    )
+    if not updated:
+        TrackedLocation.objects.get_or_create(
+            location_id=location_id,
+            defaults={
+                'request_count': 1,
+                'last_requested_on': current_time,
+                'refresh_interval': settings.WEATHER_REFRESH_INTERVAL,
+                'next_refresh_on': current_time + timedelta(seconds=settings.WEATHER_REFRESH_INTERVAL),
+            },
+        )
+
+
+async def atrack_location_request(location_id):
+    """Async variant of `track_location_request`."""
+    await sync_to_async(track_location_request)(location_id)
+
+
+def expire_tracked_locations() -> int:
+    """Stop refreshing locations nobody has requested within WEATHER_TRACKING_EXPIRY seconds."""
+    cutoff = now() - timedelta(seconds=settings.WEATHER_TRACKING_EXPIRY)
+    return TrackedLocation.objects.filter(is_active=True, last_requested_on__lt=cutoff).update(is_active=False)
+
+
+def _is_lock_error(error):
+    """SQLite refusing a write while another connection holds the lock ("database is locked")."""
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+def _refresh_tracked_location_weather(location: Location):
+    """Refresh one location, retrying writes another worker's transaction briefly kept locked."""
+    for attempt in range(LOCKED_RETRIES + 1):
+        try:
+            with upstream_priority(Priority.BACKGROUND):
+                forecast = get_location_forecast(location.id)
+                if forecast is not None and not is_forecast_fresh(forecast, forecast.days):
+                    # one forecast call refreshes both the forecast and the current reading
+                    refresh_location_forecast(_location_query(location), location.id, forecast.days)
+                else:
+                    refresh_location_weather(_location_query(location), location.id)
+            return
+        except OperationalError as error:
+            if not _is_lock_error(error) or attempt == LOCKED_RETRIES:
+                raise
+            time.sleep(LOCKED_RETRY_DELAY * (attempt + 1))
+
+
+def _refresh_tracked_location(tracked: TrackedLocation, jitter):
+    """
+    Refresh one tracked location at background priority; returns "refreshed", "failed",
+    "rate_limited" or "locked" (the DB stayed locked through the retries).
+    """
+    try:
+        _refresh_tracked_location_weather(tracked.location)
+    except NoLocationFoundException:
+        TrackedLocation.objects.filter(pk=tracked.pk).update(is_active=False)
+        return "failed"
+    except Exception as error:
+        rate_limited, locked = isinstance(error, RateLimitedError), _is_lock_error(error)
+        if not (rate_limited or locked):
+            logger.exception(f"Failed to refresh weather for {tracked.location}")
+        # retry on the next cycle after a short back-off instead of a full interval
+        try:
+            TrackedLocation.objects.filter(pk=tracked.pk).update(
+                next_refresh_on=now() + timedelta(seconds=random.uniform(0, jitter) + 60)
+            )
+        except OperationalError as update_error:
+            if not _is_lock_error(update_error):
+                raise
+            # still due, so the next cycle picks it up anyway
+        return "rate_limited" if rate_limited else "locked" if locked else "failed"
+    else:
+        refreshed_on = now()
+        TrackedLocation.objects.filter(pk=tracked.pk).update(
+            last_refreshed_on=refreshed_on,
+            next_refresh_on=refreshed_on + timedelta(seconds=tracked.refresh_interval + random.uniform(0, jitter)),
+        )
+        return "refreshed"
+    finally:
+        close_old_connections()
+
+
+def refresh_tracked_locations(*, budget=None, concurrency=None, jitter=None):
+    """
+    Run one refresh cycle: refresh due tracked locations, highest priority and most
+    requested first, with at most `concurrency` upstream calls in flight and at most
+    `budget` upstream calls in total. Returns the cycle metrics.
+    """
+    budget = settings.WEATHER_REFRESH_BUDGET if budget is None else budget
+    concurrency = settings.WEATHER_REFRESH_CONCURRENCY if concurrency is None else concurrency
+    jitter = settings.WEATHER_REFRESH_JITTER if jitter is None else jitter
+
+    started_on = now()
+    expired = expire_tracked_locations()
+    due_locations = get_due_tracked_locations(due_by=started_on)
+    due_count = due_locations.count()
+    due = list(due_locations[:budget])
+    lags = [(started_on - tracked.next_refresh_on).total_seconds() for tracked in due]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda tracked: _refresh_tracked_location(tracked, jitter), due))
+
+    metrics = {
+        'started_on': started_on.isoformat(),
+        'duration': round((now() - started_on).total_seconds(), 3),
+        'due': due_count,
+        'refreshed': results.count('refreshed'),
+        'failed': results.count('failed'),
+        # pushed back a minute because the background share of the WeatherAPI budget was spent
+        'rate_limited': results.count('rate_limited'),
+        # pushed back a minute because another writer kept the (SQLite) database locked
+        'locked': results.count('locked'),
+        'deferred': due_count - len(due),
+        'expired': expired,
+        'max_lag': round(max(lags), 3) if lags else 0,
+        'avg_lag': round(sum(lags) / len(lags), 3) if lags else 0,
+        'quota': get_quota_limiter().metrics(),
+    }
+    get_weather_cache().set(REFRESH_METRICS_KEY, metrics, timeout=None)
+    logger.info(f"Weather refresh cycle: {metrics}")
+    return metrics
+
+
+def get_refresh_metrics():
+    """Metrics of the last refresh cycle (refresh lag is in seconds past `next_refresh_on`)."""
+    return get_weather_cache().get(REFRESH_METRICS_KEY)
+
+
+@dataclass
+class IngestionReport:
+    rows: int = 0
+    upstream_calls: int = 0
+    failures: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def upstream_calls_per_second(self):
+        return self.upstream_calls / self.elapsed if self.elapsed else 0.0
+
+
+def _fetch_for_ingestion(name):
+    """Fetch one location at bulk priority: (reading or None, error or None, whether WeatherAPI was called)."""
+    try:
+        with upstream_priority(Priority.BULK):
+            return get_weather_data_via_api(location=name), None, True
+    except (RateLimitedError, CircuitOpenError) as error:
+        # refused before the call
+        return None, error, False
+    except Exception as error:
+        return None, error, True
+    finally:
+        close_old_connections()
+
+
+def ingest_locations(locations, *, concurrency=None, batch_size=None, on_failure=None) -> IngestionReport:
+    """
+    Fetch current weather for many locations concurrently and store it in batches.
+
+    At most `concurrency` upstream calls are in flight; readings are written with one
+    `bulk_create` transaction per `batch_size` rows. A location that fails (including
+    `NoLocationFoundException`) is recorded in the report and passed to `on_failure`
+    without aborting the rest of the batch. Locations recently answered as unknown and
+    calls refused by the quota limiter or circuit breaker fail without an upstream call,
+    and are not counted in `upstream_calls`.
+    """
+    concurrency = concurrency or settings.WEATHER_INGEST_CONCURRENCY
+    batch_size = batch_size or settings.WEATHER_INGEST_BATCH_SIZE
+    report = IngestionReport()
+    pending = []
+    started = time.perf_counter()
+
+    queries = {location: normalize_location(location) for location in locations}
+    distinct = sorted(set(queries.values()))
+    unknown = set()
+    for start in range(0, len(distinct), batch_size):
+        unknown |= resolve_locations(distinct[start:start + batch_size])[1]
+
+    def fail(location, error):
+        report.failures.append((location, error))
+        if on_failure:
+            on_failure(location, error)
+
+    for location, query in queries.items():
+        if query in unknown:
+            # recently unknown: answered from the negative cache
+            fail(location, NoLocationFoundException("No Location Found!"))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(_fetch_for_ingestion, query): location
+            for location, query in queries.items() if query not in unknown
+        }
+        for future in as_completed(futures):
+            location = futures[future]
+            weather_data, error, called = future.result()
+            report.upstream_calls += called
+            if error is not None:
+                if isinstance(error, NoLocationFoundException):
+                    remember_unknown_location(queries[location])
+                fail(location, error)
+                continue
+            pending.append(weather_data)
+            if len(pending) >= batch_size:
+                report.rows += len(bulk_create_locationweather_entries(pending))
+                pending = []
+    if pending:
+        report.rows += len(bulk_create_locationweather_entries(pending))
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+ROLLUP_VALUE_FIELDS = ['count'] + [
+    f'{name}_{suffix}' for name in ROLLUP_FIELDS for suffix in ('sum', 'min', 'max')
+]
+
+
+def _empty_rollup_values():
+    values = {'count': 0}
+    for name in ROLLUP_FIELDS:
+        values.update({f'{name}_sum': 0, f'{name}_min': None, f'{name}_max': None})
+    return values
+
+
+def _merge_rollup_values(values, delta):
+    values['count'] += delta['count']
+    for name in ROLLUP_FIELDS:
+        values[f'{name}_sum'] += delta[f'{name}_sum']
+        for suffix, pick in (('min', min), ('max', max)):
+            current = values[f'{name}_{suffix}']
+            value = delta[f'{name}_{suffix}']
+            values[f'{name}_{suffix}'] = value if current is None else pick(current, value)
+
+
+def _get_reading_rollup_aggregates():
+    aggregates = {'count': Count('id')}
+    for name in ROLLUP_FIELDS:
+        aggregates[f'{name}_sum'] = Sum(name, output_field=FloatField())
+        aggregates[f'{name}_min'] = Min(name, output_field=FloatField())
+        aggregates[f'{name}_max'] = Max(name, output_field=FloatField())
+    return aggregates
+
+
+def _aggregate_hourly_rollups(keys):
+    """Values of the (location_id, hour) buckets in `keys`, recomputed from the stored and archived readings."""
+    location_ids = {location_id for location_id, _ in keys}
+    buckets = [bucket_start for _, bucket_start in keys]
+    start, end = min(buckets), max(buckets) + timedelta(hours=1)
+    rollups = {}
+    for row in (
+        LocationWeather.objects.filter(
+            location_id__in=location_ids, record_timestamp__gte=start, record_timestamp__lt=end
+        )
+        .values('location_id', bucket=TruncHour('record_timestamp'))
+        .annotate(**_get_reading_rollup_aggregates())
+        .order_by()
+    ):
+        key = (row.pop('location_id'), row.pop('bucket'))
+        if key in keys:
+            rollups[key] = row
+    if has_archive(start, end):
+        # readings of these hours moved to the archive are no longer in the table
+        for location_id, bucket_start in keys:
+            archived = aggregate_archived(
+                [location_id], bucket_start, bucket_start + timedelta(hours=1), fields=ROLLUP_FIELDS
+            )
+            if archived['count']:
+                values = rollups.setdefault((location_id, bucket_start), _empty_rollup_values())
+                _merge_rollup_values(values, {key.replace('__', '_'): value for key, value in archived.items()})
+    return rollups
+
+
+def _aggregate_daily_rollups(keys):
+    """Values of the (location_id, day) buckets in `keys`, recomputed from their hourly rollups."""
+    location_ids = {location_id for location_id, _ in keys}
+    days = [bucket_start for _, bucket_start in keys]
+    hourly = HourlyWeatherRollup.objects.filter(
+        location_id__in=location_ids, bucket_start__gte=min(days), bucket_start__lt=max(days) + timedelta(days=1)
+    ).values('location_id', 'bucket_start', *ROLLUP_VALUE_FIELDS)
+    rollups = {}
+    for row in hourly:
+        key = (row.pop('location_id'), row.pop('bucket_start').replace(hour=0))
+        if key in keys:
+            _merge_rollup_values(rollups.setdefault(key, _empty_rollup_values()), row)
+    return rollups
+
+
+def _store_rollups(model, rollups):
+    """Write {(location_id, bucket_start): values} over the stored buckets with one upsert."""
+    model.objects.bulk_create(
+        [model(location_id=location_id, bucket_start=bucket_start, **values)
+         for (location_id, bucket_start), values in rollups.items()],
+        update_conflicts=True, unique_fields=['location', 'bucket_start'], update_fields=ROLLUP_VALUE_FIELDS,
+    )
+
+
+def update_weather_rollups(batch_size=None) -> int:
+    """
+    Recompute the hourly and daily rollup buckets of the readings stored or rewritten
+    since the rollup high-water mark, `batch_size` readings per transaction. Returns the
+    number of readings scanned.
+
+    Readings are picked up by `updated_on`, which the upsert bumps, so a reading rewritten
+    in place is folded again. Ids and timestamps are not committed in order under
+    concurrent writers, so each run also rescans the WEATHER_ROLLUP_OVERLAP seconds before
+    the mark; touched buckets are recomputed, not incremented, so a reading seen twice
+    is still counted once.
+    """
+    batch_size = batch_size or settings.WEATHER_ROLLUP_BATCH_SIZE
+    mark = RollupWatermark.objects.filter(name=ROLLUP_WATERMARK).values_list('last_updated_on', flat=True).first()
+    after = Q() if mark is None else Q(updated_on__gt=mark - timedelta(seconds=settings.WEATHER_ROLLUP_OVERLAP))
+
+    processed = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=ROLLUP_WATERMARK)
+            rows = list(
+                LocationWeather.objects.filter(after).order_by('updated_on', 'id')
+                .values_list('id', 'updated_on', 'location_id', TruncHour('record_timestamp'))[:batch_size]
+            )
+            if not rows:
+                return processed
+
+            hourly = {(location_id, bucket_start) for _, _, location_id, bucket_start in rows}
+            _store_rollups(HourlyWeatherRollup, _aggregate_hourly_rollups(hourly))
+            # daily buckets are built from the hourly rollups, not from the raw rows again
+            daily = {(location_id, bucket_start.replace(hour=0)) for location_id, bucket_start in hourly}
+            _store_rollups(DailyWeatherRollup, _aggregate_daily_rollups(daily))
 
+            last_id, last_updated_on = rows[-1][:2]
+            after = Q(updated_on__gt=last_updated_on) | Q(updated_on=last_updated_on, id__gt=last_id)
+            if watermark.last_updated_on is None or last_updated_on > watermark.last_updated_on:
+                watermark.last_updated_on = last_updated_on
+                watermark.save(update_fields=['last_updated_on', 'updated_on'])
+            processed += len(rows)
 
 
-def fetch_location_current_weather(name) -> LocationWeather:
-    weather_data: LocationWeatherData = get_weather_data_via_api(location=name)
-    return create_locationweater_entry(**asdict(weather_data))
+def update_weather_rollups_on_ingest():
+    """Catch the rollups up after an ingest unless another worker is already doing it."""
+    if not settings.WEATHER_ROLLUP_ON_INGEST:
+        return
+    cache = get_weather_cache()
+    if not cache.add(ROLLUP_LOCK_KEY, 1, timeout=60):
+        return
+    try:
+        update_weather_rollups()
+    except Exception:
+        # the `rollup_weather` catch-up job will pick these readings up
+        logger.exception("Failed to update weather rollups on ingest")
+    finally:
+        cache.delete(ROLLUP_LOCK_KEY)
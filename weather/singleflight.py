@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+from weather.cache import get_weather_cache, location_key
+
+
+LOCK_KEY = "weather:lock:{key}"
+LOCK_POLL_INTERVAL = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into one in-flight call.
+
+    The first caller for a key runs the function; callers arriving while it is in
+    flight wait for it and receive the same result (or exception). Works for threads
+    via `do` and for asyncio tasks via `ado`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # asyncio tasks are bound to the loop that created them
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, coroutine_fn):
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(coroutine_fn())
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        # a cancelled waiter must not cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls) + sum(len(tasks) for tasks in self._tasks.values())
+
+
+@contextmanager
+def cache_lock(key):
+    """
+    Best-effort lock shared by every worker using the weather cache.
+
+    Yields True when this caller holds the lock. Otherwise waits until the holder
+    releases it (or WEATHER_SINGLEFLIGHT_LOCK_TIMEOUT passes) and yields False, so the
+    caller can re-read what the holder produced. Without
+    WEATHER_SINGLEFLIGHT_DISTRIBUTED it always yields True.
+    """
+    if not settings.WEATHER_SINGLEFLIGHT_DISTRIBUTED:
+        yield True
+        return
+
+    cache = get_weather_cache()
+    lock_key = location_key(LOCK_KEY, key=key)
+    token = uuid.uuid4().hex
+    timeout = settings.WEATHER_SINGLEFLIGHT_LOCK_TIMEOUT
+    if not cache.add(lock_key, token, timeout=timeout):
+        deadline = time.monotonic() + timeout
+        while cache.get(lock_key) is not None and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+@asynccontextmanager
+async def acache_lock(key):
+    """Async variant of `cache_lock`."""
+    if not settings.WEATHER_SINGLEFLIGHT_DISTRIBUTED:
+        yield True
+        return
+
+    cache = get_weather_cache()
+    lock_key = location_key(LOCK_KEY, key=key)
+    token = uuid.uuid4().hex
+    timeout = settings.WEATHER_SINGLEFLIGHT_LOCK_TIMEOUT
+    if not await cache.aadd(lock_key, token, timeout=timeout):
+        deadline = time.monotonic() + timeout
+        while await cache.aget(lock_key) is not None and time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        if await cache.aget(lock_key) == token:
+            await cache.adelete(lock_key)
+
+
+location_fetches = SingleFlight()
@@ -1,3 +1,1361 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+import warnings
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+from urllib3 import HTTPResponse
+from urllib3.exceptions import MaxRetryError
+
+from benchmarks.fake_weatherapi import build_forecast_payload
+from services import decoders
+from services.circuitbreaker import CircuitBreaker
+from services.ratelimit import Priority, QuotaLimiter, upstream_priority
+from services.weatherapi import (
+    FORECAST_HOUR_FIELDS,
+    ForecastDayData,
+    ForecastHourData,
+    LocationForecastData,
+    LocationSearchData,
+    LocationWeatherData,
+    NoLocationFoundException,
+    QuotaRetry,
+    RateLimitedError,
+    WeatherAPIError,
+    get_quota_limiter,
+    get_weather_data_via_api,
+    get_weatherapi_client,
+    parse_forecast,
+)
+from weather import geo
+from weather.alerts import get_alert_rules
+from weather.archive import archive_readings, has_archive
+from weather.export import export_readings
+from weather.autocomplete import PrefixIndex, location_suggestions, suggest_locations
+from weather.cache import (
+    get_cache_stats,
+    get_cached_weather,
+    normalize_location,
+    reset_cache_stats,
+    set_cached_weather,
+)
+from weather.analytics import daily_extremes, ewma, heat_index, rapid_changes, rolling_mean, wind_chill
+from weather.history import RingBuffer, recent_history, warm_recent_history_on_first_request
+from weather.models import (
+    AlertRule,
+    DailyWeatherRollup,
+    ForecastDay,
+    ForecastHour,
+    LatestWeather,
+    Location,
+    LocationAlias,
+    LocationWeather,
+    TrackedLocation,
+    WeatherCondition,
+)
+from weather.selectors import (
+    check_for_extreme_conditions,
+    evaluate_location_alerts,
+    get_extreme_locations,
+    get_forecast,
+    get_latest_weather,
+    get_latest_weather_in_box,
+    get_latest_weather_for_location,
+    get_weather_analytics,
+    get_weather_history,
+    get_weather_trends,
+    get_weather_trends_for_locations,
+)
+from weather.services import (
+    LOCKED_RETRIES,
+    _revalidate_location_weather,
+    _weather_conditions,
+    afetch_location_current_weather,
+    bulk_create_locationweather_entries,
+    create_locationweater_entry,
+    fetch_location_current_weather,
+    fetch_location_forecast,
+    fetch_locations_current_weather,
+    get_or_create_location,
+    ingest_locations,
+    refresh_tracked_locations,
+    track_location_request,
+    update_weather_rollups,
+)
+from weather.singleflight import SingleFlight, cache_lock
+
+
+@contextmanager
+def memcached_safe_keys():
+    """Fail on cache keys memcached would reject; LocMemCache only warns about them."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", CacheKeyWarning)
+        yield
+
+
+def get_location_id(name):
+    return Location.objects.values_list("id", flat=True).get(name=name)
+
+
+def make_weather_data(**kwargs) -> LocationWeatherData:
+    data = dict(
+        name="Warangal",
+        region="Andhra Pradesh",
+        country="India",
+        latitude=18,
+        longitude=79.58,
+        condition="Patchy rain nearby",
+        condition_icon="//cdn.weatherapi.com/weather/64x64/day/176.png",
+        condition_code=1063,
+        temperature=29.1,
+        temperature_feels_like=33.9,
+        wind_speed=15.8,
+        wind_direction="NW",
+        pressure=1003,
+        precipitation=0.53,
+        humidity=75,
+        dewpoint=24.2,
+        uv_index=6,
+        gust_speed=21.6,
+        visibility=9,
+        record_timestamp=now(),
+    )
+    data.update(kwargs)
+    return LocationWeatherData(**data)
+
+
+def make_forecast_data(days=3, **kwargs) -> LocationForecastData:
+    current = make_weather_data(**kwargs)
+    start = current.record_timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    condition = dict(
+        condition="Sunny", condition_icon="//cdn.weatherapi.com/weather/64x64/day/113.png", condition_code=1000
+    )
+    return LocationForecastData(
+        current=current,
+        days=[
+            ForecastDayData(
+                date=(start + timedelta(days=day)).date(), max_temperature=35.9, min_temperature=26.3,
+                avg_temperature=30.7, max_wind_speed=20.5, total_precipitation=0, avg_humidity=53,
+                chance_of_rain=0, chance_of_snow=0, uv_index=8, sunrise="05:44 AM", sunset="08:20 PM", **condition,
+            )
+            for day in range(days)
+        ],
+        hours=[
+            ForecastHourData(
+                forecast_timestamp=start + timedelta(hours=hour), temperature=20 + hour % 10,
+                temperature_feels_like=30.5, wind_speed=15.1, wind_direction="W", pressure=1007, precipitation=0,
+                humidity=58, chance_of_rain=0, uv_index=1, gust_speed=24.1, visibility=10, **condition,
+            )
+            for hour in range(24 * days)
+        ],
+    )
+
+
+class FetchLocationCurrentWeatherTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        patcher = mock.patch("weather.services.get_weather_data_via_api")
+        self.get_weather_data_via_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalize_location(self):
+        self.assertEqual(normalize_location("  New   York "), "new york")
+
+    def test_fresh_reading_is_served_from_cache(self):
+        self.get_weather_data_via_api.return_value = make_weather_data()
+
+        first = fetch_location_current_weather("Warangal")
+        second = fetch_location_current_weather(" warangal ")
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(self.get_weather_data_via_api.call_count, 1)
+        self.assertEqual(LocationWeather.objects.count(), 1)
+        self.assertEqual(get_cache_stats()["hits"], 1)
+        self.assertEqual(get_cache_stats()["misses"], 1)
+
+    def test_multi_word_locations_make_valid_cache_keys(self):
+        weather = create_locationweater_entry(**vars(make_weather_data(name="New York")))
+
+        with memcached_safe_keys():
+            set_cached_weather(weather)
+            self.assertEqual(get_cached_weather(weather.location_id).pk, weather.pk)
+            self.assertEqual(fetch_location_current_weather("new  york").pk, weather.pk)
+
+    def test_fresh_stored_reading_skips_upstream(self):
+        self.get_weather_data_via_api.return_value = make_weather_data()
+        fetch_location_current_weather("warangal")
+        cache.clear()
+
+        fetch_location_current_weather("warangal")
+
+        self.assertEqual(self.get_weather_data_via_api.call_count, 1)
+
+    def test_stale_reading_is_refetched(self):
+        stale = now() - timedelta(hours=1)
+        self.get_weather_data_via_api.return_value = make_weather_data(record_timestamp=stale)
+        fetch_location_current_weather("warangal")
+        LatestWeather.objects.update(created_on=stale)
+        cache.clear()
+        self.get_weather_data_via_api.return_value = make_weather_data()
+
+        fetch_location_current_weather("warangal")
+
+        self.assertEqual(self.get_weather_data_via_api.call_count, 2)
+        self.assertEqual(LocationWeather.objects.count(), 2)
+
+    def test_refetching_same_reading_updates_in_place(self):
+        record_timestamp = now() - timedelta(hours=1)
+        self.get_weather_data_via_api.return_value = make_weather_data(record_timestamp=record_timestamp)
+        first = fetch_location_current_weather("warangal")
+        LatestWeather.objects.update(created_on=record_timestamp)
+        cache.clear()
+        self.get_weather_data_via_api.return_value = make_weather_data(
+            record_timestamp=record_timestamp, temperature=31
+        )
+
+        second = fetch_location_current_weather("warangal")
+
+        self.assertEqual(self.get_weather_data_via_api.call_count, 2)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(LocationWeather.objects.get().temperature, 31)
+
+    @override_settings(WEATHER_BACKGROUND_REFRESH=True)
+    def test_background_refresh_serves_stale_stored_reading(self):
+        stale = now() - timedelta(hours=1)
+        self.get_weather_data_via_api.return_value = make_weather_data(record_timestamp=stale)
+        weather = fetch_location_current_weather("warangal")
+        LatestWeather.objects.update(created_on=stale)
+        cache.clear()
+
+        self.assertEqual(fetch_location_current_weather("warangal").record_timestamp, weather.record_timestamp)
+        self.assertEqual(self.get_weather_data_via_api.call_count, 1)
+
+    def test_stale_reading_is_served_while_upstream_fails(self):
+        stale = now() - timedelta(hours=1)
+        self.get_weather_data_via_api.return_value = make_weather_data(record_timestamp=stale)
+        weather = fetch_location_current_weather("warangal")
+        LatestWeather.objects.update(created_on=stale)
+        cache.clear()
+        self.get_weather_data_via_api.side_effect = WeatherAPIError()
+
+        with mock.patch("weather.services.schedule_revalidation") as schedule_revalidation:
+            served = fetch_location_current_weather("warangal")
+
+        self.assertTrue(served.is_stale)
+        self.assertEqual(served.record_timestamp, weather.record_timestamp)
+        schedule_revalidation.assert_called_once_with(weather.location)
+        self.assertTrue(self.client.get("/api/weather/warangal/current/").json()["current"]["stale"])
+
+        # nothing stored to fall back on
+        with mock.patch("weather.services.get_weather_forecast_data_via_api", side_effect=WeatherAPIError()):
+            response = self.client.post("/", {"location": "delhi"})
+        self.assertContains(response, "Weather service unavailable")
+        self.assertEqual(self.client.get("/api/weather/delhi/current/").status_code, 503)
+
+    def test_home_shows_stale_reading_without_forecast_while_upstream_fails(self):
+        stale = now() - timedelta(hours=1)
+        self.get_weather_data_via_api.return_value = make_weather_data(record_timestamp=stale)
+        fetch_location_current_weather("warangal")
+        LatestWeather.objects.update(created_on=stale)
+        cache.clear()
+        self.get_weather_data_via_api.side_effect = WeatherAPIError()
+
+        with mock.patch("weather.services.get_weather_forecast_data_via_api", side_effect=WeatherAPIError()), \
+                mock.patch("weather.services.schedule_revalidation"):
+            response = self.client.post("/", {"location": "warangal"})
+
+        self.assertContains(response, "showing the last stored reading")
+        self.assertIsNone(response.context["forecast"])
+        self.assertIsNone(response.context["error_message"])
+        self.assertTrue(response.context["latest_weather"].is_stale)
+
+    async def test_async_fetch_shares_cache_with_sync_fetch(self):
+        self.get_weather_data_via_api.return_value = make_weather_data()
+        weather = await sync_to_async(fetch_location_current_weather)("warangal")
+
+        with mock.patch("weather.services.aget_weather_data_via_api") as aget_weather_data_via_api:
+            cached = await afetch_location_current_weather("warangal")
+
+        self.assertEqual(cached.pk, weather.pk)
+        aget_weather_data_via_api.assert_not_called()
+
+
+class LocationResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("weather.services.get_weather_data_via_api", return_value=make_weather_data())
+        self.get_weather_data_via_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_normalize_location_coordinates(self):
+        self.assertEqual(normalize_location(" 18.0012 , 79.5811 "), "18.00,79.58")
+        self.assertEqual(normalize_location("Warangal ,  India"), "warangal, india")
+
+    def test_spellings_of_one_place_share_a_reading(self):
+        with memcached_safe_keys():
+            first = fetch_location_current_weather("Warangal, India")
+            cache.clear()
+
+            for query in ("warangal", " WARANGAL ,india", "18.0012,79.5811"):
+                self.assertEqual(fetch_location_current_weather(query).pk, first.pk)
+
+        # the coordinates are within WEATHER_NEARBY_KM of the stored location, so they reuse it too
+        self.assertEqual(self.get_weather_data_via_api.call_count, 1)
+        self.assertEqual(list(LocationAlias.objects.values_list("query", flat=True)), ["warangal, india"])
+        self.assertEqual(Location.objects.count(), 1)
+
+    def test_places_sharing_a_name_are_kept_apart(self):
+        london = make_weather_data(name="London", region="City of London, Greater London", country="United Kingdom")
+        ontario = make_weather_data(name="London", region="Ontario", country="Canada", temperature=4)
+        self.get_weather_data_via_api.side_effect = lambda location: ontario if "ontario" in location.lower() else london
+        uk_reading = fetch_location_current_weather("London")
+        ontario_reading = fetch_location_current_weather("London, Ontario")
+        cache.clear()
+
+        self.assertNotEqual(uk_reading.location_id, ontario_reading.location_id)
+        self.assertEqual(fetch_location_current_weather("london, ontario").pk, ontario_reading.pk)
+        self.assertEqual(fetch_location_current_weather("london").pk, uk_reading.pk)
+        self.assertEqual(self.get_weather_data_via_api.call_count, 2)
+
+        # refreshes of a stored location ask WeatherAPI for that place, not its bare name
+        with mock.patch("weather.services.is_reading_fresh", return_value=False):
+            _revalidate_location_weather(ontario_reading.location)
+        self.get_weather_data_via_api.assert_called_with(location="London, Ontario, Canada")
+        self.assertEqual(get_latest_weather_for_location(ontario_reading.location_id).temperature, 4)
+
+    def test_unknown_location_is_not_looked_up_again(self):
+        self.get_weather_data_via_api.side_effect = NoLocationFoundException()
+
+        for _ in range(3):
+            with self.assertRaises(NoLocationFoundException):
+                fetch_location_current_weather("Atlantis ")
+
+        self.assertEqual(self.get_weather_data_via_api.call_count, 1)
+        self.assertEqual(self.client.get("/api/weather/atlantis/current/").status_code, 404)
+        self.assertEqual(self.get_weather_data_via_api.call_count, 1)
+
+
+class FetchLocationForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("weather.services.get_weather_forecast_data_via_api")
+        self.get_weather_forecast_data_via_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_forecast_issue_is_stored_and_reused(self):
+        self.get_weather_forecast_data_via_api.return_value = make_forecast_data(days=3)
+
+        forecast = fetch_location_forecast("Warangal", days=3)
+        with mock.patch("weather.services.get_weather_data_via_api") as get_weather_data_via_api:
+            fetch_location_current_weather("warangal")
+        self.assertEqual(fetch_location_forecast("warangal", days=3).pk, forecast.pk)
+
+        self.assertEqual(self.get_weather_forecast_data_via_api.call_count, 1)
+        get_weather_data_via_api.assert_not_called()
+        self.assertEqual(ForecastDay.objects.count(), 3)
+        self.assertEqual(ForecastHour.objects.count(), 72)
+        with self.assertNumQueries(2):
+            stored = get_forecast(forecast, hours=24)
+        self.assertEqual(len(stored["days"]), 3)
+        self.assertEqual(len(stored["hours"]), 24)
+        self.assertEqual(stored["days"][0].condition.text, "Sunny")
+
+    def test_expired_issue_is_replaced_in_place(self):
+        self.get_weather_forecast_data_via_api.return_value = make_forecast_data(days=3)
+        forecast = fetch_location_forecast("warangal", days=3)
+        forecast.expires_on = now()
+        forecast.save()
+        self.get_weather_forecast_data_via_api.return_value = make_forecast_data(days=2)
+
+        fetch_location_forecast("warangal", days=2)
+
+        self.assertEqual(self.get_weather_forecast_data_via_api.call_count, 2)
+        self.assertEqual(ForecastDay.objects.count(), 2)
+        self.assertEqual(ForecastHour.objects.count(), 48)
+
+    def test_longer_forecast_than_stored_is_fetched(self):
+        self.get_weather_forecast_data_via_api.return_value = make_forecast_data(days=1)
+        fetch_location_forecast("warangal", days=1)
+        self.get_weather_forecast_data_via_api.return_value = make_forecast_data(days=14)
+
+        fetch_location_forecast("warangal", days=14)
+
+        self.assertEqual(self.get_weather_forecast_data_via_api.call_count, 2)
+        self.assertEqual(ForecastDay.objects.count(), 14)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.time = 0
+        self.breaker = CircuitBreaker(
+            window=10, min_calls=4, failure_rate=0.5, slow_call=2, open_seconds=30, clock=lambda: self.time
+        )
+
+    def test_opens_on_errors_and_slow_calls(self):
+        for elapsed, failed in [(0.1, False), (0.1, True), (0.1, False)]:
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(elapsed, failed)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.breaker.record(3)  # slow calls count as failures
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_in(), 30)
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+
+    def test_failures_outside_the_window_are_forgotten(self):
+        for _ in range(3):
+            self.breaker.record(0.1, failed=True)
+        self.time = 11
+        self.breaker.record(0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe(self):
+        for _ in range(4):
+            self.breaker.record(0.1, failed=True)
+        self.time = 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # one probe at a time
+        self.breaker.record(0.1, failed=True)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        self.time = 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.stats()["opened"], 2)
+
+
+class QuotaLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.time = 1_700_000_000.5
+        self.limiter = QuotaLimiter(
+            cache=LocMemCache("quota-tests", {}), per_second=4, per_month=100,
+            clock=lambda: self.time, sleep=self.sleep,
+        )
+        self.limiter.cache.clear()
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+    def test_priorities_share_each_second(self):
+        self.assertEqual(sum(self.limiter.try_acquire(Priority.BULK) is None for _ in range(4)), 1)
+        self.assertEqual(sum(self.limiter.try_acquire(Priority.BACKGROUND) is None for _ in range(4)), 1)
+        self.assertEqual(sum(self.limiter.try_acquire(Priority.INTERACTIVE) is None for _ in range(4)), 2)
+        self.assertFalse(self.limiter.acquire(Priority.BACKGROUND))  # background does not wait
+
+        self.assertTrue(self.limiter.acquire(Priority.INTERACTIVE))  # waits for the next second
+        self.assertEqual(self.time, 1_700_000_001)
+        metrics = self.limiter.metrics()
+        self.assertEqual(metrics["remaining_second"], 3)
+        self.assertEqual(metrics["remaining_month"], 95)
+        self.assertEqual(metrics["denied"], {"interactive": 0, "background": 1, "bulk": 0})
+        self.assertEqual(metrics["waiting"]["interactive"], 0)
+
+    def test_monthly_reserve_defers_low_priorities(self):
+        for _ in range(20):
+            self.time += 1
+            for _ in range(4):
+                self.limiter.try_acquire()
+        self.assertEqual(self.limiter.metrics()["remaining_month"], 20)
+
+        self.time += 1
+        self.assertEqual(self.limiter.try_acquire(Priority.BULK), "month")
+        self.assertIsNone(self.limiter.try_acquire(Priority.BACKGROUND))
+        self.assertIsNone(self.limiter.try_acquire(Priority.INTERACTIVE))
+
+    def test_single_token_is_kept_for_page_views(self):
+        limiter = QuotaLimiter(cache=self.limiter.cache, per_second=1, clock=lambda: self.time, sleep=self.sleep)
+        for priority in (Priority.BULK, Priority.BACKGROUND):
+            self.assertEqual(limiter.try_acquire(priority), "second")
+            # waiting cannot help a priority with no share of the second
+            self.assertFalse(limiter.acquire(priority))
+        self.assertEqual(self.time, 1_700_000_000.5)
+        self.assertIsNone(limiter.try_acquire(Priority.INTERACTIVE))
+        self.assertEqual(limiter.try_acquire(Priority.INTERACTIVE), "second")
+
+    def test_evicted_counters_are_not_decremented(self):
+        for _ in range(4):
+            self.limiter.try_acquire()
+
+        def sleep(seconds):
+            self.limiter.cache.clear()  # e.g. evicted under memory pressure
+            self.sleep(seconds)
+
+        self.limiter.sleep = sleep
+        self.assertTrue(self.limiter.acquire(Priority.INTERACTIVE))
+        self.limiter.cache.clear()
+        self.limiter.release()
+
+    async def test_async_acquire_uses_the_async_cache_api(self):
+        for _ in range(4):
+            self.limiter.try_acquire()
+
+        async def sleep(seconds):
+            await self.limiter.cache.aclear()
+            self.sleep(seconds)
+
+        with mock.patch.object(self.limiter.cache, "incr", side_effect=AssertionError("sync cache call")), \
+                mock.patch("services.ratelimit.asyncio.sleep", sleep):
+            self.assertFalse(await self.limiter.aacquire(Priority.BACKGROUND))
+            self.assertEqual(self.limiter.metrics()["denied"]["background"], 1)
+            self.assertTrue(await self.limiter.aacquire(Priority.INTERACTIVE))
+
+    @override_settings(WEATHERAPI_RATE_PER_SECOND=0, WEATHERAPI_QUOTA_PER_MONTH=3)
+    def test_retries_spend_quota(self):
+        cache.clear()
+        get_quota_limiter().try_acquire()  # the first attempt
+        retry = QuotaRetry(total=5, status_forcelist=(500,), raise_on_status=False)
+        for _ in range(2):
+            retry = retry.increment("GET", "/v1/current.json", response=HTTPResponse(status=500))
+
+        with self.assertRaises(MaxRetryError):
+            retry.increment("GET", "/v1/current.json", response=HTTPResponse(status=500))
+        self.assertEqual(get_quota_limiter().metrics()["remaining_month"], 0)
+
+    @override_settings(WEATHERAPI_RATE_PER_SECOND=0, WEATHERAPI_QUOTA_PER_MONTH=20)
+    def test_calls_over_budget_do_not_go_upstream(self):
+        cache.clear()
+        for _ in range(19):
+            get_quota_limiter().try_acquire(Priority.INTERACTIVE)
+        with mock.patch("services.weatherapi.get_weatherapi_client") as get_weatherapi_client:
+            get_weatherapi_client.return_value.get.return_value.status_code = 500
+            with upstream_priority(Priority.BACKGROUND):
+                # less than the background reserve of 5% of the month is left
+                self.assertRaises(RateLimitedError, get_weather_data_via_api, "warangal")
+        get_weatherapi_client.return_value.get.assert_not_called()
+
+
+class JSONDecodingTests(SimpleTestCase):
+    def setUp(self):
+        self.body = json.dumps(build_forecast_payload(days=2)).encode()
+
+    def test_backends_decode_the_same_forecast(self):
+        expected = parse_forecast(json.loads(self.body))
+        for backend in ["auto", "json"] + (["orjson"] if decoders.orjson is not None else []):
+            self.assertEqual(parse_forecast(decoders.get_json_loads(backend)(self.body)), expected)
+        with self.assertRaises(ValueError):
+            decoders.get_json_loads("simdjson")
+
+    @unittest.skipUnless(decoders.can_stream(), "ijson is not installed")
+    def test_streaming_keeps_only_stored_hour_fields(self):
+        response_json = decoders.load_forecast(self.body, FORECAST_HOUR_FIELDS)
+
+        self.assertEqual(parse_forecast(response_json), parse_forecast(json.loads(self.body)))
+        hour = response_json["forecast"]["forecastday"][0]["hour"][0]
+        self.assertNotIn("temp_f", hour)
+        self.assertEqual(set(hour["condition"]), {"text", "icon", "code"})
+
+
+class WeatherAPIClientTests(TestCase):
+    def test_client_is_shared_and_applies_timeouts(self):
+        client = get_weatherapi_client()
+
+        self.assertIs(client, get_weatherapi_client())
+        with mock.patch.object(client.session, "get") as session_get:
+            client.get("current.json", q="warangal")
+
+        session_get.assert_called_once_with(
+            "http://api.weatherapi.com/v1/current.json",
+            params={"key": client.api_key, "q": "warangal"},
+            timeout=client.timeout,
+        )
+
+
+class LocationAutocompleteTests(TestCase):
+    def setUp(self):
+        location_suggestions.reset()
+        self.addCleanup(location_suggestions.reset)
+        for name, region in [("warangal", "Telangana"), ("warsaw", "Mazowieckie"), ("delhi", "Delhi")]:
+            Location.objects.create(name=name, region=region, country="X")
+
+    def test_prefix_index(self):
+        index = PrefixIndex(["Bern, Bern", "Berlin, Berlin", "Bergen, Hordaland", "Basel, Basel"])
+
+        self.assertEqual(index.search("BER", 10), ["Bergen, Hordaland", "Berlin, Berlin", "Bern, Bern"])
+        self.assertEqual(index.search("ber", 2), ["Bergen, Hordaland", "Berlin, Berlin"])
+        self.assertEqual(index.search("bz", 10), [])
+        self.assertFalse(index.add("berlin,  berlin"))
+
+    def test_suggestions_come_from_stored_locations_without_queries(self):
+        self.assertEqual(suggest_locations("war"), ["Warangal, Telangana, X", "Warsaw, Mazowieckie, X"])
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/locations/autocomplete/", {"q": "WARS"})
+        self.assertEqual(response.json()["suggestions"], ["Warsaw, Mazowieckie, X"])
+        self.assertEqual(self.client.get("/api/locations/autocomplete/", {"q": "w", "limit": 0}).status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            get_or_create_location(name="Warri", region="Delta", country="Nigeria", latitude=5.5, longitude=5.8)
+        self.assertIn("Warri, Delta, Nigeria", suggest_locations("war"))
+        self.assertEqual(location_suggestions.builds, 1)
+
+    def test_stale_index_is_served_while_one_rebuild_runs(self):
+        self.assertEqual(suggest_locations("war"), ["Warangal, Telangana, X", "Warsaw, Mazowieckie, X"])
+        Location.objects.create(name="wardha", region="Maharashtra", country="India")
+
+        with override_settings(WEATHER_AUTOCOMPLETE_REBUILD_INTERVAL=0), \
+                mock.patch.object(location_suggestions, "_executor") as executor:
+            with self.assertNumQueries(0):
+                for _ in range(3):
+                    self.assertEqual(len(suggest_locations("war")), 2)
+            executor.submit.assert_called_once_with(location_suggestions._rebuild)
+
+            location_suggestions._rebuild()
+            self.assertIn("Wardha, Maharashtra, India", suggest_locations("war"))
+        self.assertEqual(location_suggestions.builds, 2)
+
+    @override_settings(WEATHER_AUTOCOMPLETE_UPSTREAM=True)
+    def test_upstream_results_are_cached_per_prefix(self):
+        results = [LocationSearchData(name="Wardha", region="Maharashtra", country="India", latitude=20.7, longitude=78.6)]
+        with mock.patch("weather.autocomplete.search_locations_via_api", return_value=results) as search, \
+                mock.patch.object(location_suggestions, "_schedule_upstream_search", location_suggestions._search_upstream):
+            # served from the next keystroke on
+            self.assertEqual(suggest_locations("ward"), [])
+            self.assertEqual(suggest_locations("ward"), ["Wardha, Maharashtra, India"])
+            self.assertEqual(suggest_locations("wa", limit=3), ["Warangal, Telangana, X", "Warsaw, Mazowieckie, X"])
+
+        search.assert_called_once_with("ward")
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_threads_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "reading"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("warangal", fetch))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        while flight.in_flight() == 0:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["reading"] * 10)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_concurrent_tasks_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "reading"
+
+        async def main():
+            return await asyncio.gather(*(flight.ado("warangal", fetch) for _ in range(10)))
+
+        self.assertEqual(asyncio.run(main()), ["reading"] * 10)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight()
+
+        with self.assertRaises(ValueError):
+            flight.do("warangal", mock.Mock(side_effect=ValueError))
+        self.assertEqual(flight.do("warangal", lambda: "reading"), "reading")
+
+    @override_settings(WEATHER_SINGLEFLIGHT_DISTRIBUTED=True, WEATHER_SINGLEFLIGHT_LOCK_TIMEOUT=1)
+    def test_cache_lock_is_exclusive(self):
+        cache.clear()
+        with cache_lock("warangal") as acquired:
+            self.assertTrue(acquired)
+            with mock.patch("weather.singleflight.LOCK_POLL_INTERVAL", 0.01), cache_lock("warangal") as second:
+                self.assertFalse(second)
+        with cache_lock("warangal") as acquired:
+            self.assertTrue(acquired)
+        with memcached_safe_keys(), cache_lock("forecast:new york, usa") as acquired:
+            self.assertTrue(acquired)
+
+
+class RefreshTrackedLocationsTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(_weather_conditions.clear)
+        patcher = mock.patch("weather.services.get_weather_data_via_api", return_value=make_weather_data())
+        self.get_weather_data_via_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_page_views_are_debounced(self):
+        warangal = create_locationweater_entry(**vars(make_weather_data())).location_id
+        with memcached_safe_keys():
+            track_location_request(warangal)
+            track_location_request(warangal)
+
+        tracked = TrackedLocation.objects.get(location_id=warangal)
+        self.assertEqual(tracked.request_count, 1)
+
+    def test_refresh_cycle_respects_priority_and_budget(self):
+        for name, priority in [("warangal", 1), ("hyderabad", 5), ("delhi", 0)]:
+            location = create_locationweater_entry(**vars(make_weather_data(
+                name=name, record_timestamp=now() - timedelta(hours=1)
+            ))).location
+            TrackedLocation.objects.create(
+                location=location, priority=priority, refresh_interval=900,
+                next_refresh_on=now() - timedelta(minutes=5),
+            )
+
+        # a single worker keeps the test deterministic; lock retries are covered below
+        metrics = refresh_tracked_locations(budget=2, concurrency=1, jitter=0)
+
+        self.assertEqual(metrics["refreshed"], 2)
+        self.assertEqual(metrics["deferred"], 1)
+        self.assertGreaterEqual(metrics["max_lag"], 300)
+        refreshed = set(
+            TrackedLocation.objects.filter(last_refreshed_on__isnull=False).values_list("location__name", flat=True)
+        )
+        self.assertEqual(refreshed, {"hyderabad", "warangal"})
+        self.assertFalse(TrackedLocation.objects.get(location__name="hyderabad").next_refresh_on < now())
+
+    def test_locked_database_is_retried_then_deferred(self):
+        location = create_locationweater_entry(**vars(make_weather_data())).location
+        TrackedLocation.objects.create(location=location, refresh_interval=900, next_refresh_on=now())
+        locked = OperationalError("database table is locked: weather_locationweather")
+
+        with mock.patch("weather.services.time.sleep"), \
+                mock.patch("weather.services.refresh_location_weather", side_effect=[locked, None]):
+            metrics = refresh_tracked_locations(budget=1, concurrency=1, jitter=0)
+        self.assertEqual((metrics["refreshed"], metrics["failed"], metrics["locked"]), (1, 0, 0))
+
+        TrackedLocation.objects.update(next_refresh_on=now())
+        with mock.patch("weather.services.time.sleep"), \
+                mock.patch("weather.services.refresh_location_weather", side_effect=locked) as refresh:
+            metrics = refresh_tracked_locations(budget=1, concurrency=1, jitter=0)
+        self.assertEqual((metrics["refreshed"], metrics["failed"], metrics["locked"]), (0, 0, 1))
+        self.assertEqual(refresh.call_count, LOCKED_RETRIES + 1)
+        self.assertGreater(TrackedLocation.objects.get().next_refresh_on, now())
+
+
+class IngestLocationsTests(TestCase):
+    def test_failures_do_not_abort_the_batch(self):
+        def get_weather_data_via_api(location):
+            if location == "nowhere":
+                raise NoLocationFoundException("No Location Found!")
+            return make_weather_data(name=location.title())
+
+        with mock.patch("weather.services.get_weather_data_via_api", side_effect=get_weather_data_via_api):
+            report = ingest_locations(["warangal", "nowhere", "delhi", "hyderabad"], concurrency=2, batch_size=2)
+
+        self.assertEqual(report.rows, 3)
+        self.assertEqual(report.upstream_calls, 4)
+        self.assertEqual([location for location, _ in report.failures], ["nowhere"])
+        self.assertEqual(
+            set(LocationWeather.objects.values_list("location__name", flat=True)), {"warangal", "delhi", "hyderabad"}
+        )
+        # every reading shares the one interned condition row
+        self.assertEqual(WeatherCondition.objects.get().code, 1063)
+        self.assertEqual(Location.objects.count(), 3)
+
+    def test_only_calls_that_reach_upstream_are_counted(self):
+        cache.clear()
+
+        def get_weather_data_via_api(location):
+            if location == "nowhere":
+                raise NoLocationFoundException("No Location Found!")
+            if location == "delhi":
+                raise RateLimitedError()
+            return make_weather_data(name=location.title())
+
+        with mock.patch("weather.services.get_weather_data_via_api", side_effect=get_weather_data_via_api) as fetch:
+            ingest_locations(["nowhere"])
+            report = ingest_locations(["warangal", "nowhere", "delhi"], concurrency=2)
+
+        # "nowhere" is answered from the negative cache, "delhi" is refused by the limiter
+        self.assertEqual(report.upstream_calls, 1)
+        self.assertEqual(fetch.call_count, 3)
+        self.assertEqual(sorted(location for location, _ in report.failures), ["delhi", "nowhere"])
+
+
+@override_settings(WEATHER_HISTORY_STORE=False)
+class WeatherTrendsTests(TestCase):
+    def setUp(self):
+        recent_history.clear()
+        for minutes, temperature in [(0, 30), (15, 20), (30, 25), (60 * 30, 50)]:
+            create_locationweater_entry(**vars(make_weather_data(
+                temperature=temperature, record_timestamp=now() - timedelta(minutes=minutes)
+            )))
+        self.latest = LocationWeather.objects.order_by("-record_timestamp").first()
+        self.warangal = self.latest.location_id
+        # stored, but without readings
+        self.delhi = Location.objects.create(name="delhi", region="Delhi", country="India").id
+
+    def assert_trends(self, trends):
+        self.assertEqual(trends["count"], 3)
+        self.assertEqual(trends["window_hours"], 24)
+        self.assertEqual(trends["average_temperature"], 25)
+        self.assertEqual(trends["min_temperature"], 20)
+        self.assertEqual(trends["max_temperature"], 30)
+        self.assertEqual(trends["temperature_delta"], 5)
+
+    @override_settings(WEATHER_TRENDS_FROM_ROLLUPS=False)
+    def test_trends_from_readings_in_one_query(self):
+        with self.assertNumQueries(1):
+            trends = get_weather_trends(self.warangal, days=1, latest=self.latest)
+        self.assert_trends(trends)
+
+    def test_trends_from_rollups_in_one_query(self):
+        self.assertEqual(update_weather_rollups(batch_size=2), 4)
+
+        with self.assertNumQueries(1):
+            trends = get_weather_trends(self.warangal, days=1, latest=self.latest)
+        self.assert_trends(trends)
+
+    @override_settings(WEATHER_ROLLUP_OVERLAP=0)
+    def test_rollups_are_incremental(self):
+        update_weather_rollups()
+        create_locationweater_entry(**vars(make_weather_data(temperature=10)))
+
+        self.assertEqual(update_weather_rollups(), 1)
+        self.assertEqual(update_weather_rollups(), 0)
+        self.assertEqual(sum(DailyWeatherRollup.objects.values_list("count", flat=True)), 5)
+        self.assertEqual(get_weather_trends(self.warangal, days=30)["min_temperature"], 10)
+        self.assertEqual(sum(bucket["count"] for bucket in get_weather_history(self.warangal, days=2)), 5)
+
+    def test_rewritten_and_late_readings_are_folded_once(self):
+        update_weather_rollups()
+        # an upsert rewrites the newest reading in place
+        create_locationweater_entry(**vars(make_weather_data(
+            temperature=40, record_timestamp=self.latest.record_timestamp
+        )))
+        # a reading committed after the mark moved past its update time
+        late = create_locationweater_entry(**vars(make_weather_data(
+            temperature=15, record_timestamp=now() - timedelta(minutes=45)
+        )))
+        LocationWeather.objects.filter(pk=late.pk).update(updated_on=now() - timedelta(minutes=1))
+
+        update_weather_rollups()
+        update_weather_rollups()
+
+        self.assertEqual(sum(DailyWeatherRollup.objects.values_list("count", flat=True)), 5)
+        trends = get_weather_trends(self.warangal, days=1)
+        self.assertEqual((trends["count"], trends["min_temperature"], trends["max_temperature"]), (4, 15, 40))
+
+    def test_no_readings_in_window(self):
+        self.assertIsNone(get_weather_trends(self.delhi))
+
+    @override_settings(WEATHER_HISTORY_STORE=True, WEATHER_HISTORY_MAX_LOCATIONS=1, WEATHER_TRENDS_FROM_ROLLUPS=False)
+    def test_trends_from_recent_history(self):
+        with self.assertNumQueries(1):
+            self.assert_trends(get_weather_trends(self.warangal, days=1, latest=self.latest))
+        with self.assertNumQueries(0):
+            self.assert_trends(get_weather_trends(self.warangal, days=1, latest=self.latest))
+        # the 30-hour-old reading is outside the loaded window, so this falls back to the DB
+        self.assertEqual(get_weather_trends(self.warangal, days=2)["count"], 4)
+
+        self.assertIsNone(get_weather_trends(self.delhi))
+        stats = recent_history.stats()
+        self.assertEqual(stats["locations"], 1)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["bytes"], 192 * 8 * 11)
+
+
+class GeoTests(SimpleTestCase):
+    def test_encode_and_distance(self):
+        self.assertEqual(geo.encode(42.6, -5.6, precision=5), "ezs42")
+        self.assertAlmostEqual(geo.distance_km(51.5074, -0.1278, 48.8566, 2.3522), 343.6, delta=0.5)
+
+    def test_covering_cells_contain_the_box(self):
+        for box in [(17.5, 79.0, 18.5, 80.0), (-10, 170, 10, -170), (-1e-6, -1e-6, 1e-6, 1e-6)]:
+            cells = geo.covering_cells(*box)
+            self.assertLessEqual(len(cells), 32)
+            south, west, north, east = box
+            for latitude in (south, (south + north) / 2, north):
+                for longitude in (west, east):
+                    self.assertTrue(any(geo.encode(latitude, longitude).startswith(cell) for cell in cells))
+
+
+class AreaLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for name, latitude, longitude in [
+            ("warangal", 18.0, 79.58), ("hanamkonda", 18.01, 79.56), ("hyderabad", 17.38, 78.48),
+            ("suva", -18.14, 178.44), ("apia", -13.83, -171.76),
+        ]:
+            create_locationweater_entry(**vars(make_weather_data(name=name, latitude=latitude, longitude=longitude)))
+
+    def test_box_is_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/weather/area/", {"bbox": "79,17.5,80,18.5"})
+        self.assertEqual(
+            sorted(row["name"] for row in response.json()["locations"]), ["hanamkonda", "warangal"]
+        )
+        # across the antimeridian
+        names = [weather.location.name for weather in get_latest_weather_in_box(-20, 175, -10, -170)]
+        self.assertEqual(sorted(names), ["apia", "suva"])
+        response = self.client.get("/api/weather/area/", {"bbox": "175,-20,190,-10"})
+        self.assertEqual(sorted(row["name"] for row in response.json()["locations"]), ["apia", "suva"])
+        self.assertEqual(self.client.get("/api/weather/area/", {"bbox": "79,18.5,80,17.5"}).status_code, 400)
+
+    def test_nearest_reading(self):
+        response = self.client.get("/api/weather/nearest/", {"lat": 18.004, "lon": 79.58})
+        self.assertEqual(response.json()["current"]["name"], "warangal")
+        self.assertLess(response.json()["distance_km"], 1)
+        self.assertEqual(self.client.get("/api/weather/nearest/", {"lat": 0, "lon": 0}).status_code, 404)
+        self.assertEqual(
+            self.client.get("/api/weather/nearest/", {"lat": 17.9, "lon": 79.5, "km": 50}).json()["current"]["name"],
+            "hanamkonda",
+        )
+
+
+class RingBufferTests(SimpleTestCase):
+    def test_wraps_and_tracks_coverage(self):
+        buffer = RingBuffer(capacity=3, covered_since=0)
+        for epoch in [10, 20, 30, 40]:
+            buffer.append(epoch, [epoch] * 10)
+
+        self.assertEqual(len(buffer), 3)
+        self.assertIsNone(buffer.aggregate(since=10))
+        aggregates = buffer.aggregate(since=15)
+        self.assertEqual(aggregates["count"], 3)
+        self.assertEqual(aggregates["temperature__avg"], 30)
+        self.assertEqual(aggregates["temperature__min"], 20)
+        self.assertEqual(buffer.aggregate(since=35)["count"], 1)
+
+        buffer.append(40, [41] * 10)
+        self.assertEqual(buffer.latest().temperature, 41)
+        buffer.append(25, [25] * 10)
+        self.assertIsNone(buffer.aggregate(since=20))
+        self.assertEqual(buffer.aggregate(since=26)["count"], 2)
+
+    def test_history_is_warmed_once_in_the_background(self):
+        warmed = threading.Event()
+        threads = []
+
+        def warm():
+            threads.append(threading.current_thread().name)
+            warmed.set()
+
+        with mock.patch("weather.history.warm_recent_history", side_effect=warm):
+            warm_recent_history_on_first_request()
+            self.assertEqual(threads, [])
+
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+            self.assertTrue(warmed.wait(5))
+        self.assertEqual(threads, ["weather-history-warm"])
+
+
+class WeatherAnalyticsTests(TestCase):
+    def test_vectorized_statistics(self):
+        epochs = np.array([0, 3600, 7200, 10800, 86400 + 3600])
+        values = np.array([1.0, 2.0, 3.0, 4.0, 10.0])
+
+        np.testing.assert_allclose(rolling_mean(epochs, values, 7200), [1, 1.5, 2.5, 3.5, 10])
+        days, minimums, maximums = daily_extremes(epochs, values)
+        self.assertEqual((days.tolist(), minimums.tolist(), maximums.tolist()), ([0, 1], [1, 10], [4, 10]))
+        indexes, rates = rapid_changes(epochs, values, threshold=0.5)
+        self.assertEqual(indexes.tolist(), [1, 2, 3])
+        np.testing.assert_allclose(rates, [1, 1, 1])
+
+    def test_ewma_matches_recurrence_across_chunks(self):
+        rng = np.random.default_rng(0)
+        epochs = np.cumsum(rng.integers(60, 3600, size=2000))
+        values = rng.normal(25, 5, size=2000)
+        halflife = 600
+
+        expected = [values[0]]
+        for previous, epoch, value in zip(epochs, epochs[1:], values[1:]):
+            decay = 0.5 ** ((epoch - previous) / halflife)
+            expected.append(decay * expected[-1] + (1 - decay) * value)
+        np.testing.assert_allclose(ewma(epochs, values, halflife), expected)
+
+    def test_derived_temperatures(self):
+        # NWS: 90F at 70% humidity feels like ~106F; Environment Canada: -10C at 30 km/h feels like ~-20C
+        self.assertAlmostEqual(float(heat_index(np.array([32.22]), np.array([70]))[0]), 41.1, delta=0.5)
+        self.assertAlmostEqual(float(wind_chill(np.array([-10.0]), np.array([30.0]))[0]), -19.5, delta=0.5)
+        self.assertEqual(float(wind_chill(np.array([20.0]), np.array([30.0]))[0]), 20)
+
+    def test_analytics_from_one_query(self):
+        for minutes, temperature in [(90, 20), (60, 30), (30, 25)]:
+            create_locationweater_entry(**vars(make_weather_data(
+                temperature=temperature, record_timestamp=now() - timedelta(minutes=minutes)
+            )))
+
+        warangal = get_location_id("warangal")
+        with self.assertNumQueries(1):
+            analytics = get_weather_analytics(warangal, days=1)
+
+        self.assertEqual(analytics["count"], 3)
+        self.assertEqual(analytics["temperature"]["p50"], 25)
+        self.assertEqual([change["field"] for change in analytics["rapid_changes"]], ["temperature"] * 2)
+        self.assertIsNone(get_weather_analytics(warangal + 1))
+
+
+class LatestWeatherTests(TestCase):
+    def test_snapshot_follows_newest_reading(self):
+        create_locationweater_entry(**vars(make_weather_data(temperature=30)))
+        # a late, older reading is stored but does not replace the current conditions
+        create_locationweater_entry(**vars(make_weather_data(
+            temperature=10, record_timestamp=now() - timedelta(hours=1)
+        )))
+        bulk_create_locationweather_entries([
+            make_weather_data(name="Delhi", temperature=35, record_timestamp=now() - timedelta(minutes=5)),
+            make_weather_data(name="Delhi", temperature=36),
+        ])
+
+        self.assertEqual(LocationWeather.objects.count(), 4)
+        with self.assertNumQueries(1):
+            latest = get_latest_weather()
+        self.assertEqual(
+            {weather.location.name: weather.temperature for weather in latest.values()}, {"warangal": 30, "delhi": 36}
+        )
+        self.assertEqual(get_latest_weather_for_location(get_location_id("delhi")).temperature, 36)
+
+
+class LatestWeatherBackfillTests(TransactionTestCase):
+    # keep the seeded alert rules across the table flushes
+    serialized_rollback = True
+    before = [("weather", "0009_seed_alertrules")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_backfill_keeps_reading_timestamps(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes("weather")
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate(self.before)
+        Location = apps.get_model("weather", "Location")
+        LocationWeather = apps.get_model("weather", "LocationWeather")
+        data = vars(make_weather_data())
+        location = Location.objects.create(
+            name="warangal", region=data["region"], country=data["country"],
+            latitude=data["latitude"], longitude=data["longitude"],
+        )
+        reading = {field.attname: data[field.attname] for field in LocationWeather._meta.fields if field.attname in data}
+        for hours in (2, 1):
+            reading["record_timestamp"] = now() - timedelta(hours=hours)
+            LocationWeather.objects.create(location=location, **reading)
+        created_on = now() - timedelta(days=3)
+        LocationWeather.objects.update(created_on=created_on)
+
+        self.migrate(latest)
+
+        snapshot = LatestWeather.objects.get(location__name="warangal")
+        self.assertEqual(snapshot.record_timestamp, LocationWeather.objects.latest("record_timestamp").record_timestamp)
+        self.assertEqual(snapshot.created_on, created_on)
+
+
+class TrackedLocationBackfillTests(TransactionTestCase):
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_tracked_queries_are_linked_to_locations(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes("weather")
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate([("weather", "0013_rollup_updated_on")])
+        Location = apps.get_model("weather", "Location")
+        LocationAlias = apps.get_model("weather", "LocationAlias")
+        TrackedLocation = apps.get_model("weather", "TrackedLocation")
+        london = Location.objects.create(name="london", region="City of London", country="United Kingdom")
+        ontario = Location.objects.create(name="london", region="Ontario", country="Canada")
+        LocationAlias.objects.create(query="london, ontario", location=ontario)
+        LocationAlias.objects.create(query="london, uk", location=london)
+        for name, request_count in [("london, ontario", 3), ("london", 2), ("london, uk", 1), ("atlantis", 1)]:
+            TrackedLocation.objects.create(
+                name=name, request_count=request_count, refresh_interval=900, next_refresh_on=now()
+            )
+
+        TrackedLocation = self.migrate(latest).get_model("weather", "TrackedLocation")
+
+        tracked = dict(TrackedLocation.objects.values_list("location_id", "request_count"))
+        self.assertEqual(tracked, {ontario.id: 3, london.id: 3})
+
+
+class AlertRuleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        readings = {
+            "warangal": dict(temperature=40, humidity=95),
+            "delhi": dict(temperature=20),
+            "oslo": dict(temperature=-5),
+        }
+        for name, values in readings.items():
+            country = "Norway" if name == "oslo" else "India"
+            # an older extreme reading must not count
+            create_locationweater_entry(**vars(make_weather_data(
+                name=name, country=country, temperature=50, record_timestamp=now() - timedelta(hours=1)
+            )))
+            weather = create_locationweater_entry(**vars(make_weather_data(name=name, country=country, **values)))
+            TrackedLocation.objects.create(location=weather.location, refresh_interval=900, next_refresh_on=now())
+
+    def test_seeded_rules_match_previous_thresholds(self):
+        warangal = LocationWeather.objects.filter(location__name="warangal").latest("record_timestamp")
+        self.assertEqual(check_for_extreme_conditions(warangal), ["Extreme temperature", "High humidity"])
+        delhi = LocationWeather.objects.filter(location__name="delhi").latest("record_timestamp")
+        self.assertIsNone(check_for_extreme_conditions(delhi))
+
+    def test_extreme_locations_in_one_query(self):
+        rules = get_alert_rules()
+        with self.assertNumQueries(1):
+            extreme = {reading.location.name: reading.rules_fired for reading in get_extreme_locations(rules)}
+        self.assertEqual(extreme, {"warangal": 2, "oslo": 1})
+
+    def test_in_memory_evaluation_matches_query(self):
+        rules = get_alert_rules()
+        with self.assertNumQueries(1):
+            result = evaluate_location_alerts(rules=rules)
+        self.assertEqual(result["locations"], 3)
+        self.assertEqual(result["rules_fired"], 3)
+        self.assertEqual(result["alerting"], {get_location_id("warangal"): 2, get_location_id("oslo"): 1})
+        self.assertEqual(result["by_rule"]["Extreme temperature"], 2)
+
+    def test_country_rules_and_invalidation(self):
+        get_alert_rules()
+        AlertRule.objects.create(name="Cold for India", field="temperature", operator="lt", threshold=25, country="India")
+
+        rules = get_alert_rules()
+        self.assertEqual(len(rules), 7)
+        self.assertEqual(get_extreme_locations(rules).get(location__name="delhi").rules_fired, 1)
+        self.assertEqual(evaluate_location_alerts(rules=rules)["alerting"][get_location_id("delhi")], 1)
+        # Oslo is colder but not in India
+        self.assertEqual(evaluate_location_alerts(rules=rules)["alerting"][get_location_id("oslo")], 1)
+
+
+class CompareLocationsTests(TransactionTestCase):
+    # keep the seeded alert rules across the table flushes
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        # conditions interned by committed writes do not survive the flush after each test
+        self.addCleanup(_weather_conditions.clear)
+        patcher = mock.patch("weather.services.get_weather_data_via_api")
+        self.get_weather_data_via_api = patcher.start()
+        self.addCleanup(patcher.stop)
+        for name, temperature in [("warangal", 40), ("delhi", 20), ("mumbai", 30)]:
+            create_locationweater_entry(**vars(make_weather_data(name=name, temperature=temperature)))
+        # mumbai's only reading is stale
+        LatestWeather.objects.filter(location__name="mumbai").update(
+            record_timestamp=now() - timedelta(hours=1), created_on=now() - timedelta(hours=1)
+        )
+
+    def test_fresh_locations_are_read_in_batches(self):
+        # the first batch also looks the queries up in the alias index, which is then cached
+        with self.assertNumQueries(4):
+            response = self.client.get("/compare.json", {"locations": "Warangal, delhi"})
+        with self.assertNumQueries(2):
+            self.client.get("/compare.json", {"locations": "delhi,warangal,delhi"})
+
+        rows = response.json()["locations"]
+        self.assertEqual([row["location"] for row in rows], ["warangal", "delhi"])
+        self.assertEqual(rows[0]["current"]["temperature"], 40)
+        self.assertEqual(rows[0]["trends"]["count"], 1)
+        self.assertEqual(rows[0]["alert"], "Alert: Extreme temperature")
+        self.assertIsNone(rows[1]["alert"])
+        self.get_weather_data_via_api.assert_not_called()
+
+    def test_only_stale_and_unknown_locations_go_upstream(self):
+        def fetch(location):
+            if location == "atlantis":
+                raise NoLocationFoundException()
+            return make_weather_data(name=location, temperature=31)
+        self.get_weather_data_via_api.side_effect = fetch
+
+        # a single worker: the in-memory test database cannot take concurrent writers
+        weather, errors = fetch_locations_current_weather(["warangal", "mumbai", "atlantis"], concurrency=1)
+
+        self.assertEqual(sorted(call.kwargs["location"] for call in self.get_weather_data_via_api.call_args_list),
+                         ["atlantis", "mumbai"])
+        self.assertEqual(list(weather), ["warangal", "mumbai"])
+        self.assertEqual(weather["mumbai"].temperature, 31)
+        self.assertIsInstance(errors["atlantis"], NoLocationFoundException)
+
+    def test_invalid_request(self):
+        self.assertEqual(self.client.get("/compare.json", {"locations": " , "}).status_code, 400)
+        self.assertContains(self.client.get("/compare/", {"locations": "warangal,delhi"}), "Delhi")
+
+
+class WeatherAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("weather.services.get_weather_data_via_api", return_value=make_weather_data())
+        self.get_weather_data_via_api = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_conditional_requests(self):
+        response = self.client.get("/api/weather/Warangal/current/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["current"]["temperature"], 29.1)
+        self.assertIn("max-age=", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+
+        not_modified = self.client.get("/api/weather/warangal/current/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+        since = self.client.get("/api/weather/warangal/current/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(since.status_code, 304)
+
+        # the window is part of the validator
+        trends = self.client.get("/api/weather/warangal/trends/", {"days": 1})
+        self.assertEqual(trends.json()["trends"]["count"], 1)
+        self.assertNotEqual(trends["ETag"], response["ETag"])
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/weather/warangal/trends/", {"days": 1}, HTTP_IF_NONE_MATCH=trends["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get("/api/weather/warangal/history/").status_code, 200)
+
+    def test_errors(self):
+        self.get_weather_data_via_api.side_effect = NoLocationFoundException()
+        self.assertEqual(self.client.get("/api/weather/atlantis/current/").status_code, 404)
+        self.assertEqual(self.client.get("/api/weather/warangal/trends/", {"days": "-1"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/weather/warangal/current/").status_code, 405)
+
+
+class ExportWeatherTests(TestCase):
+    def setUp(self):
+        self.start = now().replace(microsecond=0) - timedelta(hours=3)
+        for hour, temperature in enumerate([20, 25, 30]):
+            create_locationweater_entry(**vars(make_weather_data(
+                temperature=temperature, record_timestamp=self.start + timedelta(hours=hour)
+            )))
+
+    @override_settings(WEATHER_EXPORT_CHUNK_SIZE=2, WEATHER_EXPORT_BUFFER_SIZE=10)
+    def test_streams_ndjson_and_csv(self):
+        response = self.client.get("/api/weather/Warangal/export/")
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["temperature"] for row in rows], [20, 25, 30])
+        self.assertEqual(rows[0]["condition"], "Patchy rain nearby")
+
+        since = (self.start + timedelta(hours=1)).isoformat()
+        response = self.client.get("/api/weather/warangal/export/", {"format": "csv", "since": since, "gzip": "1"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["location", "record_timestamp"])
+        self.assertEqual(len(lines), 3)
+
+        self.assertEqual(self.client.get("/api/weather/warangal/export/", {"since": "yesterday"}).status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "warangal.ndjson")
+            call_command("export_weather", "Warangal", "--until", (self.start + timedelta(hours=2)).isoformat(),
+                         "--output", path, stderr=io.StringIO())
+            with open(path) as file:
+                self.assertEqual(len(file.readlines()), 2)
+
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(WEATHER_ARCHIVE_DIR=directory.name, WEATHER_ARCHIVE_CHUNK_SIZE=2))
+        for days, temperature in [(70, 10), (45, 20), (40, 30), (1, 40)]:
+            create_locationweater_entry(**vars(make_weather_data(
+                temperature=temperature, record_timestamp=now() - timedelta(days=days)
+            )))
+
+    def archive(self):
+        # segments are published once the transaction deleting their rows commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive_readings(older_than_days=30)
+
+    @override_settings(WEATHER_TRENDS_FROM_ROLLUPS=False, WEATHER_HISTORY_STORE=False)
+    def test_archived_readings_are_still_aggregated(self):
+        update_weather_rollups()
+        warangal = get_location_id("warangal")
+        trends = get_weather_trends(warangal, days=90)
+        analytics = get_weather_analytics(warangal, days=90)
+
+        self.assertEqual(self.archive(), 3)
+        self.assertEqual(LocationWeather.objects.count(), 1)
+        months = {(now() - timedelta(days=days)).strftime("%Y-%m") for days in (70, 45, 40)}
+        self.assertEqual(set(os.listdir(settings.WEATHER_ARCHIVE_DIR)), months)
+
+        archived = get_weather_trends(warangal, days=90)
+        self.assertEqual(archived.keys(), trends.keys())
+        for key, value in trends.items():
+            self.assertAlmostEqual(float(archived[key]), float(value), places=2, msg=key)
+        self.assertEqual(get_weather_trends(warangal, days=42)["count"], 2)
+        archived = get_weather_analytics(warangal, days=90)
+        self.assertEqual(archived["count"], 4)
+        self.assertEqual(archived["temperature"], analytics["temperature"])
+        self.assertEqual(self.archive(), 0)
+
+    @override_settings(WEATHER_TRENDS_FROM_ROLLUPS=False)
+    def test_archived_readings_are_aggregated_for_many_locations(self):
+        create_locationweater_entry(**vars(make_weather_data(
+            name="Delhi", temperature=50, record_timestamp=now() - timedelta(days=60)
+        )))
+        update_weather_rollups()
+        self.assertEqual(self.archive(), 4)
+
+        warangal, delhi = get_location_id("warangal"), get_location_id("delhi")
+        # one grouped query; segments are read once for both locations
+        with self.assertNumQueries(1):
+            trends = get_weather_trends_for_locations([warangal, delhi], days=90)
+        self.assertEqual({location_id: trend["count"] for location_id, trend in trends.items()}, {warangal: 4, delhi: 1})
+        self.assertEqual(trends[warangal]["average_temperature"], 25)
+        # every reading of delhi in the window is archived
+        self.assertEqual(trends[delhi]["max_temperature"], 50)
+
+    @override_settings(WEATHER_EXPORT_CHUNK_SIZE=2)
+    def test_archived_readings_are_exported(self):
+        update_weather_rollups()
+        # stored after the rollups, so it stays in the DB between archived readings
+        create_locationweater_entry(**vars(make_weather_data(
+            temperature=50, record_timestamp=now() - timedelta(days=50)
+        )))
+        self.assertEqual(self.archive(), 3)
+
+        warangal = get_location_id("warangal")
+        rows = [json.loads(line) for line in b"".join(export_readings(warangal)).splitlines()]
+        self.assertEqual([row["temperature"] for row in rows], [10, 50, 20, 30, 40])
+        self.assertEqual({(row["location"], row["condition"]) for row in rows}, {("warangal", "Patchy rain nearby")})
+        since = now() - timedelta(days=42)
+        rows = [json.loads(line) for line in b"".join(export_readings(warangal, since=since)).splitlines()]
+        self.assertEqual([row["temperature"] for row in rows], [30, 40])
+
+    def test_only_rolled_up_readings_are_archived(self):
+        self.assertEqual(self.archive(), 0)
+        update_weather_rollups()
+        create_locationweater_entry(**vars(make_weather_data(record_timestamp=now() - timedelta(days=50))))
+
+        self.assertEqual(self.archive(), 3)
+        self.assertEqual(LocationWeather.objects.count(), 2)
+
+    def test_segments_are_published_after_the_delete_commits(self):
+        update_weather_rollups()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(archive_readings(older_than_days=30), 3)
+            self.assertEqual(LocationWeather.objects.count(), 1)
+            self.assertFalse(has_archive())
+
+        for callback in callbacks:
+            callback()
+        self.assertTrue(has_archive())
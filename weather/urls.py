@@ -3,4 +3,15 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),  # Route for the home view
+    path('async/', views.ahome, name='home_async'),  # Same page via the async view (serve over ASGI)
+    path('compare/', views.compare, name='compare'),  # Many locations side by side (?locations=a,b,c)
+    path('compare.json', views.compare_json, name='compare_json'),
+    path('api/locations/autocomplete/', views.autocomplete_locations, name='autocomplete_locations'),
+    path('api/weather/area/', views.api_area, name='api_area'),  # ?bbox=west,south,east,north
+    path('api/weather/nearest/', views.api_nearest, name='api_nearest'),  # ?lat=&lon=&km=
+    # JSON read API with ETag / Last-Modified validators
+    path('api/weather/<str:location>/current/', views.api_current, name='api_current'),
+    path('api/weather/<str:location>/trends/', views.api_trends, name='api_trends'),
+    path('api/weather/<str:location>/history/', views.api_history, name='api_history'),
+    path('api/weather/<str:location>/export/', views.export_weather, name='export_weather'),
 ]
@@ -1,31 +1,90 @@
+import math
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
 
-from services.weatherapi import NoLocationFoundException
-from weather.forms import LocationSearchForm
-from weather.services import fetch_location_current_weather
-from weather.selectors import get_weather_alert, get_weather_trends
+from services.weatherapi import NoLocationFoundException, WeatherAPIError, get_circuit_breaker
+from weather.alerts import get_alert_rules
+from weather.autocomplete import suggest_locations
+from weather.cache import get_reading_ttl
+from weather.export import EXPORT_FORMATS, export_readings, parse_export_time
+from weather.forms import LocationCompareForm, LocationSearchForm
+from weather.history import METRICS
+from weather.resolver import resolve_location
+from weather.services import (
+    afetch_location_current_weather,
+    afetch_location_forecast,
+    atrack_location_request,
+    fetch_location_current_weather,
+    fetch_location_forecast,
+    fetch_locations_current_weather,
+    track_location_request,
+)
+from weather.selectors import (
+    aget_forecast,
+    aget_weather_alert,
+    aget_weather_analytics,
+    aget_weather_trends,
+    get_forecast,
+    get_latest_weather_in_box,
+    get_location,
+    get_nearest_latest_weather,
+    get_weather_alert,
+    get_weather_analytics,
+    get_weather_history,
+    get_weather_trends,
+    get_weather_trends_for_locations,
+)
 
 
-def home(request):
+WEATHER_UNAVAILABLE = "Weather service unavailable, please try again shortly."
+
+
+def _get_search_form_and_location(request):
     location = 'warangal' # default location
-    weather_alert = None
-    weather_trends = None
-    latest_weather = None
-    error_message = None
     form = LocationSearchForm()
 
     if request.method == 'POST':
         form = LocationSearchForm(request.POST)
         if form.is_valid():
             location = form.cleaned_data['location'].lower()
+    return form, location
+
+
+def home(request):
+    weather_alert = None
+    weather_trends = None
+    weather_analytics = None
+    latest_weather = None
+    forecast = None
+    error_message = None
+    form, location = _get_search_form_and_location(request)
+
     try:
         # Fetch the latest weather and check alerts
         latest_weather = fetch_location_current_weather(location)
+        # the stored location WeatherAPI resolved the query to, shared by every spelling of it
+        location_id = latest_weather.location_id
+        track_location_request(location_id)
         weather_alert = get_weather_alert(latest_weather)
-        # Fetch trends over the last 24 hours
-        weather_trends = get_weather_trends(location, days=1)
+        # Fetch trends over the configured window (24 hours by default)
+        weather_trends = get_weather_trends(location_id, latest=latest_weather)
+        weather_analytics = get_weather_analytics(location_id)
+        try:
+            forecast = get_forecast(fetch_location_forecast(location))
+        except WeatherAPIError:
+            # the current reading (even a stale one) is still worth showing without a forecast
+            forecast = None
     except NoLocationFoundException:
         error_message = "No Location Found!"
+    except WeatherAPIError:
+        error_message = WEATHER_UNAVAILABLE
 
     context = {
         'form': form,
@@ -33,7 +92,298 @@ def home(request):
         'latest_weather': latest_weather,
         'weather_alert': weather_alert,
         'weather_trends': weather_trends,
+        'weather_analytics': weather_analytics,
+        'forecast': forecast,
         'error_message': error_message,
     }
     
     return render(request, 'weather/home.html', context)
+
+
+async def ahome(request):
+    """Async variant of `home`; the upstream round trip does not hold a worker thread under ASGI."""
+    weather_alert = None
+    weather_trends = None
+    weather_analytics = None
+    latest_weather = None
+    forecast = None
+    error_message = None
+    form, location = _get_search_form_and_location(request)
+
+    try:
+        latest_weather = await afetch_location_current_weather(location)
+        location_id = latest_weather.location_id
+        await atrack_location_request(location_id)
+        weather_alert = await aget_weather_alert(latest_weather)
+        weather_trends = await aget_weather_trends(location_id, latest=latest_weather)
+        weather_analytics = await aget_weather_analytics(location_id)
+        try:
+            forecast = await aget_forecast(await afetch_location_forecast(location))
+        except WeatherAPIError:
+            forecast = None
+    except NoLocationFoundException:
+        error_message = "No Location Found!"
+    except WeatherAPIError:
+        error_message = WEATHER_UNAVAILABLE
+
+    context = {
+        'form': form,
+        'location': location,
+        'latest_weather': latest_weather,
+        'weather_alert': weather_alert,
+        'weather_trends': weather_trends,
+        'weather_analytics': weather_analytics,
+        'forecast': forecast,
+        'error_message': error_message,
+    }
+
+    return render(request, 'weather/home.html', context)
+
+
+def _get_comparison(locations):
+    """One row per location: its current weather, trends, alert and any error, in request order."""
+    weather, errors = fetch_locations_current_weather(locations)
+    # several queries may resolve to the same stored location
+    location_ids = {name: latest.location_id for name, latest in weather.items()}
+    trends = get_weather_trends_for_locations(
+        set(location_ids.values()), latest={latest.location_id: latest for latest in weather.values()}
+    )
+    rules = get_alert_rules()
+    rows = []
+    for name in locations:
+        latest_weather = weather.get(name)
+        error_message = None
+        if isinstance(errors.get(name), NoLocationFoundException):
+            error_message = "No Location Found!"
+        elif name in errors:
+            error_message = "Weather unavailable"
+        rows.append({
+            'location': name,
+            'latest_weather': latest_weather,
+            'weather_alert': get_weather_alert(latest_weather, rules),
+            'weather_trends': trends.get(location_ids.get(name)),
+            'error_message': error_message,
+        })
+    return rows
+
+
+def compare(request):
+    """Current weather and trends of many locations (`?locations=a,b,c`) side by side."""
+    rows = []
+    form = LocationCompareForm(request.GET or None)
+    if form.is_valid():
+        rows = _get_comparison(form.cleaned_data['locations'])
+    return render(request, 'weather/compare.html', {'form': form, 'rows': rows})
+
+
+def _float_or_none(value):
+    return None if value is None else float(value)
+
+
+def _serialize_weather(weather):
+    if weather is None:
+        return None
+    return {
+        'name': weather.location.name,
+        'region': weather.location.region,
+        'country': weather.location.country,
+        'record_timestamp': weather.record_timestamp,
+        'condition': weather.condition.text if weather.condition else None,
+        'condition_icon': weather.condition.icon if weather.condition else None,
+        'latitude': _float_or_none(weather.location.latitude),
+        'longitude': _float_or_none(weather.location.longitude),
+        'wind_direction': weather.wind_direction,
+        **{metric: float(getattr(weather, metric)) for metric in METRICS},
+        'stale': weather.is_stale,
+    }
+
+
+def _serialize_trends(trends):
+    if trends is None:
+        return None
+    return {key: float(value) if isinstance(value, Decimal) else value for key, value in trends.items()}
+
+
+def compare_json(request):
+    """JSON variant of `compare`."""
+    form = LocationCompareForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse({
+        'locations': [
+            {
+                'location': row['location'],
+                'current': _serialize_weather(row['latest_weather']),
+                'trends': _serialize_trends(row['weather_trends']),
+                'alert': row['weather_alert'],
+                'error': row['error_message'],
+            }
+            for row in _get_comparison(form.cleaned_data['locations'])
+        ]
+    })
+
+
+# longest window the read API aggregates over
+API_MAX_DAYS = 366
+# widest radius the nearest-location API searches
+API_MAX_KM = 500
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+
+def _conditional_json_response(request, weather, get_payload, variant=''):
+    """
+    JSON of `get_payload()`, validated by the reading it is computed from: ETag and
+    Last-Modified come from its `record_timestamp` (the ETag also from `variant`, e.g. the
+    window), matching If-None-Match / If-Modified-Since requests get a 304 without computing
+    the payload, and Cache-Control max-age runs until the next expected upstream update.
+    """
+    last_modified = int(weather.record_timestamp.timestamp())
+    etag = quote_etag(f"{weather.location_id}-{last_modified}{variant}")
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(get_payload())
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=max(0, math.floor(get_reading_ttl(weather))))
+    return response
+
+
+def _get_api_days(request):
+    """The `days` query parameter as a float, None when absent; raises ValueError when invalid."""
+    days = request.GET.get('days')
+    if days is None:
+        return None
+    days = float(days)
+    if not 0 < days <= API_MAX_DAYS:
+        raise ValueError(days)
+    return days
+
+
+def _api_view(view):
+    """Resolve the location's current reading for `view`, answering unknown locations and bad windows with errors."""
+    @wraps(view)
+    @require_safe
+    def wrapper(request, location):
+        try:
+            days = _get_api_days(request)
+        except ValueError:
+            return JsonResponse({'error': f"days must be a number between 0 and {API_MAX_DAYS}"}, status=400)
+        try:
+            weather = fetch_location_current_weather(location)
+        except NoLocationFoundException:
+            return JsonResponse({'error': "No Location Found!"}, status=404)
+        except WeatherAPIError:
+            response = JsonResponse({'error': WEATHER_UNAVAILABLE}, status=503)
+            response['Retry-After'] = max(1, math.ceil(get_circuit_breaker().retry_in()))
+            return response
+        return view(request, weather, days)
+    return wrapper
+
+
+@_api_view
+def api_current(request, weather, days):
+    """Current weather of a location."""
+    return _conditional_json_response(request, weather, lambda: {'current': _serialize_weather(weather)})
+
+
+@_api_view
+def api_trends(request, weather, days):
+    """Trends of a location over the last `days` days (default WEATHER_TRENDS_WINDOW_DAYS)."""
+    return _conditional_json_response(
+        request, weather,
+        lambda: {'trends': _serialize_trends(get_weather_trends(weather.location_id, days, latest=weather))},
+        variant=f"-trends-{days}",
+    )
+
+
+@_api_view
+def api_history(request, weather, days):
+    """Hourly (or daily, for long windows) rollups of a location over the last `days` days."""
+    return _conditional_json_response(
+        request, weather,
+        lambda: {'history': get_weather_history(weather.location_id, days)},
+        variant=f"-history-{days}",
+    )
+
+
+@require_safe
+def api_area(request):
+    """Current weather of the stored locations in `?bbox=west,south,east,north` (a Leaflet bounds string)."""
+    try:
+        west, south, east, north = (float(value) for value in request.GET['bbox'].split(','))
+        if not (west <= east and -90 <= south <= north <= 90):
+            raise ValueError
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "bbox must be west,south,east,north in degrees"}, status=400)
+    if east - west >= 360:
+        west, east = -180.0, 180.0
+    elif not (-180 <= west and east <= 180):
+        # a map panned past the antimeridian reports unwrapped longitudes
+        west, east = ((value + 180) % 360 - 180 for value in (west, east))
+    readings = get_latest_weather_in_box(south, west, north, east, limit=settings.WEATHER_AREA_MAX_LOCATIONS)
+    return JsonResponse({'locations': [_serialize_weather(weather) for weather in readings]})
+
+
+@require_safe
+def api_nearest(request):
+    """Current weather of the stored location nearest to `?lat=&lon=`, within `km` (default WEATHER_NEARBY_KM)."""
+    try:
+        latitude, longitude = float(request.GET['lat']), float(request.GET['lon'])
+        km = float(request.GET.get('km', settings.WEATHER_NEARBY_KM))
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < km <= API_MAX_KM):
+            raise ValueError
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {'error': f"lat and lon must be coordinates in degrees, km a number between 0 and {API_MAX_KM}"},
+            status=400,
+        )
+    nearest = get_nearest_latest_weather(latitude, longitude, km)
+    if nearest is None:
+        return JsonResponse({'error': f"No stored location within {km:g} km"}, status=404)
+    weather, distance = nearest
+    return JsonResponse({'current': _serialize_weather(weather), 'distance_km': round(distance, 3)})
+
+
+@require_safe
+def export_weather(request, location):
+    """
+    Stream a location's stored readings: `?format=ndjson|csv&since=...&until=...&gzip=1`,
+    with `since`/`until` ISO dates or datetimes (UTC unless an offset is given).
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+    try:
+        since, until = (
+            parse_export_time(request.GET[key]) if request.GET.get(key) else None for key in ('since', 'until')
+        )
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    compress = request.GET.get('gzip') in ('1', 'true')
+    try:
+        stored = get_location(resolve_location(location))
+    except NoLocationFoundException:
+        stored = None
+    if stored is None:
+        return JsonResponse({'error': "No Location Found!"}, status=404)
+
+    filename = f"{stored.name.replace(' ', '_')}.{export_format}"
+    response = StreamingHttpResponse(
+        export_readings(stored.id, export_format, since, until, compress),
+        content_type='application/gzip' if compress else EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}{".gz" if compress else ""}"'
+    return response
+
+
+@require_safe
+def autocomplete_locations(request):
+    """Search-box suggestions for `?q=<prefix>&limit=n`, from the in-process prefix index."""
+    try:
+        limit = int(request.GET.get('limit', settings.WEATHER_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= AUTOCOMPLETE_MAX_LIMIT:
+        return JsonResponse({'error': f"limit must be a number between 1 and {AUTOCOMPLETE_MAX_LIMIT}"}, status=400)
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'suggestions': suggest_locations(query, limit)})
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weatherpulse.settings')
 
 application = get_asgi_application()
+
+from weather.history import warm_recent_history_on_first_request  # noqa: E402
+
+warm_recent_history_on_first_request()
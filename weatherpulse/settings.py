@@ -89,6 +89,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Point this at a shared backend (e.g. redis/memcached) in production so every
+# worker sees the same cached readings.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -153,4 +166,121 @@ LOGGING = {
 }
 
 # THIRD PARTY SETTINGS
-WEATHERAPI_API_KEY = os.getenv('WEATHERAPI_API_KEY')
\ No newline at end of file
+WEATHERAPI_API_KEY = os.getenv('WEATHERAPI_API_KEY')
+WEATHERAPI_BASE_URL = os.getenv('WEATHERAPI_BASE_URL', 'http://api.weatherapi.com/v1')
+WEATHERAPI_CONNECT_TIMEOUT = float(os.getenv('WEATHERAPI_CONNECT_TIMEOUT', 3.05))
+WEATHERAPI_READ_TIMEOUT = float(os.getenv('WEATHERAPI_READ_TIMEOUT', 10))
+# retries of 5xx responses and connection errors; each spends a quota token (see WEATHERAPI_RATE_PER_SECOND)
+WEATHERAPI_MAX_RETRIES = int(os.getenv('WEATHERAPI_MAX_RETRIES', 2))
+WEATHERAPI_RETRY_BACKOFF = float(os.getenv('WEATHERAPI_RETRY_BACKOFF', 0.3))
+WEATHERAPI_RETRY_JITTER = float(os.getenv('WEATHERAPI_RETRY_JITTER', 0.2))
+# keep-alive connections kept per host; size it to the number of threads per worker
+WEATHERAPI_POOL_MAXSIZE = int(os.getenv('WEATHERAPI_POOL_MAXSIZE', 20))
+WEATHERAPI_GZIP = os.getenv('WEATHERAPI_GZIP', 'True') == 'True'
+# in-flight upstream connections per event loop for the async client (ASGI)
+WEATHERAPI_ASYNC_MAX_CONNECTIONS = int(os.getenv('WEATHERAPI_ASYNC_MAX_CONNECTIONS', 200))
+
+# WEATHER APP SETTINGS
+# cache alias used for current weather readings
+WEATHER_CACHE_ALIAS = os.getenv('WEATHER_CACHE_ALIAS', 'default')
+# seconds a reading stays fresh after its record_timestamp (upstream updates every 15 minutes)
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 15 * 60))
+# minimum seconds a freshly fetched reading is served before asking upstream again
+WEATHER_CACHE_MIN_TTL = int(os.getenv('WEATHER_CACHE_MIN_TTL', 60))
+# also coalesce upstream fetches across workers with a lock in the weather cache
+WEATHER_SINGLEFLIGHT_DISTRIBUTED = os.getenv('WEATHER_SINGLEFLIGHT_DISTRIBUTED', 'False') == 'True'
+# seconds a worker holds the fetch lock before others stop waiting on it
+WEATHER_SINGLEFLIGHT_LOCK_TIMEOUT = int(os.getenv('WEATHER_SINGLEFLIGHT_LOCK_TIMEOUT', 15))
+# serve stored readings from page views and leave upstream calls to the `refresh_weather` worker
+WEATHER_BACKGROUND_REFRESH = os.getenv('WEATHER_BACKGROUND_REFRESH', 'False') == 'True'
+# default seconds between refreshes of a tracked location
+WEATHER_REFRESH_INTERVAL = int(os.getenv('WEATHER_REFRESH_INTERVAL', 15 * 60))
+# random seconds added to each refresh so tracked locations do not refresh in lockstep
+WEATHER_REFRESH_JITTER = int(os.getenv('WEATHER_REFRESH_JITTER', 60))
+# upstream calls in flight and in total per refresh cycle
+WEATHER_REFRESH_CONCURRENCY = int(os.getenv('WEATHER_REFRESH_CONCURRENCY', 8))
+WEATHER_REFRESH_BUDGET = int(os.getenv('WEATHER_REFRESH_BUDGET', 100))
+# seconds between page-view counts for the same location
+WEATHER_TRACKING_DEBOUNCE = int(os.getenv('WEATHER_TRACKING_DEBOUNCE', 60))
+# seconds without a page view before a location stops being refreshed
+WEATHER_TRACKING_EXPIRY = int(os.getenv('WEATHER_TRACKING_EXPIRY', 7 * 24 * 60 * 60))
+# upstream calls in flight and rows per bulk insert for the `ingest_locations` command
+WEATHER_INGEST_CONCURRENCY = int(os.getenv('WEATHER_INGEST_CONCURRENCY', 16))
+WEATHER_INGEST_BATCH_SIZE = int(os.getenv('WEATHER_INGEST_BATCH_SIZE', 500))
+# default window of the trends shown next to the current weather
+WEATHER_TRENDS_WINDOW_DAYS = float(os.getenv('WEATHER_TRENDS_WINDOW_DAYS', 1))
+# read trends from the hourly/daily rollups instead of aggregating raw readings
+WEATHER_TRENDS_FROM_ROLLUPS = os.getenv('WEATHER_TRENDS_FROM_ROLLUPS', 'True') == 'True'
+# fold new readings into the rollups right after they are stored (otherwise run `rollup_weather`)
+WEATHER_ROLLUP_ON_INGEST = os.getenv('WEATHER_ROLLUP_ON_INGEST', 'True') == 'True'
+# readings scanned for touched rollup buckets per transaction
+WEATHER_ROLLUP_BATCH_SIZE = int(os.getenv('WEATHER_ROLLUP_BATCH_SIZE', 5000))
+# seconds before the rollup high-water mark rescanned by each run, for writes that commit late
+WEATHER_ROLLUP_OVERLAP = int(os.getenv('WEATHER_ROLLUP_OVERLAP', 5 * 60))
+# longest window served from hourly rollups; longer windows use daily rollups
+WEATHER_ROLLUP_HOURLY_MAX_DAYS = float(os.getenv('WEATHER_ROLLUP_HOURLY_MAX_DAYS', 7))
+# days of forecast fetched per issue (WeatherAPI serves up to 14)
+WEATHER_FORECAST_DAYS = int(os.getenv('WEATHER_FORECAST_DAYS', 3))
+# seconds a stored forecast issue is served before it is fetched again
+WEATHER_FORECAST_TTL = int(os.getenv('WEATHER_FORECAST_TTL', 60 * 60))
+# JSON decoder for WeatherAPI responses: 'auto' (orjson when installed), 'orjson' or 'json'
+WEATHERAPI_JSON_BACKEND = os.getenv('WEATHERAPI_JSON_BACKEND', 'auto')
+# decode forecasts with the ijson event parser, keeping only the stored hour fields (needs ijson)
+WEATHERAPI_JSON_STREAMING = os.getenv('WEATHERAPI_JSON_STREAMING', 'False') == 'True'
+# keep recent readings per location in process-local ring buffers for trends
+WEATHER_HISTORY_STORE = os.getenv('WEATHER_HISTORY_STORE', 'True') == 'True'
+# hours of readings loaded per location, and readings kept per location (192 = 48h of 15-minute readings)
+WEATHER_HISTORY_WINDOW_HOURS = float(os.getenv('WEATHER_HISTORY_WINDOW_HOURS', 24))
+WEATHER_HISTORY_CAPACITY = int(os.getenv('WEATHER_HISTORY_CAPACITY', 192))
+# locations kept before the least recently used one is evicted (~17 MB at the default capacity)
+WEATHER_HISTORY_MAX_LOCATIONS = int(os.getenv('WEATHER_HISTORY_MAX_LOCATIONS', 1000))
+# seconds before a buffer picks up readings stored by other processes
+WEATHER_HISTORY_SYNC_INTERVAL = int(os.getenv('WEATHER_HISTORY_SYNC_INTERVAL', 60))
+# load the most requested tracked locations in the background when a worker serves its first request
+WEATHER_HISTORY_WARM_ON_STARTUP = os.getenv('WEATHER_HISTORY_WARM_ON_STARTUP', 'True') == 'True'
+# window of the analytics shown next to the trends, and the rolling mean / EWMA horizons
+WEATHER_ANALYTICS_WINDOW_DAYS = float(os.getenv('WEATHER_ANALYTICS_WINDOW_DAYS', 7))
+WEATHER_ANALYTICS_ROLLING_HOURS = float(os.getenv('WEATHER_ANALYTICS_ROLLING_HOURS', 3))
+WEATHER_ANALYTICS_EWMA_HALFLIFE_HOURS = float(os.getenv('WEATHER_ANALYTICS_EWMA_HALFLIFE_HOURS', 6))
+# seconds the active alert rules are cached before they are read again
+WEATHER_ALERT_RULES_TTL = int(os.getenv('WEATHER_ALERT_RULES_TTL', 60))
+# most locations in one comparison, and upstream calls in flight for its stale locations
+WEATHER_COMPARE_MAX_LOCATIONS = int(os.getenv('WEATHER_COMPARE_MAX_LOCATIONS', 200))
+WEATHER_COMPARE_CONCURRENCY = int(os.getenv('WEATHER_COMPARE_CONCURRENCY', 16))
+# rows fetched per round trip and bytes per yielded chunk when exporting readings
+WEATHER_EXPORT_CHUNK_SIZE = int(os.getenv('WEATHER_EXPORT_CHUNK_SIZE', 2000))
+WEATHER_EXPORT_BUFFER_SIZE = int(os.getenv('WEATHER_EXPORT_BUFFER_SIZE', 64 * 1024))
+# per-month columnar segments of readings moved out of the DB, and the age (days) at which they move
+WEATHER_ARCHIVE_DIR = os.getenv('WEATHER_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+WEATHER_ARCHIVE_AFTER_DAYS = float(os.getenv('WEATHER_ARCHIVE_AFTER_DAYS', 180))
+# rows fetched per round trip and written per batch while archiving
+WEATHER_ARCHIVE_CHUNK_SIZE = int(os.getenv('WEATHER_ARCHIVE_CHUNK_SIZE', 10000))
+# WeatherAPI circuit breaker: opens for OPEN_SECONDS once FAILURE_RATE of the calls in the last WINDOW
+# seconds (at least MIN_CALLS) failed or took SLOW_CALL seconds or more
+WEATHERAPI_BREAKER_WINDOW = float(os.getenv('WEATHERAPI_BREAKER_WINDOW', 30))
+WEATHERAPI_BREAKER_MIN_CALLS = int(os.getenv('WEATHERAPI_BREAKER_MIN_CALLS', 10))
+WEATHERAPI_BREAKER_FAILURE_RATE = float(os.getenv('WEATHERAPI_BREAKER_FAILURE_RATE', 0.5))
+WEATHERAPI_BREAKER_SLOW_CALL = float(os.getenv('WEATHERAPI_BREAKER_SLOW_CALL', 5))
+WEATHERAPI_BREAKER_OPEN_SECONDS = float(os.getenv('WEATHERAPI_BREAKER_OPEN_SECONDS', 30))
+# background refreshes of stale readings served while WeatherAPI is failing
+WEATHER_REVALIDATE_CONCURRENCY = int(os.getenv('WEATHER_REVALIDATE_CONCURRENCY', 4))
+# WeatherAPI call budget shared through the weather cache (0 turns a limit off); page views may use
+# all of it, the refresh worker half of each second and ingestion a quarter, both always leaving one
+# call for page views (see services.ratelimit). Workers only share the budget through a cache they
+# all reach, so a local-memory cache raises a warning at startup
+WEATHERAPI_RATE_PER_SECOND = int(os.getenv('WEATHERAPI_RATE_PER_SECOND', 10))
+WEATHERAPI_QUOTA_PER_MONTH = int(os.getenv('WEATHERAPI_QUOTA_PER_MONTH', 1000000))
+# seconds a query WeatherAPI did not recognise is answered without calling it, and an alias stays cached
+WEATHER_UNKNOWN_LOCATION_TTL = int(os.getenv('WEATHER_UNKNOWN_LOCATION_TTL', 3600))
+WEATHER_ALIAS_CACHE_TTL = int(os.getenv('WEATHER_ALIAS_CACHE_TTL', 24 * 3600))
+# search-box suggestions: how many, how often the in-process index is rebuilt from the DB (seconds),
+# and whether prefixes with too few known places are also searched on WeatherAPI (results kept per prefix, LRU)
+WEATHER_AUTOCOMPLETE_LIMIT = int(os.getenv('WEATHER_AUTOCOMPLETE_LIMIT', 8))
+WEATHER_AUTOCOMPLETE_REBUILD_INTERVAL = int(os.getenv('WEATHER_AUTOCOMPLETE_REBUILD_INTERVAL', 600))
+WEATHER_AUTOCOMPLETE_UPSTREAM = os.getenv('WEATHER_AUTOCOMPLETE_UPSTREAM', 'False') == 'True'
+WEATHER_AUTOCOMPLETE_UPSTREAM_MIN_LENGTH = int(os.getenv('WEATHER_AUTOCOMPLETE_UPSTREAM_MIN_LENGTH', 3))
+WEATHER_AUTOCOMPLETE_UPSTREAM_CACHE_SIZE = int(os.getenv('WEATHER_AUTOCOMPLETE_UPSTREAM_CACHE_SIZE', 10000))
+# a "lat,lon" search within this many km of a stored location is answered with that location's weather
+WEATHER_NEARBY_KM = float(os.getenv('WEATHER_NEARBY_KM', 5))
+# most readings the map area API returns at once
+WEATHER_AREA_MAX_LOCATIONS = int(os.getenv('WEATHER_AREA_MAX_LOCATIONS', 500))
\ No newline at end of file
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weatherpulse.settings')
 
 application = get_wsgi_application()
+
+from weather.history import warm_recent_history_on_first_request  # noqa: E402
+
+warm_recent_history_on_first_request()